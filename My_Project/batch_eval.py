@@ -0,0 +1,315 @@
+"""
+ارزیابی دسته‌ای آثار ذخیره‌شده با مدل زبانی
+
+آثار هر دسته به ترتیب شماره و صفحه به صفحه خوانده می‌شوند و با یک استخر محدود از workerها و
+سقف تعداد ارزیابی در ثانیه به evaluate_text داده می‌شوند. نتیجه هر اثر در جدول ai_scores و
+پیشرفت کار در eval_jobs ثبت می‌شود. نقطه بازیابی (cursor) فقط تا جایی جلو می‌رود که همه آثار
+قبل از آن تمام شده باشند، پس بعد از قطع شدن، resume از همان نقطه ادامه می‌دهد. آثاری که با همین
+محتوا قبلا ارزیابی شده‌اند (یا در همین کار ارزیابی شده‌اند) دوباره ارزیابی نمی‌شوند؛ با force همه
+آثار دوباره به ارزیاب فرستاده می‌شوند و حافظه ارزیابی (evaluate_text) هم نادیده گرفته می‌شود.
+
+    python batch_eval.py run [--model=gpt-4o] [--concurrency=4] [--rate=2] [--categories=poems,stories] [--force]
+    python batch_eval.py resume [job_id]
+    python batch_eval.py status [job_id]
+"""
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import storage
+
+CATEGORIES = ("poems", "stories", "literature")
+CATEGORY_LABELS = {"poems": "شعر", "stories": "داستان کوتاه", "literature": "متن ادبی"}
+MODEL = os.environ.get("BATCH_EVAL_MODEL", "gpt-4o")
+CONCURRENCY = int(os.environ.get("BATCH_EVAL_CONCURRENCY", 4))
+# حداکثر تعداد ارزیابی در ثانیه (0 یعنی بدون محدودیت)
+RATE = float(os.environ.get("BATCH_EVAL_RATE", 2))
+PAGE_SIZE = 100
+CHECKPOINT_INTERVAL = 2.0
+# کاری که این مدت پیشرفتی ثبت نکرده، متوقف‌شده حساب می‌شود و می‌توان آن را resume کرد
+STALE_AFTER = float(os.environ.get("BATCH_EVAL_STALE_AFTER", 120))
+
+# (متن، درخواست، مدل، استفاده از حافظه ارزیابی) -> نتیجه ارزیابی
+Evaluate = Callable[[str, str, str, bool], Dict[str, Any]]
+
+
+class RateLimiter:
+    """فاصله یکنواخت بین شروع فراخوانی‌ها، مشترک بین همه workerها"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def content_hash(rec: Dict[str, Any]) -> str:
+    raw = f"{rec.get('عنوان', '')}\n{rec.get('محتوا', '')}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def evaluation_prompt(category: str, rec: Dict[str, Any]) -> str:
+    """درخواستی که برای ارزیابی اثر ذخیره‌شده فرض می‌شود"""
+    label = CATEGORY_LABELS.get(category, category)
+    title = rec.get("عنوان") or "بدون عنوان"
+    return f"نوشتن یک {label} با عنوان «{title}»"
+
+
+class BatchEvaluator:
+    def __init__(self, evaluate: Evaluate, model: str = MODEL, categories=CATEGORIES,
+                 concurrency: int = CONCURRENCY, rate: float = RATE, force: bool = False):
+        self.evaluate = evaluate
+        self.model = model
+        self.categories = [c for c in categories if c in CATEGORIES]
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.force = force
+        self.job_id: Optional[int] = None
+        self.stop_event = threading.Event()
+        self._limiter = RateLimiter(rate)
+        self._lock = threading.Lock()
+        self._counts = {"done": 0, "failed": 0, "skipped": 0}
+        self._cursor = (self.categories[0] if self.categories else None, 0)
+
+    def options(self) -> Dict[str, Any]:
+        return {"model": self.model, "categories": self.categories, "concurrency": self.concurrency,
+                "rate": self.rate, "force": self.force}
+
+    @classmethod
+    def resume(cls, evaluate: Evaluate, job_id: Optional[int] = None) -> "BatchEvaluator":
+        job = storage.get_eval_job(job_id)
+        if job is None:
+            raise ValueError("کاری برای ادامه پیدا نشد")
+        if job["status"] == "done":
+            raise ValueError(f"کار {job['id']} قبلا تمام شده است")
+        opts = job["options"]
+        evaluator = cls(evaluate, opts.get("model", MODEL), opts.get("categories", CATEGORIES),
+                        opts.get("concurrency", CONCURRENCY), opts.get("rate", RATE), opts.get("force", False))
+        evaluator.job_id = job["id"]
+        evaluator._counts = {k: job[k] for k in ("done", "failed", "skipped")}
+        evaluator._cursor = (job["cursor_category"] or evaluator._cursor[0], job["cursor_id"] or 0)
+        return evaluator
+
+    def start_job(self) -> int:
+        """ثبت کار جدید (اگر از قبل ثبت نشده باشد)"""
+        if self.job_id is None:
+            total = sum(storage.count_artworks(c) for c in self.categories)
+            self.job_id = storage.create_eval_job(self.options(), total)
+        else:
+            storage.update_eval_job(self.job_id, status="running", error=None)
+        return self.job_id
+
+    # ---------- اجرا ----------
+
+    def _evaluate_one(self, category: str, rec: Dict[str, Any], digest: str) -> bool:
+        """خروجی False یعنی به خاطر توقف کار اصلا ارزیابی نشد"""
+        if self.stop_event.is_set():
+            return False
+        self._limiter.acquire()
+        try:
+            result = self.evaluate(rec.get("محتوا", ""), evaluation_prompt(category, rec), self.model,
+                                   not self.force)
+            ok = not result.get("parse_error") and not result.get("evaluation_disabled")
+            if ok:
+                storage.save_ai_score(category, rec["شماره"], result, self.model, digest, self.job_id)
+        except Exception as e:
+            print(f"خطا در ارزیابی {category}/{rec['شماره']}: {e}")
+            ok = False
+        with self._lock:
+            self._counts["done" if ok else "failed"] += 1
+        return True
+
+    def _items(self):
+        """(دسته، رکورد، هش) آثاری که باید ارزیابی شوند، از نقطه بازیابی به بعد"""
+        start_category, start_id = self._cursor
+        started = start_category not in self.categories
+        for category in self.categories:
+            if not started and category != start_category:
+                continue
+            after = start_id if not started else 0
+            started = True
+            while not self.stop_event.is_set():
+                page = storage.artworks_after(category, after, PAGE_SIZE)
+                if not page:
+                    break
+                states = storage.ai_score_states(category, [r["شماره"] for r in page])
+                for rec in page:
+                    digest = content_hash(rec)
+                    state = states.get(rec["شماره"])
+                    skip = state is not None and (state[1] == self.job_id or (not self.force and state[0] == digest))
+                    yield category, rec, (None if skip else digest)
+                after = page[-1]["شماره"]
+
+    def _checkpoint(self, status: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            counts = dict(self._counts)
+        fields = dict(counts, cursor_category=self._cursor[0], cursor_id=self._cursor[1])
+        if status:
+            fields["status"] = status
+        return storage.update_eval_job(self.job_id, **fields)
+
+    def run(self) -> Dict[str, Any]:
+        self.start_job()
+        print(f"ارزیابی دسته‌ای {self.job_id} شروع شد: {self.options()}")
+        pending = deque()
+        window = self.concurrency * 4
+        last_checkpoint = time.monotonic()
+        frozen = False
+
+        def advance(block: bool):
+            # نقطه بازیابی فقط تا اولین اثر تمام‌نشده جلو می‌رود
+            nonlocal frozen
+            while pending and (block or pending[0][2] is None or pending[0][2].done()):
+                category, item_id, future = pending.popleft()
+                processed = future.result() if future is not None else True
+                frozen = frozen or not processed
+                if not frozen:
+                    self._cursor = (category, item_id)
+                block = False
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch-eval") as pool:
+                for category, rec, digest in self._items():
+                    if digest is None:
+                        with self._lock:
+                            self._counts["skipped"] += 1
+                        future = None
+                    else:
+                        future = pool.submit(self._evaluate_one, category, rec, digest)
+                    pending.append((category, rec["شماره"], future))
+                    advance(block=len(pending) >= window)
+
+                    if time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL:
+                        last_checkpoint = time.monotonic()
+                        job = self._checkpoint()
+                        if job and job["status"] == "cancelling":
+                            self.stop_event.set()
+                while pending:
+                    advance(block=True)
+        except Exception as e:
+            self.stop_event.set()
+            print(f"ارزیابی دسته‌ای {self.job_id} با خطا متوقف شد: {e}")
+            storage.update_eval_job(self.job_id, error=str(e)[:500])
+            return self._checkpoint("failed")
+
+        job = self._checkpoint("cancelled" if self.stop_event.is_set() else "done")
+        print(f"ارزیابی دسته‌ای {self.job_id} پایان یافت: {job['status']} {self._counts}")
+        return job
+
+    def cancel(self):
+        self.stop_event.set()
+
+
+# ---------- اجرا در پس‌زمینه (از پنل مدیریت) ----------
+
+_background: Dict[int, BatchEvaluator] = {}
+_background_lock = threading.Lock()
+
+
+def start_background(evaluator: BatchEvaluator) -> Dict[str, Any]:
+    """اجرای کار در یک thread پس‌زمینه؛ فقط یک کار فعال در کل برنامه مجاز است"""
+    with _background_lock:
+        active = storage.active_eval_job(STALE_AFTER)
+        if active is not None:
+            raise RuntimeError(f"کار ارزیابی {active['id']} در حال اجراست")
+        job_id = evaluator.start_job()
+        _background[job_id] = evaluator
+
+    def run():
+        try:
+            evaluator.run()
+        finally:
+            with _background_lock:
+                _background.pop(job_id, None)
+
+    threading.Thread(target=run, name=f"batch-eval-{job_id}", daemon=True).start()
+    return storage.get_eval_job(job_id)
+
+
+def cancel(job_id: int) -> Optional[Dict[str, Any]]:
+    """
+    درخواست توقف؛ اگر کار در این پروسه اجرا می‌شود فورا، در غیر این صورت
+    در اولین ثبت پیشرفت همان پروسه متوقف می‌شود
+    """
+    with _background_lock:
+        evaluator = _background.get(job_id)
+    if evaluator is not None:
+        evaluator.cancel()
+    job = storage.get_eval_job(job_id)
+    if job and job["status"] == "running":
+        job = storage.update_eval_job(job_id, status="cancelling")
+    return job
+
+
+# ---------- CLI ----------
+
+def _option(name: str, default):
+    for arg in sys.argv[2:]:
+        if arg.startswith(f"--{name}="):
+            return type(default)(arg.split("=", 1)[1])
+    return default
+
+
+def _server_evaluate() -> Evaluate:
+    """evaluate_text برنامه با همان کلاینت (لایه واسط، کش و تنظیمات محیطی)"""
+    import server
+
+    def evaluate(text: str, prompt: str, model: str, use_cache: bool = True) -> Dict[str, Any]:
+        return server.evaluate_text(server.client, text, model, prompt, use_cache=use_cache)
+    return evaluate
+
+
+def _print_job(job: Optional[Dict[str, Any]]):
+    if job is None:
+        print("کاری پیدا نشد")
+        return
+    print(f"کار {job['id']}: {job['status']} | {job['done']} ارزیابی، {job['failed']} خطا، "
+          f"{job['skipped']} بدون تغییر از {job['total']} | cursor={job['cursor_category']}/{job['cursor_id']}")
+    if job.get("error"):
+        print(f"خطا: {job['error']}")
+
+
+def _ensure_idle():
+    active = storage.active_eval_job(STALE_AFTER)
+    if active is not None:
+        print(f"کار ارزیابی {active['id']} در حال اجراست")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    args = [a for a in sys.argv[2:] if not a.startswith("--")]
+    if command == "run":
+        storage.init_db()
+        _ensure_idle()
+        categories = [c for c in _option("categories", ",".join(CATEGORIES)).split(",") if c]
+        runner = BatchEvaluator(_server_evaluate(), _option("model", MODEL), categories,
+                                _option("concurrency", CONCURRENCY), _option("rate", RATE), "--force" in sys.argv)
+        _print_job(runner.run())
+    elif command == "resume":
+        storage.init_db()
+        _ensure_idle()
+        runner = BatchEvaluator.resume(_server_evaluate(), int(args[0]) if args else None)
+        _print_job(runner.run())
+    elif command == "status":
+        storage.init_db()
+        _print_job(storage.get_eval_job(int(args[0]) if args else None))
+    else:
+        print("usage: python batch_eval.py run [--model=gpt-4o] [--concurrency=4] [--rate=2] "
+              "[--categories=poems,stories,literature] [--force]")
+        print("       python batch_eval.py resume [job_id]")
+        print("       python batch_eval.py status [job_id]")
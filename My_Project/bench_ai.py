@@ -0,0 +1,238 @@
+"""
+بنچمارک مسیرهای AI (generate_simple، generate_ai، generate_ai_stream، regenerate_ai)
+
+به صورت پیش‌فرض همه چیز در همین پروسه اجرا می‌شود: سرور جایگزین OpenAI (fake_openai.py)،
+خود برنامه روی یک پورت محلی و یک پایگاه داده موقت؛ پس به اینترنت و سهمیه API نیازی نیست.
+با --url می‌توان یک نمونه در حال اجرا (مثلا gunicorn با OPENAI_BASE_URL سرور جایگزین) را سنجید.
+
+برای هر سناریو p50/p95/p99 زمان پاسخ، توان عملیاتی و نرخ خطا گزارش می‌شود. اگر --max-p95 یا
+--max-error-rate داده شود و از آن عبور شود، کد خروج 1 است تا در CI به عنوان پسرفت شناخته شود.
+
+    python bench_ai.py --concurrency 8 --requests 200 --scenarios generate,regenerate --max-p95 1500
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import fake_openai
+
+PROMPT = "یک شعر کوتاه درباره باران بنویس"
+
+
+def _post(base: str, path: str, payload: Dict[str, Any], timeout: float) -> bytes:
+    req = urllib.request.Request(base + path, data=json.dumps(payload).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return resp.read()
+
+
+def _json_ok(body: bytes) -> Dict[str, Any]:
+    data = json.loads(body)
+    if data.get("ok") is False or data.get("error"):
+        raise RuntimeError(data.get("message") or data.get("error") or "ok=false")
+    return data
+
+
+def _generate_payload(evaluation: bool, threshold: int = 7) -> Dict[str, Any]:
+    return {"prompt": PROMPT, "mode": "write", "creativity": 70, "max_tokens": 200,
+            "enable_evaluation": evaluation, "quality_threshold": threshold, "max_retry_attempts": 3,
+            "generate_image": False, "cache": False}
+
+
+def _scenario_simple(base, timeout):
+    _json_ok(_post(base, "/generate_simple", {"prompt": PROMPT, "cache": False}, timeout))
+
+
+def _scenario_generate(base, timeout):
+    _json_ok(_post(base, "/generate_ai", _generate_payload(False), timeout))
+
+
+def _scenario_evaluate(base, timeout):
+    _json_ok(_post(base, "/generate_ai", _generate_payload(True), timeout))
+
+
+def _scenario_stream(base, timeout):
+    body = _post(base, "/generate_ai_stream", _generate_payload(True), timeout).decode("utf-8")
+    if "event: error" in body or "event: done" not in body:
+        raise RuntimeError("stream ناقص")
+
+
+SCENARIOS: Dict[str, Callable[[str, float], None]] = {
+    "simple": _scenario_simple,
+    "generate": _scenario_generate,
+    "evaluate": _scenario_evaluate,
+    "stream": _scenario_stream,
+}
+
+
+def _prepare_regenerate(base: str, count: int, concurrency: int, timeout: float) -> List[str]:
+    """
+    هر regenerate به یک generation_id تازه نیاز دارد؛ این‌ها خارج از زمان‌سنجی ساخته می‌شوند.
+    آستانه 10 است تا پاسخ «به حد کافی خوب است» بدون تولید مجدد برنگردد
+    """
+    def one(_):
+        return _json_ok(_post(base, "/generate_ai", _generate_payload(True, 10), timeout))["generation_id"]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(count)))
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def run_scenario(name: str, base: str, requests: int, concurrency: int, timeout: float) -> Dict[str, Any]:
+    if name == "regenerate":
+        ids = iter(_prepare_regenerate(base, requests, concurrency, timeout))
+        ids_lock = threading.Lock()
+
+        def call(base, timeout):
+            with ids_lock:
+                generation_id = next(ids)
+            _json_ok(_post(base, "/regenerate_ai", {"generation_id": generation_id}, timeout))
+    else:
+        call = SCENARIOS[name]
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def one(_):
+        started = time.perf_counter()
+        try:
+            call(base, timeout)
+            error = None
+        except urllib.error.HTTPError as e:
+            error = f"HTTP {e.code}"
+        except Exception as e:
+            error = type(e).__name__
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            if error:
+                errors[error] = errors.get(error, 0) + 1
+            else:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    failed = sum(errors.values())
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": failed,
+        "error_rate": round(failed / requests, 4) if requests else 0.0,
+        "error_kinds": errors,
+        "throughput": round(requests / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "max_ms": round(latencies[-1], 1) if latencies else 0.0,
+    }
+
+
+def start_local_app(fake_url: str) -> str:
+    """اجرای برنامه با پایگاه داده موقت و کلاینت متصل به سرور جایگزین؛ خروجی: آدرس پایه"""
+    os.environ["OPENAI_BASE_URL"] = fake_url
+    os.environ["OPENAI_API_KEY"] = "fake"
+    os.environ.setdefault("HONARKADEH_DB", os.path.join(tempfile.mkdtemp(prefix="bench_ai_"), "bench.db"))
+    os.environ.setdefault("AI_CACHE_DISK", "0")
+
+    from werkzeug.serving import make_server
+    import server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    httpd = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{httpd.server_port}"
+
+
+def print_report(results: List[Dict[str, Any]], out=None):
+    out = out or sys.stdout
+    print(f"{'scenario':<12}{'req':>6}{'conc':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err%':>8}", file=out)
+    for r in results:
+        print(f"{r['scenario']:<12}{r['requests']:>6}{r['concurrency']:>6}{r['throughput']:>9}"
+              f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['error_rate'] * 100:>7.1f}%", file=out)
+        if r["error_kinds"]:
+            print(f"{'':<12}خطاها: {r['error_kinds']}", file=out)
+
+
+def check_thresholds(results: List[Dict[str, Any]], max_p95: Optional[float],
+                     max_error_rate: Optional[float]) -> List[str]:
+    failures = []
+    for r in results:
+        if max_p95 is not None and r["p95_ms"] > max_p95:
+            failures.append(f"{r['scenario']}: p95={r['p95_ms']}ms > {max_p95}ms")
+        if max_error_rate is not None and r["error_rate"] > max_error_rate:
+            failures.append(f"{r['scenario']}: error_rate={r['error_rate']} > {max_error_rate}")
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="بنچمارک مسیرهای AI")
+    parser.add_argument("--url", default=None, help="آدرس برنامه در حال اجرا؛ در غیر این صورت محلی اجرا می‌شود")
+    parser.add_argument("--scenarios", default="simple,generate,evaluate,stream,regenerate",
+                        help="از میان: " + ",".join(list(SCENARIOS) + ["regenerate"]))
+    parser.add_argument("--requests", type=int, default=100, help="تعداد درخواست هر سناریو")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=120, help="مهلت هر درخواست (ثانیه)")
+    parser.add_argument("--warmup", type=int, default=2, help="درخواست‌های گرم‌کردن هر سناریو (بدون زمان‌سنجی)")
+    parser.add_argument("--max-p95", type=float, default=None, help="سقف p95 (میلی‌ثانیه) برای CI")
+    parser.add_argument("--max-error-rate", type=float, default=None, help="سقف نرخ خطا (0 تا 1) برای CI")
+    parser.add_argument("--json", default=None, help="ذخیره نتایج در فایل JSON")
+    parser.add_argument("--verbose", action="store_true", help="نمایش خروجی چاپی برنامه در اجرای محلی")
+    fake_openai.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS and s != "regenerate"]
+    if unknown:
+        parser.error(f"سناریوی نامعتبر: {', '.join(unknown)}")
+
+    out = sys.stdout
+    base = args.url
+    if base is None:
+        _, fake_url = fake_openai.start(config=fake_openai.config_from_args(args))
+        base = start_local_app(fake_url)
+        if not args.verbose:
+            # چاپ‌های برنامه در همین پروسه گزارش را شلوغ می‌کنند
+            sys.stdout = open(os.devnull, "w", encoding="utf-8")
+    base = base.rstrip("/")
+
+    results = []
+    for name in scenarios:
+        if args.warmup:
+            run_scenario(name, base, args.warmup, 1, args.timeout)
+        print(f"اجرای سناریو {name} ...", file=sys.stderr)
+        results.append(run_scenario(name, base, args.requests, args.concurrency, args.timeout))
+
+    print_report(results, out)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    failures = check_thresholds(results, args.max_p95, args.max_error_rate)
+    for failure in failures:
+        print(f"عبور از آستانه: {failure}", file=out)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""
+سرور جایگزین سازگار با OpenAI برای آزمایش و بنچمارک بدون اینترنت
+
+مسیرهای /v1/chat/completions (معمولی و stream)، /v1/images/generations و /v1/models را
+پیاده می‌کند؛ آدرس تصویرهای ساخته‌شده (/images/...) یک PNG واقعی 1024 پیکسلی برمی‌گرداند. برای درخواست‌های ارزیابی (response_format=json_object) یک JSON ارزیابی آماده
+با نمره‌های تصادفی برمی‌گرداند (در ارزیابی گروهی، یکی برای هر متن). تاخیر هر نوع درخواست
+و نرخ خطا قابل تنظیم است.
+
+اجرا:
+    python fake_openai.py --port 8808 --latency lognormal:400:0.5 --error-rate 0.02
+سپس برنامه را با این متغیرها اجرا کنید:
+    OPENAI_BASE_URL=http://127.0.0.1:8808/v1 OPENAI_API_KEY=fake python server.py
+
+توزیع‌های تاخیر (میلی‌ثانیه): const:MS، uniform:LO:HI، lognormal:MEDIAN:SIGMA
+"""
+import argparse
+import json
+import math
+import random
+import struct
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+
+CRITERIA = ("relevance", "coherence", "creativity", "grammar", "engagement", "completeness")
+WORDS = ("در", "باغ", "شب", "ماه", "آرام", "بود", "و", "باد", "از", "کوه", "می‌گذشت", "دل",
+         "من", "با", "ستاره‌ها", "سخن", "می‌گفت", "تا", "سپیده", "رسید")
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """تبدیل توضیح توزیع تاخیر به تابعی که تاخیر را به ثانیه برمی‌گرداند"""
+    kind, _, rest = spec.partition(":")
+    args = [float(x) for x in rest.split(":") if x]
+    if kind == "const" and len(args) == 1:
+        return lambda: args[0] / 1000
+    if kind == "uniform" and len(args) == 2:
+        return lambda: random.uniform(args[0], args[1]) / 1000
+    if kind == "lognormal" and len(args) == 2:
+        mu = math.log(max(args[0], 1e-3))
+        return lambda: random.lognormvariate(mu, args[1]) / 1000
+    raise ValueError(f"توزیع تاخیر نامعتبر: {spec}")
+
+
+class FakeConfig:
+    def __init__(self, latency: str = "const:50", eval_latency: Optional[str] = None,
+                 image_latency: Optional[str] = None, chunk_delay: float = 5,
+                 error_rate: float = 0.0, scores: Tuple[float, float] = (5, 9),
+                 words: int = 60, seed: Optional[int] = None):
+        self.text_latency = parse_latency(latency)
+        self.eval_latency = parse_latency(eval_latency or latency)
+        self.image_latency = parse_latency(image_latency or latency)
+        self.chunk_delay = chunk_delay / 1000
+        self.error_rate = error_rate
+        self.scores = scores
+        self.words = words
+        self.stats = {"requests": 0, "errors": 0}
+        self._lock = threading.Lock()
+        if seed is not None:
+            random.seed(seed)
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+
+def _text(n_words: int) -> str:
+    return " ".join(random.choice(WORDS) for _ in range(n_words)) + "."
+
+
+def _png(size: int = 1024) -> bytes:
+    """یک PNG تک‌رنگ با رنگ تصادفی (فقط با کتابخانه استاندارد)"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    row = b"\x00" + bytes(random.randrange(256) for _ in range(3)) * size
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * size)) + chunk(b"IEND", b""))
+
+
+def _evaluation() -> Dict[str, Any]:
+    return {
+        "issues": ["برخی تصویرها تکراری است"],
+        "suggestions": ["از تشبیه‌های تازه‌تر استفاده کنید"],
+        "rewrite_hint": "پایان متن را کوتاه‌تر و تصویری‌تر کنید",
+        "analysis_summary": "متن روان است اما تصویرسازی آن می‌تواند قوی‌تر باشد"
+    }
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    config: FakeConfig = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _maybe_fail(self) -> bool:
+        if random.random() >= self.config.error_rate:
+            return False
+        self.config.count("errors")
+        status = random.choice((429, 500, 503))
+        self._send_json(status, {"error": {"message": "fake upstream error", "type": "server_error",
+                                           "code": status}})
+        return True
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [
+                {"id": m, "object": "model", "owned_by": "fake"} for m in ("gpt-4o", "gpt-4o-mini", "dall-e-3")
+            ]})
+        elif self.path == "/stats":
+            self._send_json(200, self.config.stats)
+        elif self.path.startswith("/images/"):
+            body = _png()
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid json"}})
+            return
+        self.config.count("requests")
+
+        if self.path.endswith("/chat/completions"):
+            self._chat(payload)
+        elif self.path.endswith("/images/generations"):
+            time.sleep(self.config.image_latency())
+            if not self._maybe_fail():
+                self._send_json(200, {"created": int(time.time()), "data": [
+                    {"url": f"http://{self.headers.get('Host')}/images/{uuid.uuid4().hex}.png"}
+                ]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def _chat(self, payload: Dict[str, Any]):
+        model = payload.get("model", "gpt-4o")
+        is_eval = (payload.get("response_format") or {}).get("type") == "json_object"
+        time.sleep((self.config.eval_latency if is_eval else self.config.text_latency)())
+        if self._maybe_fail():
+            return
+
+        if is_eval:
+            low, high = self.config.scores
+            user_msg = str((payload.get("messages") or [{}])[-1].get("content", ""))
+            evaluations = [{
+                "index": i + 1,
+                "score_details": {c: round(random.uniform(low, high), 1) for c in CRITERIA},
+                **_evaluation()
+            } for i in range(max(1, user_msg.count("### متن ")))]
+            if '"evaluations"' in user_msg:
+                content = json.dumps({"evaluations": evaluations}, ensure_ascii=False)
+            else:
+                evaluations[0].pop("index")
+                content = json.dumps(evaluations[0], ensure_ascii=False)
+        else:
+            max_tokens = payload.get("max_tokens") or self.config.words
+            content = _text(max(1, min(self.config.words, int(max_tokens))))
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        if payload.get("stream"):
+            self._stream(completion_id, created, model, content)
+            return
+        self._send_json(200, {
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(content.split()), "total_tokens": 0}
+        })
+
+    def _stream(self, completion_id: str, created: int, model: str, content: str):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta, finish=None):
+            data = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            self.wfile.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        chunk({"role": "assistant", "content": ""})
+        for word in content.split(" "):
+            time.sleep(self.config.chunk_delay)
+            chunk({"content": word + " "})
+        chunk({}, "stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start(host: str = "127.0.0.1", port: int = 0, config: Optional[FakeConfig] = None):
+    """اجرای سرور در یک thread پس‌زمینه؛ خروجی: (سرور، آدرس پایه /v1)"""
+    handler = type("Handler", (FakeOpenAIHandler,), {"config": config or FakeConfig()})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f"http://{host}:{httpd.server_address[1]}/v1"
+
+
+def config_from_args(args) -> FakeConfig:
+    low, _, high = args.scores.partition(":")
+    return FakeConfig(latency=args.latency, eval_latency=args.eval_latency, image_latency=args.image_latency,
+                      chunk_delay=args.chunk_delay, error_rate=args.error_rate,
+                      scores=(float(low), float(high or low)), words=args.words, seed=args.seed)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", default="const:50", help="تاخیر درخواست‌های متن")
+    parser.add_argument("--eval-latency", default=None, help="تاخیر درخواست‌های ارزیابی (پیش‌فرض: مثل متن)")
+    parser.add_argument("--image-latency", default=None, help="تاخیر ساخت تصویر (پیش‌فرض: مثل متن)")
+    parser.add_argument("--chunk-delay", type=float, default=5, help="فاصله بین تکه‌های stream (میلی‌ثانیه)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="احتمال پاسخ 429/500/503")
+    parser.add_argument("--scores", default="5:9", help="بازه نمره‌های ارزیابی، مثلا 5:9")
+    parser.add_argument("--words", type=int, default=60, help="حداکثر تعداد کلمات متن تولیدی")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="سرور جایگزین سازگار با OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    add_arguments(parser)
+    args = parser.parse_args()
+    httpd, url = start(args.host, args.port, config_from_args(args))
+    print(f"سرور جایگزین OpenAI در {url} اجرا شد")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        httpd.shutdown()
@@ -0,0 +1,179 @@
+"""
+ذخیره محلی تصویرهای تولیدشده توسط AI
+
+آدرس‌هایی که سرویس تصویر برمی‌گرداند بعد از مدتی منقضی می‌شوند و تصویر اصلی 1024 پیکسل یا
+بزرگ‌تر است. به محض تولید، آدرس در جدول ai_images ثبت و تصویر در پس‌زمینه یک بار دانلود
+می‌شود؛ نسخه اصلی و نسخه‌های thumb و medium (WebP و JPEG) با نام هش محتوا در static/ai_images
+ذخیره می‌شوند (همان روش profile_photos). اثری که ذخیره می‌شود به نسخه محلی اشاره می‌کند؛ اگر
+دانلود هنوز تمام نشده باشد، پس از پایان آن آدرس اثر جایگزین می‌شود.
+
+    python generated_images.py backfill [--dry-run]
+    python generated_images.py prune [--days=7]
+"""
+import logging
+import os
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import profile_photos
+import storage
+
+log = logging.getLogger(__name__)
+
+IMAGE_DIR = os.path.join("static", "ai_images")
+LOCAL_PREFIX = "/static/ai_images/"
+SIZES = {"thumb": 320, "medium": 768}
+DOWNLOAD_TIMEOUT = float(os.environ.get("AI_IMAGE_DOWNLOAD_TIMEOUT", 30))
+MAX_BYTES = int(os.environ.get("AI_IMAGE_MAX_BYTES", 20 * 1024 * 1024))
+KEEP_DAYS = int(os.environ.get("AI_IMAGE_KEEP_DAYS", 7))
+
+_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("AI_IMAGE_WORKERS", 2)),
+                               thread_name_prefix="ai-image")
+
+
+def local_url(name: str) -> str:
+    return LOCAL_PREFIX + name
+
+
+def is_local(image_url: Optional[str]) -> bool:
+    return bool(image_url) and image_url.startswith(LOCAL_PREFIX)
+
+
+def download(url: str) -> bytes:
+    if not url.startswith(("http://", "https://")):
+        raise ValueError(f"آدرس تصویر نامعتبر: {url}")
+    with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as resp:
+        data = resp.read(MAX_BYTES + 1)
+    if len(data) > MAX_BYTES:
+        raise ValueError("حجم تصویر بیش از حد مجاز است")
+    return data
+
+
+def store(data: bytes, filename: str = "image.png") -> str:
+    """ذخیره تصویر و نسخه‌های کوچک آن؛ خروجی: نام فایل اصلی"""
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    return profile_photos.save_photo(data, filename, IMAGE_DIR, SIZES)
+
+
+def fetch(url: str) -> Optional[str]:
+    """دانلود یک تصویر ثبت‌شده و انتقال آثاری که به آدرس اصلی اشاره می‌کنند به نسخه محلی"""
+    started = time.monotonic()
+    try:
+        name = store(download(url), os.path.basename(urlparse(url).path))
+    except Exception as e:
+        storage.set_ai_image(url, "failed", error=str(e)[:300])
+        log.warning("خطا در دریافت تصویر تولیدشده: %s", e)
+        return None
+    storage.set_ai_image(url, "done", name=name)
+    moved = storage.replace_image_url(url, local_url(name))
+    log.info("تصویر تولیدشده ذخیره شد: %s (%.1f ثانیه، %d اثر)", name, time.monotonic() - started, moved)
+    return name
+
+
+def ingest(url: str):
+    """ثبت تصویر تازه و دانلود آن در پس‌زمینه؛ بلافاصله برمی‌گردد"""
+    if url and storage.register_ai_image(url):
+        _executor.submit(fetch, url)
+
+
+def resolve(image_url: Optional[str]) -> str:
+    """
+    آدرسی که هنگام ذخیره اثر ثبت می‌شود: نسخه محلی اگر آماده باشد، وگرنه آدرس اصلی تا پایان دانلود.
+    فقط تصویرهایی پذیرفته می‌شوند که همین برنامه ساخته است
+    """
+    if not image_url:
+        return ""
+    if is_local(image_url):
+        name = os.path.basename(image_url)
+        return image_url if os.path.isfile(os.path.join(IMAGE_DIR, name)) else ""
+    record = storage.get_ai_image(image_url)
+    if record is None:
+        return ""
+    if record["status"] == "done":
+        return local_url(record["name"])
+    if record["status"] == "failed":
+        storage.set_ai_image(image_url, "pending")
+        _executor.submit(fetch, image_url)
+    return image_url
+
+
+def settle(image_url: Optional[str]) -> int:
+    """
+    پس از ثبت اثر: اگر دانلود در همین فاصله تمام شده باشد، آدرس اثر به نسخه محلی تغییر می‌کند.
+    خروجی: تعداد آثار تغییرکرده
+    """
+    if not image_url or is_local(image_url):
+        return 0
+    record = storage.get_ai_image(image_url)
+    if record and record["status"] == "done":
+        return storage.replace_image_url(image_url, local_url(record["name"]))
+    return 0
+
+
+def variant_url(image_url: Optional[str], size: str = "medium", fmt: str = "jpg") -> Optional[str]:
+    """آدرس نسخه کوچک‌شده تصویر محلی (در صورت وجود)؛ آدرس‌های خارجی بدون تغییر"""
+    if not is_local(image_url):
+        return image_url
+    name = image_url[len(LOCAL_PREFIX):]
+    return local_url(profile_photos.variant(name, size, fmt, IMAGE_DIR))
+
+
+# ---------- نگهداری ----------
+
+def backfill(dry_run: bool = False) -> Dict[str, int]:
+    """دانلود تصویر آثاری که هنوز به آدرس خارجی اشاره می‌کنند (آدرس‌های منقضی‌شده شکست می‌خورند)"""
+    stats = {"downloaded": 0, "failed": 0}
+    for url in sorted({url for _, _, url in storage.remote_image_artworks()}):
+        if dry_run:
+            print(url)
+            continue
+        storage.register_ai_image(url)
+        record = storage.get_ai_image(url)
+        if record["status"] == "done":
+            storage.replace_image_url(url, local_url(record["name"]))
+            stats["downloaded"] += 1
+        else:
+            stats["downloaded" if fetch(url) else "failed"] += 1
+    return stats
+
+
+def prune(days: int = KEEP_DAYS) -> Dict[str, int]:
+    """حذف تصویرهای قدیمی‌تر از days روز که در هیچ اثری ذخیره نشده‌اند"""
+    stats = {"deleted": 0, "kept": 0}
+    cutoff = time.time() - days * 86400
+    # تصویرهای یکسان نام یکسان دارند؛ فایلی که رکورد تازه‌تری هم دارد نباید حذف شود
+    recent = {r["name"] for r in storage.list_ai_images() if r["name"] and r["created_at"] >= cutoff}
+    for record in storage.list_ai_images(before=cutoff):
+        name = record["name"]
+        if storage.image_url_in_use(record["url"]) or (name and storage.image_url_in_use(local_url(name))) \
+                or name in recent:
+            stats["kept"] += 1
+            continue
+        if name:
+            files = [name] + [profile_photos.variant(name, size, fmt, IMAGE_DIR)
+                              for size in SIZES for fmt in ("webp", "jpg")]
+            for filename in set(files):
+                path = os.path.join(IMAGE_DIR, filename)
+                if os.path.isfile(path):
+                    os.remove(path)
+        storage.delete_ai_image(record["url"])
+        stats["deleted"] += 1
+    return stats
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "backfill":
+        storage.init_db()
+        print(backfill(dry_run="--dry-run" in sys.argv))
+    elif command == "prune":
+        storage.init_db()
+        days = [a.split("=", 1)[1] for a in sys.argv[2:] if a.startswith("--days=")]
+        print(prune(int(days[0]) if days else KEEP_DAYS))
+    else:
+        print("usage: python generated_images.py backfill [--dry-run]")
+        print("       python generated_images.py prune [--days=7]")
@@ -0,0 +1,151 @@
+"""
+نگهداری وضعیت تولیدهای AI برای regenerate_ai
+
+دو پیاده‌سازی با یک رابط دارد: memory (فقط همین پروسه) و sqlite (مشترک بین workerهای gunicorn
+در پایگاه داده storage). هر مدخل فشرده ذخیره می‌شود، تعداد مدخل‌ها سقف دارد و انقضا
+با یک heap (یا ایندکس expires_at در sqlite) انجام می‌شود، نه با پیمایش همه مدخل‌ها.
+انتخاب پیاده‌سازی: متغیر محیطی GENERATION_STORE=sqlite|memory
+
+update تغییر یک مدخل را اتمی انجام می‌دهد (قفل در memory، compare-and-swap در sqlite) تا دو
+regenerate هم‌زمان برای یک تولید، تلاش‌های باقی‌مانده را دو بار مصرف نکنند یا روی هم ننویسند.
+"""
+import copy
+import heapq
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import storage
+
+BACKEND = os.environ.get("GENERATION_STORE", "sqlite")
+TTL = float(os.environ.get("GENERATION_TTL", 1800))
+MAX_ENTRIES = int(os.environ.get("GENERATION_MAX_ENTRIES", 1000))
+# تعداد تلاش update در sqlite وقتی worker دیگری هم‌زمان همان مدخل را تغییر داده است
+UPDATE_ATTEMPTS = 5
+
+# تابع تغییر: وضعیت فعلی را می‌گیرد و وضعیت جدید، یا None برای انصراف، برمی‌گرداند
+Change = Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+# فقط فیلدهایی که regenerate_ai لازم دارد
+STATE_FIELDS = [
+    "prompt", "messages", "generator_model", "temperature", "max_tokens",
+    "enable_evaluation", "evaluator_model", "evaluation_criteria", "quality_threshold",
+    "remaining", "last_score", "last_parse_error", "last_evaluation",
+    "regeneration_count", "last_temperature",
+]
+
+
+def compact(state: Dict[str, Any]) -> Dict[str, Any]:
+    """حذف فیلدهای اضافه؛ از ارزیابی قبلی فقط راهنمای بازنویسی و دو ایراد اول می‌ماند"""
+    result = {k: state[k] for k in STATE_FIELDS if state.get(k) is not None}
+    if "evaluation_criteria" in result:
+        result["evaluation_criteria"] = {k: True for k, v in result["evaluation_criteria"].items() if v}
+    last_eval = result.get("last_evaluation")
+    if last_eval:
+        result["last_evaluation"] = {
+            "rewrite_hint": last_eval.get("rewrite_hint", ""),
+            "issues": list(last_eval.get("issues") or [])[:2],
+        }
+    return result
+
+
+class MemoryGenerationStore:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        heap = self._heap
+        while heap and (heap[0][0] <= now or len(self._entries) > self.max_entries):
+            expires_at, generation_id = heapq.heappop(heap)
+            entry = self._entries.get(generation_id)
+            if entry is not None and entry[0] == expires_at:
+                del self._entries[generation_id]
+
+    def put(self, generation_id: str, state: Dict[str, Any]):
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._entries[generation_id] = (expires_at, compact(state))
+            heapq.heappush(self._heap, (expires_at, generation_id))
+            self._expire(now)
+
+    def get(self, generation_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._expire(time.time())
+            entry = self._entries.get(generation_id)
+            return copy.deepcopy(entry[1]) if entry else None
+
+    def update(self, generation_id: str, change: Change) -> Optional[Dict[str, Any]]:
+        """تغییر اتمی مدخل موجود بدون تمدید زمان انقضا؛ خروجی وضعیت جدید یا None"""
+        with self._lock:
+            self._expire(time.time())
+            entry = self._entries.get(generation_id)
+            if entry is None:
+                return None
+            state = change(copy.deepcopy(entry[1]))
+            if state is None:
+                return None
+            self._entries[generation_id] = (entry[0], compact(state))
+            return copy.deepcopy(self._entries[generation_id][1])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries),
+                    "max_entries": self.max_entries, "ttl": self.ttl}
+
+
+class SQLiteGenerationStore:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    @staticmethod
+    def _dump(state: Dict[str, Any]) -> str:
+        return json.dumps(compact(state), ensure_ascii=False, separators=(",", ":"))
+
+    def put(self, generation_id: str, state: Dict[str, Any]):
+        storage.save_generation(generation_id, self._dump(state), time.time() + self.ttl, self.max_entries)
+
+    def get(self, generation_id: str) -> Optional[Dict[str, Any]]:
+        raw = storage.load_generation(generation_id)
+        return json.loads(raw) if raw is not None else None
+
+    def update(self, generation_id: str, change: Change) -> Optional[Dict[str, Any]]:
+        """تغییر اتمی مدخل؛ اگر worker دیگری در این فاصله نوشته باشد، با وضعیت تازه تکرار می‌شود"""
+        for _ in range(UPDATE_ATTEMPTS):
+            raw = storage.load_generation(generation_id)
+            if raw is None:
+                return None
+            state = change(json.loads(raw))
+            if state is None:
+                return None
+            new_raw = self._dump(state)
+            if storage.update_generation(generation_id, raw, new_raw):
+                return json.loads(new_raw)
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "sqlite", "entries": storage.count_generations(),
+                "max_entries": self.max_entries, "ttl": self.ttl}
+
+
+def create_store(backend: str = BACKEND):
+    if backend == "memory":
+        return MemoryGenerationStore()
+    if backend == "sqlite":
+        return SQLiteGenerationStore()
+    raise ValueError(f"GENERATION_STORE نامعتبر: {backend}")
+
+
+_store = create_store()
+
+put = _store.put
+get = _store.get
+update = _store.update
+stats = _store.stats
@@ -0,0 +1,192 @@
+"""
+آمار و فید «آخرین آثار» صفحه اصلی در حافظه
+
+تعداد آثار هر دسته، تعداد نویسندگان فعال و یک حلقه جدیدترین‌اول از آثار عمومی هر دسته
+یک بار از پایگاه داده ساخته می‌شود و مسیرهای ایجاد/حذف/ویرایش آن را به‌روز می‌کنند.
+تغییرات پروسه‌های دیگر از روی نسخه جدول artworks تشخیص داده می‌شود؛ این بررسی حداکثر
+هر CHECK_INTERVAL ثانیه یک بار انجام می‌شود تا رندر صفحه اصلی فقط از حافظه باشد.
+
+خواندن بدون قفل است: حلقه‌ها و شمارنده‌ها پس از انتشار تغییر نمی‌کنند و نویسنده‌ها نسخه تازه
+را می‌سازند و با یک انتساب جایگزین می‌کنند؛ _version هم فقط بعد از به‌روز شدن داده‌ها تنظیم می‌شود.
+"""
+import os
+import threading
+import time
+from collections import Counter, deque
+from types import MappingProxyType
+from typing import Any, Deque, Dict, List, Optional
+
+import storage
+
+CATEGORIES = ("poems", "stories", "literature")
+RING_SIZE = 16
+CHECK_INTERVAL = float(os.environ.get("HOME_FEED_CHECK_INTERVAL", 1.0))
+
+
+class HomeFeed:
+    def __init__(self, ring_size: int = RING_SIZE):
+        self.ring_size = ring_size
+        self._counts: Dict[str, int] = {}
+        self._public_counts: Dict[str, int] = {}
+        self._authors: Counter = Counter()
+        self._rings: Dict[str, Deque[MappingProxyType]] = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+
+    # ---------- ساخت از پایگاه داده ----------
+
+    def _load_ring(self, category: str) -> Deque[MappingProxyType]:
+        records, _ = storage.page_artworks(category, limit=self.ring_size)
+        return deque((MappingProxyType(r) for r in records), maxlen=self.ring_size)
+
+    def rebuild(self):
+        with self._lock:
+            version = storage.table_version("artworks")
+            self._counts = {cat: storage.count_artworks(cat) for cat in CATEGORIES}
+            self._public_counts = {cat: storage.count_visible_artworks(cat) for cat in CATEGORIES}
+            self._rings = {cat: self._load_ring(cat) for cat in CATEGORIES}
+            self._authors = Counter(storage.author_artwork_counts())
+            self._version = version
+            self._checked_at = time.monotonic()
+
+    def _ensure(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < CHECK_INTERVAL:
+            return
+        with self._lock:
+            if storage.table_version("artworks") != self._version:
+                self.rebuild()
+            self._checked_at = now
+
+    def _next_version(self) -> Optional[int]:
+        """
+        هر نوشتن روی artworks نسخه را دقیقا یکی بالا می‌برد؛ اگر پرش بیشتر باشد
+        پروسه دیگری هم نوشته و به جای به‌روزرسانی تدریجی همه چیز دوباره ساخته می‌شود (خروجی None).
+        نسخه برگشتی را فراخوان پس از به‌روز کردن حلقه‌ها و شمارنده‌ها در _version می‌گذارد
+        """
+        version = storage.table_version("artworks")
+        if self._version is None or version != self._version + 1:
+            self.rebuild()
+            return None
+        return version
+
+    # ---------- به‌روزرسانی تدریجی ----------
+
+    def _drop_from_ring(self, category: str, item_id: int):
+        ring = self._rings.get(category)
+        if ring is None:
+            return
+        kept = [r for r in ring if r["شماره"] != item_id]
+        if len(kept) != len(ring):
+            if len(kept) < min(self.ring_size, self._public_counts.get(category, 0)):
+                self._rings[category] = self._load_ring(category)
+            else:
+                self._rings[category] = deque(kept, maxlen=self.ring_size)
+
+    def _place_in_ring(self, category: str, rec: Dict[str, Any]):
+        items = [r for r in self._rings.get(category, ()) if r["شماره"] != rec["شماره"]]
+        items.append(MappingProxyType(dict(rec)))
+        items.sort(key=lambda r: r["شماره"], reverse=True)
+        self._rings[category] = deque(items[:self.ring_size], maxlen=self.ring_size)
+
+    def _set_count(self, attr: str, category: str, delta: int):
+        counts = dict(getattr(self, attr))
+        counts[category] = max(0, counts.get(category, 0) + delta)
+        setattr(self, attr, counts)
+
+    def _add_author(self, username: str, delta: int):
+        authors = Counter(self._authors)
+        authors[username] += delta
+        if authors[username] <= 0:
+            del authors[username]
+        self._authors = authors
+
+    def added(self, category: str, item_id: int):
+        with self._lock:
+            version = self._next_version()
+            if version is None:
+                return
+            rec = storage.get_artwork(category, item_id)
+            if rec is not None:
+                self._set_count("_counts", category, 1)
+                if rec.get("username"):
+                    self._add_author(rec["username"], 1)
+                if storage.is_public(rec):
+                    self._set_count("_public_counts", category, 1)
+                    self._place_in_ring(category, rec)
+            self._version = version
+
+    def removed(self, category: str, item_id: int, username: str, was_public: bool = True):
+        with self._lock:
+            version = self._next_version()
+            if version is None:
+                return
+            self._set_count("_counts", category, -1)
+            if username:
+                self._add_author(username, -1)
+            if was_public:
+                self._set_count("_public_counts", category, -1)
+            self._drop_from_ring(category, item_id)
+            self._version = version
+
+    def edited(self, category: str, item_id: int, was_public: bool = True):
+        with self._lock:
+            version = self._next_version()
+            if version is None:
+                return
+            rec = storage.get_artwork(category, item_id)
+            if rec is not None:
+                is_public = storage.is_public(rec)
+                self._set_count("_public_counts", category, int(is_public) - int(was_public))
+                if is_public:
+                    ring = self._rings.get(category)
+                    oldest = ring[-1]["شماره"] if ring and len(ring) == self.ring_size else None
+                    if oldest is None or item_id >= oldest:
+                        self._place_in_ring(category, rec)
+                else:
+                    self._drop_from_ring(category, item_id)
+            self._version = version
+
+    # ---------- خواندن ----------
+
+    def latest(self, category: str, n: int = 4) -> List[Dict[str, Any]]:
+        self._ensure()
+        ring = self._rings.get(category, ())
+        return [dict(r) for i, r in enumerate(ring) if i < n]
+
+    def count(self, category: str) -> int:
+        self._ensure()
+        return self._counts.get(category, 0)
+
+    def authors_count(self) -> int:
+        self._ensure()
+        return len(self._authors)
+
+    def version(self) -> Optional[int]:
+        """نسخه جدول artworks که داده‌های فعلی فید از آن ساخته شده‌اند"""
+        self._ensure()
+        return self._version
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        self._ensure()
+        with self._lock:
+            return {
+                "version": self._version,
+                "authors": len(self._authors),
+                **{f"{cat}_count": self._counts.get(cat, 0) for cat in CATEGORIES},
+                **{f"{cat}_public": self._public_counts.get(cat, 0) for cat in CATEGORIES}
+            }
+
+
+_feed = HomeFeed()
+
+latest = _feed.latest
+count = _feed.count
+authors_count = _feed.authors_count
+added = _feed.added
+removed = _feed.removed
+edited = _feed.edited
+rebuild = _feed.rebuild
+stats = _feed.stats
+version = _feed.version
@@ -0,0 +1,281 @@
+"""
+لایه واسط فراخوانی‌های مدل زبانی
+
+همان رابط کلاینت OpenAI (chat.completions.create، images.generate و with_options) را دارد و
+روی هر فراخوانی این موارد را اعمال می‌کند:
+- مهلت کلی برای هر نوع فراخوانی (متن، ارزیابی، تصویر) که همه تلاش‌ها را در بر می‌گیرد
+- تلاش مجدد با backoff تصادفی فقط برای خطاهای گذرا (قطع اتصال، timeout، 429 و 5xx)
+- سقف تعداد فراخوانی هم‌زمان برای هر مدل
+- circuit breaker برای هر مدل: بعد از چند خطای پشت سر هم، تا پایان زمان استراحت فراخوانی‌ها
+  بدون تماس با سرویس رد می‌شوند و سپس یک فراخوانی آزمایشی وضعیت را مشخص می‌کند
+"""
+import logging
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional
+
+import openai
+
+log = logging.getLogger(__name__)
+
+TIMEOUTS = {
+    "text": float(os.environ.get("AI_TEXT_TIMEOUT", 60)),
+    "evaluation": float(os.environ.get("AI_EVAL_TIMEOUT", 45)),
+    "image": float(os.environ.get("AI_IMAGE_TIMEOUT", 90)),
+}
+MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 2))
+BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", 0.5))
+BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", 8))
+MODEL_CONCURRENCY = int(os.environ.get("LLM_MODEL_CONCURRENCY", 4))
+# حداکثر زمان انتظار برای خالی شدن جای فراخوانی یک مدل
+QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", 10))
+BREAKER_THRESHOLD = int(os.environ.get("LLM_BREAKER_THRESHOLD", 5))
+BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", 30))
+
+_models_lock = threading.Lock()
+
+_TRANSIENT = (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError,
+              openai.InternalServerError)
+
+
+class GatewayError(Exception):
+    pass
+
+
+class CircuitOpenError(GatewayError):
+    pass
+
+
+class ModelBusyError(GatewayError):
+    pass
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, _TRANSIENT):
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(error, openai.APIStatusError) and (status in (408, 409, 429) or (status or 0) >= 500)
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def _cooled_down(self) -> bool:
+        return time.monotonic() - self._opened_at >= self.cooldown
+
+    def rejecting(self) -> bool:
+        """بررسی بدون تغییر وضعیت؛ برای رد سریع پیش از انتظار در صف مدل"""
+        with self._lock:
+            if self.state == "open":
+                return not self._cooled_down()
+            return self.state == "half_open" and self._trial
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and self._cooled_down():
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold):
+                self.state = "open"
+                self.trips += 1
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = max(0.0, self.cooldown - (time.monotonic() - self._opened_at)) if self.state == "open" else 0.0
+            return {"state": self.state, "failures": self.failures, "trips": self.trips,
+                    "retry_in": round(retry_in, 1)}
+
+
+class _ModelState:
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.semaphore = threading.BoundedSemaphore(concurrency)
+        self.breaker = CircuitBreaker()
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.rejected = 0
+        self.last_error = None
+        self.last_latency = None
+
+    def count(self, **deltas):
+        with self.lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def record(self, **values):
+        with self.lock:
+            for name, value in values.items():
+                setattr(self, name, value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "in_flight": self.in_flight, "concurrency": self.concurrency,
+                "calls": self.calls, "errors": self.errors, "retries": self.retries,
+                "rejected": self.rejected, "last_error": self.last_error,
+                "last_latency": self.last_latency, "breaker": self.breaker.snapshot()
+            }
+
+
+class _GuardedStream:
+    """جای مدل تا پایان خواندن جریان پاسخ نگه داشته می‌شود؛ close اتصال جریان را هم می‌بندد"""
+
+    def __init__(self, stream, release: Callable[[], None]):
+        self._source = stream
+        self._stream = iter(stream)
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._stream)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        release, self._release = self._release, None
+        if release is None:
+            return
+        try:
+            close = getattr(self._source, "close", None)
+            if close is not None:
+                close()
+        finally:
+            release()
+
+    def __del__(self):
+        self.close()
+
+
+class Gateway:
+    def __init__(self, client, timeouts: Optional[Dict[str, float]] = None,
+                 concurrency: int = MODEL_CONCURRENCY, max_retries: int = MAX_RETRIES,
+                 _models: Optional[Dict[str, _ModelState]] = None, _timeout: Optional[float] = None):
+        self._client = client
+        self.timeouts = timeouts or TIMEOUTS
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self._models = _models if _models is not None else {}
+        self._timeout = _timeout
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+        self.images = SimpleNamespace(generate=self._generate_image)
+
+    def with_options(self, **options) -> "Gateway":
+        """مثل کلاینت OpenAI؛ وضعیت مدل‌ها (صف و breaker) بین نسخه‌ها مشترک است"""
+        timeout = options.get("timeout", self._timeout)
+        return Gateway(self._client.with_options(**options), self.timeouts, self.concurrency,
+                       self.max_retries, _models=self._models, _timeout=timeout)
+
+    def _state(self, model: str) -> _ModelState:
+        with _models_lock:
+            state = self._models.get(model)
+            if state is None:
+                state = self._models[model] = _ModelState(self.concurrency)
+            return state
+
+    def _create_completion(self, **kwargs):
+        kind = "evaluation" if kwargs.get("response_format") else "text"
+        return self._call(kind, kwargs.get("model", ""), self._client.chat.completions.create, kwargs)
+
+    def _generate_image(self, **kwargs):
+        return self._call("image", kwargs.get("model", ""), self._client.images.generate, kwargs)
+
+    def _call(self, kind: str, model: str, fn: Callable, kwargs: Dict[str, Any]):
+        timeout = kwargs.pop("timeout", None) or self._timeout or self.timeouts[kind]
+        deadline = time.monotonic() + timeout
+        state = self._state(model)
+        breaker = state.breaker
+
+        if breaker.rejecting():
+            state.count(rejected=1)
+            raise CircuitOpenError(f"سرویس مدل {model} موقتا در دسترس نیست")
+        if not state.semaphore.acquire(timeout=min(QUEUE_TIMEOUT, timeout)):
+            state.count(rejected=1)
+            raise ModelBusyError(f"تعداد درخواست‌های هم‌زمان مدل {model} به سقف رسیده است")
+        state.count(in_flight=1, calls=1)
+
+        def release():
+            state.count(in_flight=-1)
+            state.semaphore.release()
+
+        handed_off = False
+
+        try:
+            if not breaker.allow():
+                state.count(rejected=1)
+                raise CircuitOpenError(f"سرویس مدل {model} موقتا در دسترس نیست")
+            attempt = 0
+            while True:
+                started = time.monotonic()
+                remaining = deadline - started
+                try:
+                    result = fn(timeout=remaining, **kwargs)
+                except Exception as e:
+                    if not is_transient(e):
+                        # سرویس پاسخ داده؛ خطای خود درخواست است
+                        breaker.success()
+                        raise
+                    breaker.failure()
+                    state.count(errors=1)
+                    state.record(last_error=f"{type(e).__name__}: {e}"[:200])
+                    attempt += 1
+                    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+                    if attempt > self.max_retries or deadline - time.monotonic() <= delay or breaker.rejecting():
+                        raise
+                    log.warning("تلاش مجدد %d برای %s (%s) پس از %.2f ثانیه: %s", attempt, model, kind, delay, e)
+                    state.count(retries=1)
+                    time.sleep(delay)
+                    continue
+                breaker.success()
+                state.record(last_latency=round(time.monotonic() - started, 3))
+                if kwargs.get("stream"):
+                    handed_off = True
+                    return _GuardedStream(result, release)
+                return result
+        finally:
+            if not handed_off:
+                release()
+
+    def status(self) -> Dict[str, Any]:
+        with _models_lock:
+            models = dict(self._models)
+        return {
+            "timeouts": self.timeouts,
+            "max_retries": self.max_retries,
+            "concurrency": self.concurrency,
+            "models": {name: state.snapshot() for name, state in models.items()}
+        }
@@ -0,0 +1,42 @@
+"""
+کش HTML رندرشده صفحه‌ها و تکه‌های تکراری (صفحه اصلی مهمان، دسته‌ها، نویسندگان، شبکه آخرین آثار)
+
+هر مدخل با کلید (نام قالب، پارامترها) و نسخه داده‌هایی که صفحه از آن ساخته شده نگهداری
+می‌شود. نسخه‌ها را triggerهای پایگاه داده در همان تراکنش نوشتن بالا می‌برند، پس هر مسیر
+نوشتن (ثبت، ویرایش و حذف اثر، ثبت‌نام، تغییر بیو یا عکس) کش همه workerها را بدون فراخوانی
+جداگانه باطل می‌کند. حجم کل محدود است و قدیمی‌ترین مدخل‌ها حذف می‌شوند (read_cache.ReadCache).
+"""
+import os
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+import storage
+from read_cache import ReadCache
+
+MAX_BYTES = int(os.environ.get("PAGE_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+ENABLED = os.environ.get("PAGE_CACHE", "1") not in ("0", "false", "no")
+
+_cache = ReadCache(MAX_BYTES)
+
+
+def versions(*resources: str) -> Tuple[int, ...]:
+    """نسخه منابع نام‌برده (storage.RESOURCE_KEYS)؛ باید پیش از خواندن داده‌های صفحه گرفته شود"""
+    return storage.resource_versions(list(resources))[0]
+
+
+def get(key: Tuple[Hashable, ...], version: Any, render: Callable[[], str]) -> str:
+    """
+    HTML کش‌شده برای این کلید و نسخه، یا رندر و ذخیره آن.
+    نسخه پیش از رندر خوانده می‌شود؛ اگر داده‌ها در این فاصله تغییر کنند، درخواست بعدی با نسخه
+    تازه دوباره رندر می‌کند و هیچ وقت HTML کهنه زیر نسخه جدید نمی‌ماند
+    """
+    if not ENABLED:
+        return render()
+    return _cache.get(("pages",) + tuple(key), version, render)
+
+
+def clear():
+    _cache.clear()
+
+
+def stats() -> Dict[str, int]:
+    return _cache.stats()
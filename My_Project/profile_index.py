@@ -0,0 +1,81 @@
+"""
+ایندکس username -> پروفایل برای پیوند نام نویسنده‌ها به آثار
+
+یک بار از پایگاه داده ساخته می‌شود و هر وقت نسخه جدول profiles عوض شود
+(signup یا update_bio در همین پروسه یا پروسه‌های دیگر) دوباره ساخته می‌شود.
+"""
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+import storage
+
+
+class ProfileRecord:
+    __slots__ = ("username", "first_name", "last_name", "phone", "photo", "email", "bio")
+
+    def __init__(self, username, first_name, last_name, phone, photo, email, bio):
+        self.username = username
+        self.first_name = first_name
+        self.last_name = last_name
+        self.phone = phone
+        self.photo = photo
+        self.email = email
+        self.bio = bio
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
+class ProfileIndex:
+    def __init__(self):
+        self._by_username: Dict[str, ProfileRecord] = {}
+        self._order: Tuple[ProfileRecord, ...] = ()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _ensure(self):
+        version = storage.table_version("profiles")
+        if version != self._version:
+            self.refresh(version)
+
+    def refresh(self, version=None):
+        if version is None:
+            version = storage.table_version("profiles")
+        order = tuple(
+            ProfileRecord(*(row[f] for f in storage.PROFILE_FIELDS))
+            for row in storage.list_profiles()
+        )
+        with self._lock:
+            self._order = order
+            self._by_username = {p.username: p for p in order}
+            self._version = version
+
+    def get(self, username: str) -> Optional[ProfileRecord]:
+        self._ensure()
+        return self._by_username.get(username)
+
+    def all(self) -> Tuple[ProfileRecord, ...]:
+        self._ensure()
+        return self._order
+
+    def attach_names(self, records: Iterable[dict], missing_first: str = "", missing_last: str = ""):
+        """افزودن first_name و last_name نویسنده به هر رکورد با یک پیمایش دیکشنری"""
+        self._ensure()
+        by_username = self._by_username
+        for rec in records:
+            profile = by_username.get(rec.get("username"))
+            if profile is not None:
+                rec["first_name"] = profile.first_name
+                rec["last_name"] = profile.last_name
+            else:
+                rec["first_name"] = missing_first
+                rec["last_name"] = missing_last
+        return records
+
+
+_index = ProfileIndex()
+
+get = _index.get
+all_profiles = _index.all
+attach_names = _index.attach_names
+refresh = _index.refresh
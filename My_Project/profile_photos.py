@@ -0,0 +1,165 @@
+"""
+پردازش عکس پروفایل
+
+عکس آپلودشده یک بار decode می‌شود و در کنار نسخه اصلی، نسخه‌های thumb و medium با فرمت
+WebP و JPEG (برای مرورگرهای قدیمی) ساخته می‌شوند. نام فایل‌ها از هش محتوا گرفته می‌شود،
+پس عکس‌های تکراری یک بار ذخیره می‌شوند:
+    <hash>.<ext>           نسخه اصلی، بدون تغییر
+    <hash>_thumb.webp/jpg  برای آواتارهای کوچک
+    <hash>_medium.webp/jpg برای کارت و صفحه نویسنده
+Pillow اختیاری است؛ بدون آن فقط نسخه اصلی با نام هش ذخیره می‌شود و قالب‌ها همان را نشان می‌دهند.
+
+    python profile_photos.py backfill [--dry-run] [--delete-unused]
+"""
+import hashlib
+import io
+import os
+import re
+import sys
+from typing import Dict, Optional
+
+import storage
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+PROFILE_DIR = os.path.join("static", "profile_pics")
+SIZES = {"thumb": 160, "medium": 480}
+WEBP_QUALITY = int(os.environ.get("PROFILE_WEBP_QUALITY", 80))
+JPEG_QUALITY = int(os.environ.get("PROFILE_JPEG_QUALITY", 82))
+FORMAT_EXT = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif", "BMP": "bmp"}
+
+_HASHED = re.compile(r"^([0-9a-f]{20})\.[a-z0-9]+$")
+_variants: Dict[str, bool] = {}
+
+
+def content_name(data: bytes, ext: str) -> str:
+    return f"{hashlib.sha256(data).hexdigest()[:20]}.{ext}"
+
+
+def _variant_name(photo: str, size: str, fmt: str) -> Optional[str]:
+    match = _HASHED.match(photo or "")
+    return f"{match.group(1)}_{size}.{fmt}" if match else None
+
+
+def _encode(img, fmt: str) -> bytes:
+    out = io.BytesIO()
+    if fmt == "webp":
+        img.save(out, "WEBP", quality=WEBP_QUALITY, method=4)
+    else:
+        if img.mode != "RGB":
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel("A") if "A" in img.getbands() else None)
+            img = background
+        img.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def save_photo(data: bytes, filename: str = "", directory: str = PROFILE_DIR,
+               sizes: Optional[Dict[str, int]] = None) -> str:
+    """
+    ذخیره عکس و نسخه‌های آن؛ خروجی: نامی که در پروفایل ثبت می‌شود
+    اگر Pillow نصب باشد و فایل تصویر معتبر نباشد ValueError می‌دهد
+    """
+    if Image is None:
+        ext = os.path.splitext(filename)[1].lstrip(".").lower() or "jpg"
+        name = content_name(data, ext)
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            storage.atomic_write(path, data)
+        return name
+
+    try:
+        img = Image.open(io.BytesIO(data))
+        ext = FORMAT_EXT.get(img.format, "jpg")
+        img = ImageOps.exif_transpose(img)
+        img.load()
+    except Exception as e:
+        raise ValueError(f"فایل تصویر معتبر نیست: {e}")
+
+    name = content_name(data, ext)
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        storage.atomic_write(path, data)
+
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info or "A" in img.getbands() else "RGB")
+    for size, px in (sizes or SIZES).items():
+        resized = None
+        for fmt in ("webp", "jpg"):
+            variant = os.path.join(directory, _variant_name(name, size, fmt))
+            if os.path.exists(variant):
+                continue
+            if resized is None:
+                resized = img.copy()
+                resized.thumbnail((px, px), Image.LANCZOS)
+            storage.atomic_write(variant, _encode(resized, fmt))
+            _variants.pop(variant, None)
+    return name
+
+
+def variant(photo: str, size: str = "thumb", fmt: str = "jpg", directory: str = PROFILE_DIR) -> str:
+    """
+    نام فایل نسخه مناسب عکس در profile_pics؛ برای عکس‌های قدیمی یا بدون نسخه، خود عکس
+    """
+    name = _variant_name(photo, size, fmt)
+    if name is None:
+        return photo
+    path = os.path.join(directory, name)
+    exists = _variants.get(path)
+    if exists is None:
+        exists = _variants[path] = os.path.exists(path)
+    return name if exists else photo
+
+
+# ---------- تبدیل عکس‌های موجود ----------
+
+def backfill(dry_run: bool = False, delete_unused: bool = False, directory: str = PROFILE_DIR) -> Dict[str, int]:
+    """پردازش عکس‌های پروفایل قدیمی و ثبت نام جدید آن‌ها در پایگاه داده"""
+    stats = {"converted": 0, "skipped": 0, "missing": 0, "invalid": 0, "deleted": 0}
+    replaced = set()
+    for profile in storage.list_profiles():
+        photo = profile["photo"]
+        if not photo or photo.startswith(("http://", "https://")) or _HASHED.match(photo):
+            stats["skipped"] += 1
+            continue
+        path = os.path.join(directory, photo)
+        if not os.path.isfile(path):
+            stats["missing"] += 1
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        if dry_run:
+            print(f"{profile['username']}: {photo} ({len(data) // 1024} KB)")
+            stats["converted"] += 1
+            continue
+        try:
+            name = save_photo(data, photo, directory)
+        except ValueError as e:
+            print(f"{profile['username']}: {e}")
+            stats["invalid"] += 1
+            continue
+        storage.update_photo(profile["username"], name)
+        replaced.add(photo)
+        stats["converted"] += 1
+        print(f"{profile['username']}: {photo} -> {name}")
+
+    if delete_unused and not dry_run:
+        in_use = {p["photo"] for p in storage.list_profiles()}
+        for photo in replaced - in_use:
+            os.remove(os.path.join(directory, photo))
+            stats["deleted"] += 1
+    return stats
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "backfill":
+        storage.init_db()
+        if Image is None:
+            print("Pillow نصب نیست؛ فقط نام‌گذاری بر اساس هش انجام می‌شود (pip install Pillow)")
+        print(backfill(dry_run="--dry-run" in sys.argv, delete_unused="--delete-unused" in sys.argv))
+    else:
+        print("usage: python profile_photos.py backfill [--dry-run] [--delete-unused]")
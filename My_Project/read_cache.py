@@ -0,0 +1,85 @@
+"""
+کش مشترک خواندنی‌ها در سطح پروسه
+
+هر مدخل با نسخه داده‌ای که از آن ساخته شده نگهداری می‌شود و تا وقتی نسخه عوض نشده،
+خواندن دوباره هزینه‌ای ندارد. حجم کل کش محدود است و قدیمی‌ترین مدخل‌ها (LRU) حذف می‌شوند.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+MAX_BYTES = int(os.environ.get("READ_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+
+def freeze(records) -> Tuple[MappingProxyType, ...]:
+    """فهرست رکوردها را به یک نسخه فقط‌خواندنی تبدیل می‌کند"""
+    return tuple(MappingProxyType(dict(r)) for r in records)
+
+
+def estimate_size(value: Any) -> int:
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    if isinstance(value, (dict, MappingProxyType)):
+        return sys.getsizeof(dict(value)) + sum(estimate_size(v) for v in value.values())
+    return sys.getsizeof(value)
+
+
+class ReadCache:
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[Any, Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: Any, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = loader()
+        size = estimate_size(value)
+
+        with self._lock:
+            self._discard(key)
+            if size <= self.max_bytes:
+                self._entries[key] = (version, value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes and self._entries:
+                    oldest = next(iter(self._entries))
+                    self._discard(oldest)
+        return value
+
+    def _discard(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def invalidate(self, table: str):
+        """حذف همه مدخل‌هایی که کلیدشان با نام جدول شروع می‌شود"""
+        with self._lock:
+            for key in [k for k in self._entries if isinstance(k, tuple) and k and k[0] == table]:
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
@@ -0,0 +1,164 @@
+"""
+کش پاسخ‌های مدل زبانی و نتایج ارزیابی
+
+کلید، هش پیام‌های یکسان‌سازی‌شده و پارامترهای نمونه‌برداری (مدل، دما، max_tokens) است.
+نتایج evaluate_text جداگانه با هش متن، درخواست، مدل ارزیاب و معیارها نگهداری می‌شوند.
+لایه حافظه یک LRU با سقف تعداد و TTL است؛ لایه اختیاری دیسک در پایگاه داده storage
+نگهداری می‌شود تا بعد از ری‌استارت و بین workerها هم در دسترس باشد. پاسخ‌ها و ارزیابی‌ها هر کدام
+جدول و سقف دیسک خود را دارند (response_cache و evaluation_cache).
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import storage
+
+log = logging.getLogger(__name__)
+
+MAX_ENTRIES = int(os.environ.get("AI_CACHE_MAX_ENTRIES", 512))
+DISK_MAX_ENTRIES = int(os.environ.get("AI_CACHE_DISK_MAX_ENTRIES", 5000))
+EVAL_DISK_MAX_ENTRIES = int(os.environ.get("AI_EVAL_CACHE_DISK_MAX_ENTRIES", 5000))
+TTL = float(os.environ.get("AI_CACHE_TTL", 24 * 3600))
+DISK_ENABLED = os.environ.get("AI_CACHE_DISK", "1") not in ("0", "false", "no")
+# generate_ai فقط وقتی کش می‌شود که دما از این مقدار بیشتر نباشد
+MAX_TEMPERATURE = float(os.environ.get("AI_CACHE_MAX_TEMPERATURE", 0.3))
+
+_SPACES = re.compile(r"\s+")
+
+
+def _normalize_messages(messages: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    return [(m.get("role", ""), _SPACES.sub(" ", str(m.get("content", ""))).strip()) for m in messages]
+
+
+def make_key(model: str, messages: List[Dict[str, Any]], temperature: Optional[float] = None,
+             max_tokens: Optional[int] = None) -> str:
+    payload = {
+        "model": model,
+        "messages": _normalize_messages(messages),
+        "temperature": round(temperature, 2) if temperature is not None else None,
+        "max_tokens": max_tokens,
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def make_evaluation_key(text: str, prompt: str, model: str, criteria: Dict[str, bool]) -> str:
+    payload = {
+        "kind": "evaluation",
+        "text": _SPACES.sub(" ", text or "").strip(),
+        "prompt": _SPACES.sub(" ", prompt or "").strip(),
+        "model": model,
+        "criteria": sorted(k for k, v in criteria.items() if v),
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL, disk: bool = DISK_ENABLED,
+                 table: str = "response_cache", disk_max_entries: int = DISK_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk = disk
+        self.table = table
+        self.disk_max_entries = disk_max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+
+        if self.disk:
+            try:
+                found = storage.load_cached_response(key, self.table)
+            except Exception as e:
+                log.warning("خطا در خواندن کش پاسخ از دیسک: %s", e)
+                found = None
+            if found is not None:
+                with self._lock:
+                    self._remember(key, found[0], found[1])
+                    self.disk_hits += 1
+                return found[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: str):
+        if not value:
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+        if self.disk:
+            try:
+                storage.save_cached_response(key, value, expires_at, self.disk_max_entries, self.table)
+            except Exception as e:
+                log.warning("خطا در ذخیره کش پاسخ روی دیسک: %s", e)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "disk": self.disk,
+                "table": self.table,
+                "disk_max_entries": self.disk_max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses
+            }
+
+
+_cache = ResponseCache()
+_evaluations = ResponseCache(table="evaluation_cache", disk_max_entries=EVAL_DISK_MAX_ENTRIES)
+
+get = _cache.get
+put = _cache.put
+clear = _cache.clear
+stats = _cache.stats
+
+
+def get_evaluation(key: str) -> Optional[Dict[str, Any]]:
+    value = _evaluations.get(key)
+    return json.loads(value) if value is not None else None
+
+
+def put_evaluation(key: str, result: Dict[str, Any]):
+    """فقط نتیجه پردازش‌شده ذخیره می‌شود؛ پاسخ خام ارزیاب و نتایج خطادار کش نمی‌شوند"""
+    if result.get("parse_error"):
+        return
+    parsed = {k: v for k, v in result.items() if k not in ("raw_response", "traceback")}
+    _evaluations.put(key, json.dumps(parsed, ensure_ascii=False))
+
+
+clear_evaluations = _evaluations.clear
+evaluation_stats = _evaluations.stats
@@ -0,0 +1,136 @@
+"""
+ایندکس معکوس جستجوی فارسی روی عنوان و محتوای آثار
+
+متن قبل از ایندکس شدن و هنگام جستجو یکسان‌سازی می‌شود (ی/ک عربی، نیم‌فاصله، اعراب، ارقام)
+و در یک جدول FTS5 کنار جدول artworks نگهداری می‌شود. رتبه‌بندی با bm25 انجام می‌شود.
+این ماژول فقط با اتصالی که storage می‌دهد کار می‌کند.
+"""
+import re
+import sqlite3
+from typing import Iterable, List, Optional, Tuple
+
+CATEGORY_CODES = {"poems": 1, "stories": 2, "literature": 3}
+_ROWID_SPAN = 1 << 40
+
+TITLE_WEIGHT = 3.0
+CONTENT_WEIGHT = 1.0
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS artworks_fts USING fts5(
+    title,
+    content,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+_CHAR_MAP = str.maketrans({
+    "\u064a": "\u06cc",  # ي -> ی
+    "\u0649": "\u06cc",  # ى -> ی
+    "\u0626": "\u06cc",  # ئ -> ی
+    "\u0643": "\u06a9",  # ك -> ک
+    "\u0629": "\u0647",  # ة -> ه
+    "\u06c0": "\u0647",  # ۀ -> ه
+    "\u0623": "\u0627",  # أ -> ا
+    "\u0625": "\u0627",  # إ -> ا
+    "\u0622": "\u0627",  # آ -> ا
+    "\u0671": "\u0627",  # ٱ -> ا
+    "\u0624": "\u0648",  # ؤ -> و
+    "\u200c": "",        # نیم‌فاصله
+    "\u200d": "",
+    "\u0640": "",        # کشیده
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+})
+
+_DIACRITICS = re.compile("[\u064b-\u065f\u0670\u06d6-\u06ed]")
+_TOKEN = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    if not text:
+        return ""
+    text = _DIACRITICS.sub("", str(text))
+    return text.translate(_CHAR_MAP).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(normalize(text))
+
+
+def doc_id(category: str, item_id: int) -> int:
+    return CATEGORY_CODES[category] * _ROWID_SPAN + int(item_id)
+
+
+def _category_range(category: str) -> Tuple[int, int]:
+    base = CATEGORY_CODES[category] * _ROWID_SPAN
+    return base, base + _ROWID_SPAN - 1
+
+
+def create(conn: sqlite3.Connection):
+    conn.executescript(SCHEMA)
+
+
+def index_artwork(conn: sqlite3.Connection, category: str, item_id: int, title: str, content: str):
+    rowid = doc_id(category, item_id)
+    conn.execute("DELETE FROM artworks_fts WHERE rowid = ?", (rowid,))
+    conn.execute(
+        "INSERT INTO artworks_fts (rowid, title, content) VALUES (?, ?, ?)",
+        (rowid, " ".join(tokenize(title)), " ".join(tokenize(content)))
+    )
+
+
+def remove_artwork(conn: sqlite3.Connection, category: str, item_id: int):
+    conn.execute("DELETE FROM artworks_fts WHERE rowid = ?", (doc_id(category, item_id),))
+
+
+def rebuild(conn: sqlite3.Connection) -> int:
+    conn.execute("DELETE FROM artworks_fts")
+    rows = conn.execute("SELECT category, item_id, title, content FROM artworks").fetchall()
+    for row in rows:
+        if row["category"] in CATEGORY_CODES:
+            index_artwork(conn, row["category"], row["item_id"], row["title"], row["content"])
+    return len(rows)
+
+
+def is_empty(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM artworks_fts LIMIT 1").fetchone() is None
+
+
+def match_expression(query: str) -> Optional[str]:
+    """هر واژه پرس‌وجو به صورت پیشوندی جستجو می‌شود و همه واژه‌ها باید وجود داشته باشند"""
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+    return " AND ".join(f'"{t}"*' for t in tokens)
+
+
+def search(conn: sqlite3.Connection, category: str, query: str,
+           owner: Optional[str] = None, viewer: Optional[str] = None,
+           visible_sql: Optional[str] = None, limit: int = 200) -> Iterable[sqlite3.Row]:
+    """
+    جستجوی رتبه‌بندی‌شده در یک دسته
+    owner: فقط آثار این کاربر (همه وضعیت‌ها)
+    viewer: آثاری که شرط visible_sql (storage.VISIBLE_SQL، با viewer به جای ?) برایش برقرار است
+    """
+    expression = match_expression(query)
+    if expression is None or category not in CATEGORY_CODES:
+        return []
+
+    low, high = _category_range(category)
+    sql = (
+        "SELECT a.*, bm25(artworks_fts, ?, ?) AS rank FROM artworks_fts "
+        "JOIN artworks a ON a.category = ? AND a.item_id = artworks_fts.rowid - ? "
+        "WHERE artworks_fts MATCH ? AND artworks_fts.rowid BETWEEN ? AND ?"
+    )
+    params = [TITLE_WEIGHT, CONTENT_WEIGHT, category, low, expression, low, high]
+    if owner is not None:
+        sql += " AND a.username = ?"
+        params.append(owner)
+    else:
+        if visible_sql is None:
+            raise ValueError("visible_sql برای جستجوی بدون owner لازم است")
+        sql += f" AND {visible_sql}"
+        params.append(viewer or "")
+    sql += " ORDER BY rank LIMIT ?"
+    params.append(limit)
+    return conn.execute(sql, params).fetchall()
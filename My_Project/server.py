@@ -1,30 +1,48 @@
-from flask import Flask, request, render_template, url_for,flash, redirect, jsonify, session
-import pandas as pd
+from flask import Flask, request, render_template, url_for,flash, redirect, jsonify, session, Response, stream_with_context, make_response
 from openai import OpenAI
-from datetime import datetime
+from datetime import datetime, timezone
 from werkzeug.utils import secure_filename
+from markupsafe import Markup
 import json
+import base64
+import hashlib
 import time
 import uuid
 import re
-from typing import Dict, Any, Optional
+import random
+from typing import Dict, Any, List, Optional
 import traceback
 import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+import sqlite3
+import storage
+import profile_index
+import page_cache
+import home_feed
+import response_cache
+import generation_store
+import llm_gateway
+import batch_eval
+import profile_photos
+import generated_images
+import static_assets
 
 app = Flask(__name__)
-
-app.secret_key = os.urandom(24)
+app.view_functions["static"] = static_assets.serve
+app.add_template_global(static_assets.asset_url, "asset_url")
 
 SAVE_DIR = "excel_files"
 os.makedirs(SAVE_DIR, exist_ok=True)
-PROFILE_DIR = os.path.join("static", "profile_pics")
+PROFILE_DIR = profile_photos.PROFILE_DIR
 os.makedirs(PROFILE_DIR, exist_ok=True)
-PROFILE_FILE = os.path.join(SAVE_DIR, "profiles.xlsx")
-USERS_FILE = os.path.join(SAVE_DIR, "users.xlsx")
-
-INTERACT_FILE = os.path.join(SAVE_DIR, "interactions.xlsx")
+storage.init_db()
+storage.migrate_from_excel(SAVE_DIR)
+storage.start_compactor()
+static_assets.build()
 
-EVALUATION_FILE = os.path.join(SAVE_DIR, "evaluations.xlsx")
+# همه workerها باید یک کلید داشته باشند تا session در هر کدام معتبر باشد
+app.secret_key = os.environ.get("SECRET_KEY") or storage.shared_secret("flask_session")
 
 @app.route('/evaluations')
 def show_evaluations():
@@ -43,19 +61,9 @@ def show_evaluations():
                 message="محتوای مشخصی انتخاب نشده است."
             )
 
-        if not os.path.exists(EVALUATION_FILE):
-            return render_template(
-                'evaluations.html',
-                username=username,
-                evaluations=[],
-                message="هنوز هیچ ارزیابی ثبت نشده است."
-            )
-
-        df = pd.read_excel(EVALUATION_FILE)
+        content_evaluations = storage.list_evaluations(int(item_id))
 
-        content_evaluations = df[df['item_id'] == int(item_id)]
-
-        if content_evaluations.empty:
+        if not content_evaluations:
             return render_template(
                 'evaluations.html',
                 username=username,
@@ -64,7 +72,7 @@ def show_evaluations():
             )
 
         evaluations = []
-        for _, row in content_evaluations.iterrows():
+        for row in content_evaluations:
             evaluations.append({
                 'username': row['username'],
                 'category': row['category'],
@@ -140,22 +148,7 @@ def evaluate(cat, item_id):
                     "error": f"Missing field: {field}"
                 }), 400
 
-        if os.path.exists(EVALUATION_FILE):
-            df_old = pd.read_excel(EVALUATION_FILE)
-        else:
-            df_old = pd.DataFrame()
-
-        for col in ['username', 'category', 'item_id']:
-            if col not in df_old.columns:
-                df_old[col] = None
-
-        duplicate = df_old[
-            (df_old['username'] == username) &
-            (df_old['category'] == cat) &
-            (df_old['item_id'].astype(str) == str(item_id))
-        ]
-
-        if not duplicate.empty:
+        if storage.has_evaluated(username, cat, item_id):
             return jsonify({
                 "success": False,
                 "error": "شما قبلاً این اثر را ارزیابی کرده‌اید"
@@ -164,7 +157,7 @@ def evaluate(cat, item_id):
         row = {
             'username': username,
             'category': cat,
-            'item_id': item_id,
+            'item_id': int(item_id),
             'fluency': int(data['fluency']),
             'creativity': int(data['creativity']),
             'emotional_impact': int(data['emotional_impact']),
@@ -177,10 +170,11 @@ def evaluate(cat, item_id):
             'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
 
-        df_new = pd.DataFrame([row])
-        df = pd.concat([df_old, df_new], ignore_index=True)
-
-        df.to_excel(EVALUATION_FILE, index=False)
+        if not storage.add_evaluation(row):
+            return jsonify({
+                "success": False,
+                "error": "شما قبلاً این اثر را ارزیابی کرده‌اید"
+            }), 403
 
         return jsonify({"success": True})
 
@@ -195,6 +189,52 @@ def evaluate(cat, item_id):
 
 
 
+def _home_context():
+    """شبکه آخرین آثار و آمار صفحه اصلی (از home_feed و profile_index در حافظه)"""
+    def attach_author(records):
+        profile_index.attach_names(records)
+        for rec in records:
+            rec['status'] = rec.get('status', 'public')
+            rec['tags'] = rec.get('tags', '')
+            rec['readability'] = rec.get('readability', 'easy')
+            rec['publish_date'] = rec.get('publish_date', '')
+            rec['created_at'] = rec.get('created_at', '')
+        return records
+
+    poems = attach_author(home_feed.latest('poems', n=4))
+    stories = attach_author(home_feed.latest('stories', n=4))
+    literature = attach_author(home_feed.latest('literature', n=4))
+
+    poems_count = home_feed.count('poems')
+    stories_count = home_feed.count('stories')
+    literature_count = home_feed.count('literature')
+
+    authors_count = home_feed.authors_count()
+
+    max_rows = 4
+    rows = []
+    for i in range(max_rows):
+        rows.append({
+            'poem': poems[i] if i < len(poems) else None,
+            'story': stories[i] if i < len(stories) else None,
+            'literature': literature[i] if i < len(literature) else None
+        })
+
+    return {
+        "rows": rows,
+        "poems_count": poems_count,
+        "stories_count": stories_count,
+        "literature_count": literature_count,
+        "authors_count": authors_count,
+        "total_count": poems_count + stories_count + literature_count
+    }
+
+
+def _home_version():
+    # نسخه پیش از خواندن داده‌ها گرفته می‌شود (page_cache.get)
+    return home_feed.version(), storage.table_version("profiles")
+
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     username = session.get('username', 'guest')
@@ -203,82 +243,9 @@ def index():
         if request.method == "POST":
             return redirect(url_for('login'))
 
-        profiles = {}
-        if os.path.exists(PROFILE_FILE):
-            df_profiles = pd.read_excel(PROFILE_FILE)
-            for _, row in df_profiles.iterrows():
-                profiles[row['username']] = {
-                    "first_name": row['first_name'],
-                    "last_name": row['last_name'],
-                    "phone": row['phone'],
-                    "email": row['email'],
-                    "photo": row['photo'],
-                    "bio": row['bio'] if 'bio' in row else ""
-                }
-
-        def attach_author(records):
-            for rec in records:
-                user = rec.get("username")
-                if user in profiles:
-                    rec['first_name'] = profiles[user]['first_name']
-                    rec['last_name'] = profiles[user]['last_name']
-                else:
-                    rec['first_name'] = ""
-                    rec['last_name'] = ""
-                rec['status'] = rec.get('status', 'public')
-                rec['tags'] = rec.get('tags', '')
-                rec['readability'] = rec.get('readability', 'easy')
-                rec['publish_date'] = rec.get('publish_date', '')
-                rec['created_at'] = rec.get('created_at', '')
-            return records
-
-        poems = attach_author(get_latest_records(route_map['poems']['file'], n=4))
-        stories = attach_author(get_latest_records(route_map['stories']['file'], n=4))
-        literature = attach_author(get_latest_records(route_map['literature']['file'], n=4))
-
-        def get_total_count(file_name):
-            file_path = os.path.join(SAVE_DIR, file_name)
-            if os.path.exists(file_path):
-                df = pd.read_excel(file_path)
-                return len(df)
-            return 0
-
-        poems_count = get_total_count(route_map['poems']['file'])
-        stories_count = get_total_count(route_map['stories']['file'])
-        literature_count = get_total_count(route_map['literature']['file'])
-
-        authors_count = 0
-        if os.path.exists(PROFILE_FILE):
-            df_profiles = pd.read_excel(PROFILE_FILE)
-            active_usernames = set()
-            for cat in ['poems', 'stories', 'literature']:
-                file_path = os.path.join(SAVE_DIR, route_map[cat]['file'])
-                if os.path.exists(file_path):
-                    df = pd.read_excel(file_path)
-                    if 'username' in df.columns:
-                        active_usernames.update(df['username'].dropna().unique())
-
-            authors_count = len(active_usernames)
-
-        max_rows = 4
-        rows = []
-        for i in range(max_rows):
-            rows.append({
-                'poem': poems[i] if i < len(poems) else None,
-                'story': stories[i] if i < len(stories) else None,
-                'literature': literature[i] if i < len(literature) else None
-            })
-
-        return render_template(
-            "wellcom.html",
-            rows=rows,
-            username=username,
-            poems_count=poems_count,
-            stories_count=stories_count,
-            literature_count=literature_count,
-            authors_count=authors_count,
-            total_count=poems_count + stories_count + literature_count
-        )
+        # همه مهمان‌ها یک صفحه می‌بینند
+        return page_cache.get(("wellcom.html",), _home_version(),
+                              lambda: render_template("wellcom.html", username=username, **_home_context()))
 
     else:
         if request.method == "POST":
@@ -312,23 +279,10 @@ def index():
                 except ValueError:
                     publish_date = None
 
-            file_path = os.path.join(SAVE_DIR, file_map_for_post[category])
-
-            if os.path.exists(file_path):
-                df = pd.read_excel(file_path)
-            else:
-                df = pd.DataFrame(columns=[
-                    "شماره", "دسته‌بندی", "عنوان", "محتوا", "username",
-                    "status", "tags", "readability", "publish_date", "created_at"
-                ])
-
-            new_id = df["شماره"].max() + 1 if not df.empty else 1
-
             new_row = {
-                "شماره": new_id,
-                "دسته‌بندی": category,
-                "عنوان": title,
-                "محتوا": content,
+                "category_label": category,
+                "title": title,
+                "content": content,
                 "username": username,
                 "status": status,
                 "tags": tags_str,
@@ -337,101 +291,39 @@ def index():
                 "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             }
 
-            df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-            df.to_excel(file_path, index=False)
+            item_id = storage.insert_artwork(category, new_row)
+            home_feed.added(category, item_id)
 
             flash("محتوا با موفقیت ذخیره شد!", "success")
             return redirect(url_for('index'))
 
-        profiles = {}
-        if os.path.exists(PROFILE_FILE):
-            df_profiles = pd.read_excel(PROFILE_FILE)
-            for _, row in df_profiles.iterrows():
-                profiles[row['username']] = {
-                    "first_name": row['first_name'],
-                    "last_name": row['last_name'],
-                    "phone": row['phone'],
-                    "email": row['email'],
-                    "photo": row['photo'],
-                    "bio": row['bio'] if 'bio' in row else ""
-                }
-
-        def attach_author(records):
-            for rec in records:
-                user = rec.get("username")
-                if user in profiles:
-                    rec['first_name'] = profiles[user]['first_name']
-                    rec['last_name'] = profiles[user]['last_name']
-                else:
-                    rec['first_name'] = ""
-                    rec['last_name'] = ""
-                rec['status'] = rec.get('status', 'public')
-                rec['tags'] = rec.get('tags', '')
-                rec['readability'] = rec.get('readability', 'easy')
-                rec['publish_date'] = rec.get('publish_date', '')
-                rec['created_at'] = rec.get('created_at', '')
-            return records
-
-        poems = attach_author(get_latest_records(route_map['poems']['file'], n=4))
-        stories = attach_author(get_latest_records(route_map['stories']['file'], n=4))
-        literature = attach_author(get_latest_records(route_map['literature']['file'], n=4))
-
-        def get_total_count(file_name):
-            file_path = os.path.join(SAVE_DIR, file_name)
-            if os.path.exists(file_path):
-                df = pd.read_excel(file_path)
-                return len(df)
-            return 0
-
-        poems_count = get_total_count(route_map['poems']['file'])
-        stories_count = get_total_count(route_map['stories']['file'])
-        literature_count = get_total_count(route_map['literature']['file'])
-
-        authors_count = 0
-        if os.path.exists(PROFILE_FILE):
-            df_profiles = pd.read_excel(PROFILE_FILE)
-            active_usernames = set()
-            for cat in ['poems', 'stories', 'literature']:
-                file_path = os.path.join(SAVE_DIR, route_map[cat]['file'])
-                if os.path.exists(file_path):
-                    df = pd.read_excel(file_path)
-                    if 'username' in df.columns:
-                        active_usernames.update(df['username'].dropna().unique())
-
-            authors_count = len(active_usernames)
-
-        max_rows = 4
-        rows = []
-        for i in range(max_rows):
-            rows.append({
-                'poem': poems[i] if i < len(poems) else None,
-                'story': stories[i] if i < len(stories) else None,
-                'literature': literature[i] if i < len(literature) else None
-            })
+        version = _home_version()
+        context = _home_context()
+        latest_works_grid = page_cache.get(
+            ("latest_works_grid.html",), version,
+            lambda: Markup(render_template("latest_works_grid.html", rows=context["rows"]))
+        )
 
         user_profile = None
-        if username in profiles:
-            photo_file = profiles[username]['photo'] if profiles[username]['photo'] else "default-avatar.png"
+        profile = profile_index.get(username)
+        if profile:
+            photo_file = profile.photo if profile.photo else "default-avatar.png"
             user_profile = {
                 "username": username,
-                "first_name": profiles[username]['first_name'],
-                "last_name": profiles[username]['last_name'],
-                "phone": profiles[username]['phone'],
-                "email": profiles[username]['email'],
+                "first_name": profile.first_name,
+                "last_name": profile.last_name,
+                "phone": profile.phone,
+                "email": profile.email,
                 "photo": photo_file,
-                "bio": profiles[username]['bio']
+                "bio": profile.bio
             }
 
         return render_template(
             "index.html",
-            rows=rows,
+            latest_works_grid=latest_works_grid,
             user_profile=user_profile,
             username=username,
-            poems_count=poems_count,
-            stories_count=stories_count,
-            literature_count=literature_count,
-            authors_count=authors_count,
-            total_count=poems_count + stories_count + literature_count
+            **context
         )
 
 @app.route("/login", methods=["GET", "POST"])
@@ -440,13 +332,7 @@ def login():
         username = request.form.get("username").strip()
         password = request.form.get("password").strip()
 
-        if os.path.exists(USERS_FILE):
-            df = pd.read_excel(USERS_FILE)
-        else:
-            df = pd.DataFrame(columns=["username", "email", "password"])
-
-        user_row = df[(df["username"] == username) & (df["password"] == password)]
-        if not user_row.empty:
+        if storage.check_login(username, password):
             session['username'] = username
             return redirect(url_for("index"))
         else:
@@ -455,60 +341,13 @@ def login():
 
 
 
-def load_interactions():
-    if os.path.exists(INTERACT_FILE):
-        df = pd.read_excel(INTERACT_FILE)
-        if "comments" not in df.columns:
-            df["comments"] = "[]"
-        else:
-            df["comments"] = df["comments"].fillna("[]")
-        if "user_likes" not in df.columns:
-            df["user_likes"] = "[]"
-        else:
-            df["user_likes"] = df["user_likes"].fillna("[]")
-        return df
-    else:
-        return pd.DataFrame(columns=["cat", "item_id", "likes", "comments", "user_likes"])
-
-def save_interactions(df):
-    df.to_excel(INTERACT_FILE, index=False)
-
-
 @app.route("/like/<cat>/<int:item_id>", methods=["POST"])
 def like_item(cat, item_id):
     if "username" not in session:
         return jsonify({"error": "ابتدا وارد شوید"}), 401
 
     username = session["username"]
-    df = load_interactions()
-    df["item_id"] = df["item_id"].astype(int)
-    df["user_likes"] = df.get("user_likes", pd.Series(["[]"]*len(df)))
-    df["user_likes"] = df["user_likes"].fillna("[]")
-
-    mask = (df["cat"] == cat) & (df["item_id"] == item_id)
-
-    if mask.any():
-        user_likes = json.loads(df.loc[mask, "user_likes"].values[0])
-        if username in user_likes:
-            user_likes.remove(username)
-        else:
-            user_likes.append(username)
-        df.loc[mask, "user_likes"] = json.dumps(user_likes, ensure_ascii=False)
-        df.loc[mask, "likes"] = len(user_likes)
-    else:
-        df = pd.concat([df, pd.DataFrame([{
-            "cat": cat,
-            "item_id": item_id,
-            "likes": 1,
-            "comments": "[]",
-            "user_likes": json.dumps([username], ensure_ascii=False)
-        }])], ignore_index=True)
-
-    save_interactions(df)
-
-    likes = int(df.loc[(df["cat"] == cat) & (df["item_id"] == item_id), "likes"].values[0])
-    user_likes = json.loads(df.loc[(df["cat"] == cat) & (df["item_id"] == item_id), "user_likes"].values[0])
-    has_liked = username in user_likes
+    likes, has_liked = storage.toggle_like(cat, item_id, username)
 
     return jsonify({"likes": likes, "has_liked": has_liked})
 
@@ -526,12 +365,10 @@ def comment_item(cat, item_id):
     username = session["username"]
     first_name = last_name = ""
 
-    if os.path.exists(PROFILE_FILE):
-        df_profiles = pd.read_excel(PROFILE_FILE)
-        user_data = df_profiles[df_profiles['username'] == username]
-        if not user_data.empty:
-            first_name = str(user_data.iloc[0]['first_name']).strip()
-            last_name = str(user_data.iloc[0]['last_name']).strip()
+    user_data = profile_index.get(username)
+    if user_data:
+        first_name = user_data.first_name.strip()
+        last_name = user_data.last_name.strip()
 
     new_comment = {
         "username": username,
@@ -540,93 +377,108 @@ def comment_item(cat, item_id):
         "text": text
     }
 
-    df = load_interactions()
-    df["item_id"] = df["item_id"].astype(int)
-    df["comments"] = df["comments"].fillna("[]")
-    mask = (df["cat"] == cat) & (df["item_id"] == item_id)
+    new_comment = storage.add_comment(cat, item_id, new_comment)
+    interaction = storage.get_interaction(cat, item_id)
+    comments = attach_comment_names(interaction["comments"])
 
-    if mask.any():
-        comments = json.loads(df.loc[mask, "comments"].values[0])
-        comments.append(new_comment)
-        df.loc[mask, "comments"] = json.dumps(comments, ensure_ascii=False)
-    else:
-        df = pd.concat([df, pd.DataFrame([{
-            "cat": cat,
-            "item_id": item_id,
-            "likes": 0,
-            "comments": json.dumps([new_comment], ensure_ascii=False),
-            "user_likes": "[]"
-        }])], ignore_index=True)
+    return jsonify({
+        "comment": attach_comment_names([new_comment])[0],
+        "comments": comments,
+        "comment_count": interaction["comment_count"]
+    })
 
-    save_interactions(df)
 
-    comments = json.loads(df.loc[(df["cat"] == cat) & (df["item_id"] == item_id), "comments"].values[0])
+def attach_comment_names(comments):
     for c in comments:
         if c.get("first_name") and c.get("last_name"):
             c["name"] = f"{c['first_name']} {c['last_name']}"
         else:
             c["name"] = "کاربر ناشناس"
-
-    return jsonify({"comments": comments, "comment_count": len(comments)})
+    return comments
 
 
 @app.route("/interactions/<cat>/<int:item_id>")
 def get_interactions(cat, item_id):
-    df = load_interactions()
-    mask = (df["cat"] == cat) & (df["item_id"] == item_id)
-    if mask.any():
-        likes = int(df.loc[mask, "likes"].values[0])
-        comments = json.loads(df.loc[mask, "comments"].values[0])
-        user_likes = json.loads(df.loc[mask, "user_likes"].values[0])
-        has_liked = session.get("username") in user_likes
-    else:
-        likes, comments, has_liked = 0, [], False
-
-    for c in comments:
-        if c.get("first_name") and c.get("last_name"):
-            c["name"] = f"{c['first_name']} {c['last_name']}"
-        else:
-            c["name"] = "کاربر ناشناس"
+    interaction = storage.get_interaction(cat, item_id)
+    comments = attach_comment_names(interaction["comments"])
+    has_liked = storage.has_liked(cat, item_id, session.get("username"))
 
     return jsonify({
-        "likes": likes,
+        "likes": interaction["likes"],
         "comments": comments,
-        "comment_count": len(comments),
+        "comment_count": interaction["comment_count"],
         "has_liked": has_liked
     })
 
 @app.route("/likes/<cat>/<int:item_id>")
 def get_likes(cat, item_id):
-    if not os.path.exists(PROFILE_FILE):
-        return jsonify([])
+    user_likes = storage.list_likers(cat, item_id)
 
-    df = load_interactions()
-    mask = (df["cat"] == cat) & (df["item_id"] == item_id)
+    result = [{"username": uname} for uname in user_likes]
+    profile_index.attach_names(result, "کاربر", "ناشناس")
+    for rec in result:
+        rec["first_name"] = rec["first_name"].strip()
+        rec["last_name"] = rec["last_name"].strip()
 
-    if not mask.any():
-        return jsonify([])
+    return jsonify(result)
 
-    user_likes = json.loads(df.loc[mask, "user_likes"].values[0])
 
-    df_profiles = pd.read_excel(PROFILE_FILE)
+MAX_BATCH_INTERACTIONS = 200
 
-    result = []
-    for uname in user_likes:
-        user_data = df_profiles[df_profiles['username'] == uname]
-        if not user_data.empty:
-            first_name = str(user_data.iloc[0]['first_name']).strip()
-            last_name = str(user_data.iloc[0]['last_name']).strip()
-        else:
-            first_name, last_name = "کاربر", "ناشناس"
 
-        result.append({
-            "username": uname,
-            "first_name": first_name,
-            "last_name": last_name
-        })
+@app.route("/interactions/batch", methods=["POST"])
+def batch_interactions():
+    """
+    لایک‌ها، تعداد کامنت‌ها، has_liked و نام لایک‌کننده‌های چند اثر در یک درخواست
+    بدنه: {"items": [{"cat": "شعر", "item_id": 3}, ...], "likers": true, "comments": false}
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get("items")
+    if not isinstance(items, list):
+        return jsonify({"error": "فهرست items الزامی است"}), 400
+    if len(items) > MAX_BATCH_INTERACTIONS:
+        return jsonify({"error": f"حداکثر {MAX_BATCH_INTERACTIONS} اثر در هر درخواست"}), 400
+
+    keys = []
+    for item in items:
+        try:
+            if isinstance(item, dict):
+                keys.append((str(item["cat"]), int(item["item_id"])))
+            else:
+                cat, item_id = item
+                keys.append((str(cat), int(item_id)))
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "قالب items نامعتبر است"}), 400
 
-    return jsonify(result)
+    with_likers = _to_bool(data.get("likers", True))
+    with_comments = _to_bool(data.get("comments", False))
+    found = storage.batch_interactions(keys, viewer=session.get("username"),
+                                       with_likers=with_likers, with_comments=with_comments)
 
+    liker_records = []
+    result = []
+    for (cat, item_id), entry in found.items():
+        likers = [{"username": uname} for uname in entry["likers"]]
+        liker_records.extend(likers)
+        rec = {
+            "cat": cat,
+            "item_id": item_id,
+            "likes": entry["likes"],
+            "comment_count": entry["comment_count"],
+            "has_liked": entry["has_liked"]
+        }
+        if with_likers:
+            rec["likers"] = likers
+        if with_comments:
+            rec["comments"] = attach_comment_names(entry["comments"])
+        result.append(rec)
+
+    profile_index.attach_names(liker_records, "کاربر", "ناشناس")
+    for rec in liker_records:
+        rec["first_name"] = rec["first_name"].strip()
+        rec["last_name"] = rec["last_name"].strip()
+
+    return jsonify({"items": result})
 
 
 @app.route("/signup", methods=["GET", "POST"])
@@ -638,15 +490,8 @@ def signup():
         confirm_password = request.form.get("confirm_password", "").strip()
         if password != confirm_password:
             return render_template("signup.html", error="رمز عبور و تکرار آن یکسان نیست.")
-        if os.path.exists(USERS_FILE):
-            df_users = pd.read_excel(USERS_FILE)
-        else:
-            df_users = pd.DataFrame(columns=["username", "email", "password"])
-        if username in df_users["username"].values:
+        if not storage.create_user(username, email, password):
             return render_template("signup.html", error="این نام کاربری قبلا ثبت شده است.")
-        new_user = {"username": username, "email": email, "password": password}
-        df_users = pd.concat([df_users, pd.DataFrame([new_user])], ignore_index=True)
-        df_users.to_excel(USERS_FILE, index=False)
 
         first_name = request.form.get("first_name", "").strip()
         last_name = request.form.get("last_name", "").strip()
@@ -659,16 +504,12 @@ def signup():
         DEFAULT_PHOTO = "https://i.pinimg.com/1200x/97/21/05/972105c5a775f38cf33d3924aea053f1.jpg"
         photo_filename = DEFAULT_PHOTO
         if file and file.filename != "":
-            filename = secure_filename(file.filename)
-            photo_filename = f"{username}_{filename}"
-            file.save(os.path.join(PROFILE_DIR, photo_filename))
-
-        if os.path.exists(PROFILE_FILE):
-            df_profile = pd.read_excel(PROFILE_FILE)
-        else:
-            df_profile = pd.DataFrame(columns=["username", "first_name", "last_name", "phone", "photo", "email"])
+            try:
+                photo_filename = profile_photos.save_photo(file.read(), secure_filename(file.filename))
+            except ValueError as e:
+                # حساب کاربری ساخته شده؛ به جای خطا عکس پیش‌فرض گذاشته می‌شود
+                print(f"عکس پروفایل {username} رد شد: {e}")
 
-        df_profile = df_profile[df_profile["username"] != username]
         new_profile = {
             "username": username,
             "first_name": first_name,
@@ -677,13 +518,30 @@ def signup():
             "photo": photo_filename,
             "email": email
         }
-        df_profile = pd.concat([df_profile, pd.DataFrame([new_profile])], ignore_index=True)
-        df_profile.to_excel(PROFILE_FILE, index=False)
+        storage.save_profile(new_profile)
+        profile_index.refresh()
 
         return redirect(url_for("login"))
     return render_template("signup.html")
 
 
+@app.template_global()
+def avatar_url(photo, size="thumb", fmt="jpg"):
+    """آدرس نسخه کوچک‌شده عکس پروفایل (در صورت وجود)؛ آدرس‌های خارجی بدون تغییر"""
+    if not photo or photo.startswith(("http://", "https://")):
+        return photo
+    return static_assets.asset_url('profile_pics/' + profile_photos.variant(photo, size, fmt))
+
+
+@app.template_global()
+def artwork_image_url(image_url, size="medium", fmt="jpg"):
+    """آدرس نسخه کوچک‌شده تصویر اثر (در صورت ذخیره محلی)"""
+    url = generated_images.variant_url(image_url, size, fmt)
+    if generated_images.is_local(url):
+        return static_assets.asset_url('ai_images/' + url[len(generated_images.LOCAL_PREFIX):])
+    return url
+
+
 @app.route("/logout")
 def logout():
     session.pop('username', None)
@@ -702,21 +560,13 @@ route_map = {
     "literature": {"file": "literature.xlsx", "name": "متن ادبی"}
 }
 
-client = OpenAI(
-    api_key="api_key",
-    base_url='https://api.gapgpt.app/v1'
-)
-def get_latest_records(filename, n=4):
-    file_path = os.path.join(SAVE_DIR, filename)
-    if os.path.exists(file_path):
-        df = pd.read_excel(file_path)
-        if not df.empty:
-            last = df.tail(n).copy()
-            last = last.iloc[::-1]
-            return last.to_dict('records')
-    return []
-
-
+# همه فراخوانی‌های مدل از لایه واسط می‌گذرند؛ تلاش مجدد فقط آنجا انجام می‌شود
+# برای آزمایش بدون اینترنت می‌توان OPENAI_BASE_URL را به fake_openai.py داد
+client = llm_gateway.Gateway(OpenAI(
+    api_key=os.environ.get("OPENAI_API_KEY", "api_key"),
+    base_url=os.environ.get("OPENAI_BASE_URL", 'https://api.gapgpt.app/v1'),
+    max_retries=0
+))
 @app.route("/update_bio", methods=["POST"])
 def update_bio():
     if 'username' not in session:
@@ -726,66 +576,93 @@ def update_bio():
     new_bio = data.get('bio', '').strip()
     username = session['username']
 
-    if os.path.exists(PROFILE_FILE):
-        df_profiles = pd.read_excel(PROFILE_FILE)
-    else:
-        df_profiles = pd.DataFrame(columns=['username','first_name','last_name','phone','email','photo','bio'])
-
-    if 'bio' not in df_profiles.columns:
-        df_profiles['bio'] = ""
-
-    if username in df_profiles['username'].values:
-        df_profiles.loc[df_profiles['username'] == username, 'bio'] = new_bio
-    else:
-        df_profiles = pd.concat([df_profiles, pd.DataFrame([{
-            'username': username,
-            'first_name': '',
-            'last_name': '',
-            'phone': '',
-            'email': '',
-            'photo': '',
-            'bio': new_bio
-        }])], ignore_index=True)
-
     try:
-        df_profiles.to_excel(PROFILE_FILE, index=False)
-    except PermissionError:
+        storage.update_bio(username, new_bio)
+        profile_index.refresh()
+    except sqlite3.OperationalError:
         return jsonify({'success': False, 'error': 'Permission denied to write file'})
 
     return jsonify({'success': True, 'bio': new_bio})
 
 
+# ---------- conditional GET ----------
+
+def _page_build_token():
+    """
+    با تغییر کد، قالب‌ها یا فایل‌های static (استقرار تازه) همه ETagها عوض می‌شوند؛
+    صفحه کش‌شده در مرورگر به آدرس اثرانگشتی css قدیمی اشاره می‌کند
+    """
+    template_dir = os.path.join(app.root_path, app.template_folder)
+    paths = [__file__] + [os.path.join(template_dir, name) for name in os.listdir(template_dir)]
+    for root, dirs, files in os.walk(app.static_folder):
+        dirs[:] = [d for d in dirs if d not in static_assets.UPLOAD_DIRS]
+        paths += [os.path.join(root, name) for name in files if not name.endswith((".gz", ".br"))]
+    stamp = sorted((os.path.basename(p), os.stat(p).st_mtime_ns) for p in paths if os.path.isfile(p))
+    return hashlib.sha1(repr(stamp).encode()).hexdigest()[:8]
+
+
+PAGE_BUILD = _page_build_token()
+
+
+def page_validators(*resources):
+    """
+    (ETag، Last-Modified) صفحه از روی نسخه منابعی که نشان می‌دهد (storage.RESOURCE_KEYS)
+    کاربر واردشده هم جزو کلید است چون صفحه برای مالک و مهمان فرق دارد
+    """
+    versions, modified = storage.resource_versions(list(resources))
+    key = json.dumps([PAGE_BUILD, session.get('username', ''), resources, versions], ensure_ascii=False)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:24], datetime.fromtimestamp(int(modified), timezone.utc)
+
+
+def _settled(last_modified):
+    """
+    Last-Modified دقت یک ثانیه دارد؛ تغییری در همان ثانیه زمان را عوض نمی‌کند. تا وقتی ثانیه
+    جاری تمام نشده فقط به ETag تکیه می‌شود
+    """
+    return last_modified.timestamp() < int(time.time())
+
+
+def request_is_fresh(validators):
+    """آیا نسخه‌ای که مرورگر دارد هنوز معتبر است (If-None-Match بر If-Modified-Since مقدم است)"""
+    etag, last_modified = validators
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    return request.if_modified_since is not None and _settled(last_modified) \
+        and last_modified <= request.if_modified_since
+
+
+def with_validators(body, validators):
+    response = make_response(body if body is not None else Response(status=304))
+    etag, last_modified = validators
+    response.set_etag(etag, weak=True)
+    if _settled(last_modified):
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Cookie")
+    return response
+
+
 @app.route("/view/<cat>/<int:item_id>")
 def view_item(cat, item_id):
     if cat not in route_map:
         return "مسیر نامعتبر", 404
 
-    file_name = route_map[cat]['file']
     cat_name = route_map[cat]['name']
-    file_path = os.path.join(SAVE_DIR, file_name)
-
-    if not os.path.exists(file_path):
-        return render_template("content.html", item=None, category_name=cat_name, message="فایل مورد نظر یافت نشد"), 404
-
-    df = pd.read_excel(file_path)
 
     username = session.get('username', 'guest')
 
-    if username == 'guest':
-        rec = df[(df['شماره'] == item_id) & (df['status'] == 'public')]
-    else:
-        rec = df[((df['شماره'] == item_id) & (df['status'] == 'public')) |
-                 ((df['شماره'] == item_id) & (df['status'] == 'private') & (df['username'] == username))]
+    item = storage.get_artwork(cat, item_id)
+
+    visible = item is not None and storage.can_view(item, username if username != 'guest' else None)
 
-    if rec.empty:
-        rec_check = df[df['شماره'] == item_id]
-        if rec_check.empty:
+    if not visible:
+        if item is None:
             message = "محتوا یافت نشد"
         else:
-            item_status = rec_check.iloc[0].get('status', 'public')
+            item_status = item['status']
             if item_status == 'private' and username == 'guest':
                 message = "این محتوا خصوصی است و برای مشاهده نیاز به ورود دارید"
-            elif item_status == 'private' and rec_check.iloc[0]['username'] != username:
+            elif item_status == 'private' and item['username'] != username:
                 message = "شما اجازه مشاهده این محتوا را ندارید"
             else:
                 message = "دسترسی به این محتوا امکان‌پذیر نیست"
@@ -795,7 +672,9 @@ def view_item(cat, item_id):
                              category_name=cat_name,
                              message=message), 404
 
-    item = rec.iloc[0].to_dict()
+    validators = page_validators(f"artwork:{cat}:{item_id}", f"profile:{item['username']}")
+    if request_is_fresh(validators):
+        return with_validators(None, validators)
 
     item.setdefault('status', 'public')
     item.setdefault('tags', '')
@@ -803,35 +682,27 @@ def view_item(cat, item_id):
     item.setdefault('publish_date', '')
     item.setdefault('created_at', '')
 
-    if os.path.exists(PROFILE_FILE):
-        df_profiles = pd.read_excel(PROFILE_FILE)
-        user_data = df_profiles[df_profiles['username'] == item['username']]
-        if not user_data.empty:
-            row = user_data.iloc[0]
-            item['first_name'] = row['first_name']
-            item['last_name'] = row['last_name']
-            item['author_bio'] = row.get('bio', '')
-            item['author_photo'] = row.get('photo', 'default-avatar.png')
-        else:
-            item['first_name'] = ""
-            item['last_name'] = ""
-            item['author_bio'] = ""
-            item['author_photo'] = "default-avatar.png"
+    row = profile_index.get(item['username'])
+    if row:
+        item['first_name'] = row.first_name
+        item['last_name'] = row.last_name
+        item['author_bio'] = row.bio
+        item['author_photo'] = row.photo or 'default-avatar.png'
     else:
         item['first_name'] = ""
         item['last_name'] = ""
         item['author_bio'] = ""
         item['author_photo'] = "default-avatar.png"
 
-    item['is_public'] = item['status'] == 'public'
-    item['is_private'] = item['status'] == 'private'
+    item['is_public'] = storage.is_public(item)
+    item['is_private'] = not item['is_public']
 
     item['is_owner'] = username != 'guest' and item['username'] == username
 
-    return render_template("content.html",
-                         item=item,
-                         category_name=cat_name,
-                         username=username)
+    return with_validators(render_template("content.html",
+                                           item=item,
+                                           category_name=cat_name,
+                                           username=username), validators)
 
 @app.route("/my_artworks")
 def my_artworks():
@@ -841,37 +712,19 @@ def my_artworks():
     username = session['username']
 
     all_artworks = []
-    for key, info in route_map.items():
-        file_path = os.path.join(SAVE_DIR, info['file'])
-        if os.path.exists(file_path):
-            df = pd.read_excel(file_path)
-            df = df[df['username'] == username]
-
-            for _, row in df.iterrows():
-                artwork = {
-                    "id": row['شماره'],
-                    "category": key,
-                    "دسته‌بندی": row.get('دسته‌بندی', ''),
-                    "title": row['عنوان'],
-                    "content": row['محتوا']
-                }
-
-                if 'created_at' in row:
-                    created_at = row['created_at']
-                    if isinstance(created_at, pd.Timestamp):
-                        artwork['created_at'] = created_at.strftime('%Y-%m-%d')
-                    elif isinstance(created_at, (int, float)):
-                        try:
-                            dt = datetime.fromtimestamp(created_at)
-                            artwork['created_at'] = dt.strftime('%Y-%m-%d')
-                        except:
-                            artwork['created_at'] = str(created_at)
-                    else:
-                        artwork['created_at'] = str(created_at)
-                else:
-                    artwork['created_at'] = 'تاریخ نامشخص'
+    for key in route_map:
+        for row in storage.list_artworks(key, username=username):
+            artwork = {
+                "id": row['شماره'],
+                "category": key,
+                "دسته‌بندی": row['دسته‌بندی'],
+                "title": row['عنوان'],
+                "content": row['محتوا']
+            }
+
+            artwork['created_at'] = row['created_at'] if row['created_at'] else 'تاریخ نامشخص'
 
-                all_artworks.append(artwork)
+            all_artworks.append(artwork)
 
     all_artworks.sort(key=lambda x: x["id"], reverse=True)
 
@@ -888,20 +741,9 @@ def delete_artwork(cat, item_id):
     if cat not in file_map_for_post:
         return "دسته‌بندی نامعتبر", 400
 
-    file_path = os.path.join(SAVE_DIR, file_map_for_post[cat])
-
-    if not os.path.exists(file_path):
-        return redirect(url_for("my_artworks"))
-
-    df = pd.read_excel(file_path)
-
-    if 'username' not in df.columns:
-        df['username'] = ""
-
-    mask = (df['شماره'] == item_id) & (df['username'] == username)
-    if mask.any():
-        df = df[~mask]
-        df.to_excel(file_path, index=False)
+    artwork = storage.get_artwork(cat, item_id)
+    if artwork and storage.delete_artwork(cat, item_id, username):
+        home_feed.removed(cat, item_id, username, was_public=storage.is_public(artwork))
 
     return redirect(url_for("my_artworks"))
 
@@ -916,17 +758,10 @@ def edit_artwork(cat, item_id):
     if cat not in route_map:
         return "مسیر نامعتبر", 404
 
-    file_path = os.path.join(SAVE_DIR, route_map[cat]['file'])
-    if not os.path.exists(file_path):
-        return "فایل پیدا نشد", 404
-
-    df = pd.read_excel(file_path)
-    rec = df[df['شماره'] == item_id]
-    if rec.empty:
+    artwork = storage.get_artwork(cat, item_id)
+    if artwork is None:
         return "رکورد پیدا نشد", 404
 
-    artwork = rec.iloc[0].to_dict()
-
     if artwork.get("username") != username:
         return "شما اجازه ویرایش این اثر را ندارید", 403
 
@@ -934,52 +769,105 @@ def edit_artwork(cat, item_id):
         title = request.form.get("title", "").strip()
         content = request.form.get("content", "").strip()
 
-        df.loc[df['شماره'] == item_id, 'عنوان'] = title
-        df.loc[df['شماره'] == item_id, 'محتوا'] = content
-        df.to_excel(file_path, index=False)
+        if storage.update_artwork(cat, item_id, title=title, content=content):
+            home_feed.edited(cat, item_id, was_public=storage.is_public(artwork))
 
         return redirect(url_for("my_artworks"))
     return render_template("edit_artwork.html", artwork=artwork)
 
 
+CATEGORY_PAGE_SIZE = 20
+LISTING_CATEGORIES = ("poems", "stories", "literature")
+LISTING_DEFAULT_FIELDS = ["شماره", "عنوان", "username", "first_name", "last_name", "created_at"]
+LISTING_FIELDS = set(storage.ARTWORK_FIELDS.values()) | {"first_name", "last_name"}
+
+
+def encode_cursor(cat, item_id):
+    raw = f"{cat}:{item_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, cat):
+    """کرسر نامعتبر یا متعلق به دسته دیگر ValueError می‌دهد"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        cursor_cat, item_id = raw.rsplit(":", 1)
+        item_id = int(item_id)
+    except Exception:
+        raise ValueError("کرسر نامعتبر")
+    if cursor_cat != cat:
+        raise ValueError("کرسر متعلق به این دسته نیست")
+    return item_id
+
+
+def get_artworks_page(cat, cursor=None, limit=CATEGORY_PAGE_SIZE):
+    before = decode_cursor(cursor, cat) if cursor else None
+    records, last_id = storage.page_artworks(cat, before=before, limit=limit,
+                                             viewer=session.get('username'))
+    profile_index.attach_names(records)
+    next_cursor = encode_cursor(cat, last_id) if last_id is not None else None
+    return records, next_cursor
+
+
+@app.route("/api/artworks")
+def api_artworks():
+    """
+    فهرست صفحه‌بندی‌شده آثار یک دسته، جدیدترین اول
+    پارامترها: cat، cursor (از پاسخ قبلی)، limit، fields (با کاما جدا شده)
+    """
+    cat = request.args.get("cat", "")
+    if cat not in LISTING_CATEGORIES:
+        return jsonify({"error": "دسته‌بندی نامعتبر"}), 400
+
+    limit = _to_int(request.args.get("limit"), CATEGORY_PAGE_SIZE, 1, 100)
+
+    fields = LISTING_DEFAULT_FIELDS
+    if request.args.get("fields"):
+        fields = []
+        for name in request.args["fields"].split(","):
+            name = storage.ARTWORK_FIELDS.get(name.strip(), name.strip())
+            if name not in LISTING_FIELDS:
+                return jsonify({"error": f"فیلد نامعتبر: {name}"}), 400
+            fields.append(name)
+
+    try:
+        records, next_cursor = get_artworks_page(cat, request.args.get("cursor"), limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "items": [{f: rec.get(f) for f in fields} for rec in records],
+        "next_cursor": next_cursor
+    })
+
+
 @app.route("/categories")
 def categories():
-    def get_all_records_with_name(filename):
-        file_path = os.path.join(SAVE_DIR, filename)
-        if os.path.exists(file_path):
-            df = pd.read_excel(file_path)
-            if not df.empty:
-                df = df.iloc[::-1]
-                records = df.to_dict('records')
-
-                if os.path.exists(PROFILE_FILE):
-                    df_profiles = pd.read_excel(PROFILE_FILE)
-                    for rec in records:
-                        username = rec.get('username', '')
-                        user_data = df_profiles[df_profiles['username'] == username]
-                        if not user_data.empty:
-                            rec['first_name'] = user_data.iloc[0]['first_name']
-                            rec['last_name'] = user_data.iloc[0]['last_name']
-                        else:
-                            rec['first_name'] = ''
-                            rec['last_name'] = ''
-
-                        if 'created_at' in rec:
-                            rec['created_at'] = str(rec['created_at'])
-                        else:
-                            rec['created_at'] = 'تاریخ نامشخص'
-
-                return records
-        return []
-
-    poems = get_all_records_with_name(route_map['poems']['file'])
-    stories = get_all_records_with_name(route_map['stories']['file'])
-    literature = get_all_records_with_name(route_map['literature']['file'])
-
-    return render_template("categories.html",
-                           poems=poems,
-                           stories=stories,
-                           literature=literature)
+    # فقط صفحه اول هر دسته رندر می‌شود؛ بقیه با اسکرول از /api/artworks گرفته می‌شوند
+    resources = ("profiles",) + tuple(f"artworks:{cat}" for cat in LISTING_CATEGORIES)
+    validators = page_validators(*resources)
+    if request_is_fresh(validators):
+        return with_validators(None, validators)
+
+    viewer = session.get('username')
+
+    def render():
+        pages = {}
+        counts = {}
+        for cat in LISTING_CATEGORIES:
+            pages[cat] = get_artworks_page(cat)
+            counts[cat] = storage.count_visible_artworks(cat, viewer)
+
+        return render_template("categories.html",
+                               poems=pages['poems'][0],
+                               stories=pages['stories'][0],
+                               literature=pages['literature'][0],
+                               cursors={cat: page[1] for cat, page in pages.items()},
+                               counts=counts)
+
+    # تعداد آثار قابل مشاهده به کاربر بستگی دارد؛ فقط نسخه مهمان مشترک است
+    html = render() if viewer else page_cache.get(("categories.html",), page_cache.versions(*resources), render)
+    return with_validators(html, validators)
 
 @app.route("/search", methods=["GET"])
 def search():
@@ -994,35 +882,14 @@ def search():
             literature=[]
         )
 
-    def search_in_file(filename):
-        file_path = os.path.join(SAVE_DIR, filename)
-        if os.path.exists(file_path):
-            df = pd.read_excel(file_path)
-
-            result = df[
-                df['عنوان'].str.contains(query, case=False, na=False) |
-                df['محتوا'].str.contains(query, case=False, na=False)
-            ]
-
-            records = result.to_dict('records')
-
-            if os.path.exists(PROFILE_FILE):
-                df_profiles = pd.read_excel(PROFILE_FILE)
-                for rec in records:
-                    username = rec.get('username', '')
-                    user_data = df_profiles[df_profiles['username'] == username]
-                    if not user_data.empty:
-                        rec['first_name'] = user_data.iloc[0]['first_name']
-                        rec['last_name'] = user_data.iloc[0]['last_name']
-                    else:
-                        rec['first_name'] = ''
-                        rec['last_name'] = ''
-            return records
-        return []
+    viewer = session.get('username')
 
-    poems_results = search_in_file(route_map['poems']['file'])
-    stories_results = search_in_file(route_map['stories']['file'])
-    literature_results = search_in_file(route_map['literature']['file'])
+    def search_in_category(cat):
+        return profile_index.attach_names(storage.search_artworks(cat, query, viewer=viewer))
+
+    poems_results = search_in_category('poems')
+    stories_results = search_in_category('stories')
+    literature_results = search_in_category('literature')
 
     return render_template(
         "search.html",
@@ -1044,23 +911,18 @@ def search_my_artworks():
     username = session['username']
 
     results = []
-    for key, info in route_map.items():
-        file_path = os.path.join(SAVE_DIR, info['file'])
-        if os.path.exists(file_path):
-            df = pd.read_excel(file_path)
-
-            df = df[df['username'] == username]
-
-            df = df[df['عنوان'].str.contains(query, case=False, na=False) |
-                    df['محتوا'].str.contains(query, case=False, na=False)]
-
-            for _, row in df.iterrows():
-                results.append({
-                    "id": row['شماره'],
-                    "category": key,
-                    "title": row['عنوان'],
-                    "content": row['محتوا']
-                })
+    for key in route_map:
+        if query:
+            rows = storage.search_artworks(key, query, username=username)
+        else:
+            rows = storage.list_artworks(key, username=username)
+        for row in rows:
+            results.append({
+                "id": row['شماره'],
+                "category": key,
+                "title": row['عنوان'],
+                "content": row['محتوا']
+            })
     return render_template("search_my_artworks.html", query=query, results=results)
 
 
@@ -1082,21 +944,18 @@ def AI_admin():
     username = session['username']
     user_profile = None
 
-    if os.path.exists(PROFILE_FILE):
-        df_profiles = pd.read_excel(PROFILE_FILE)
-        user_row = df_profiles[df_profiles['username'] == username]
-        if not user_row.empty:
-            user_row = user_row.iloc[0]
-            photo_file = user_row['photo'] if user_row['photo'] else "default-avatar.png"
-            user_profile = {
-                "username": username,
-                "first_name": user_row.get('first_name',''),
-                "last_name": user_row.get('last_name',''),
-                "phone": user_row.get('phone',''),
-                "email": user_row.get('email',''),
-                "photo": photo_file,
-                "bio": user_row.get('bio','')
-            }
+    user_row = profile_index.get(username)
+    if user_row:
+        photo_file = user_row.photo if user_row.photo else "default-avatar.png"
+        user_profile = {
+            "username": username,
+            "first_name": user_row.first_name,
+            "last_name": user_row.last_name,
+            "phone": user_row.phone,
+            "email": user_row.email,
+            "photo": photo_file,
+            "bio": user_row.bio
+        }
 
     return render_template("AI_admin.html", user_profile=user_profile)
 
@@ -1107,12 +966,60 @@ def Human_AI_admin():
     return render_template("Human_AI_admin.html")
 
 
-AI_GENERATIONS: Dict[str, Dict[str, Any]] = {}
-def _cleanup_generations(ttl_seconds=1800):
-    now = time.time()
-    dead = [k for k,v in AI_GENERATIONS.items() if now - v.get("created_at", now) > ttl_seconds]
-    for k in dead:
-        AI_GENERATIONS.pop(k, None)
+# کارهای موازی generate_ai (متن، ارزیابی، تصویر) روی یک استخر محدود اجرا می‌شوند
+AI_POOL_SIZE = int(os.environ.get("AI_POOL_SIZE", 8))
+AI_TIMEOUTS = llm_gateway.TIMEOUTS
+ai_executor = ThreadPoolExecutor(max_workers=AI_POOL_SIZE, thread_name_prefix="ai-task")
+AI_MAX_CANDIDATES = int(os.environ.get("AI_MAX_CANDIDATES", 5))
+
+
+CANDIDATE_TEMPERATURE_RANGE = (0.1, 1.0)
+
+
+def candidate_temperature(base, index):
+    """دمای تلاش index ام؛ همان برنامه‌ای که regenerate_ai برای تولیدهای پشت سر هم استفاده می‌کند"""
+    if index == 0:
+        return base
+    elif index == 1:
+        return min(base + 0.1, 0.8)
+    elif index == 2:
+        return max(base - 0.1, 0.2)
+    return random.uniform(0.3, 0.7)
+
+
+def best_of_n_temperature(base, index):
+    """
+    دمای نامزد index ام در best-of-N: به ترتیب base، base+0.1، base-0.1، base+0.2 ... (در بازه مجاز).
+    نامزدها هم‌زمان تولید می‌شوند، پس برخلاف برنامه regenerate_ai هیچ دو نامزدی دمای یکسان ندارند
+    """
+    low, high = CANDIDATE_TEMPERATURE_RANGE
+    base = round(min(max(base, low), high), 2)
+    temperatures = [base]
+    step = 1
+    while len(temperatures) <= index and step * 0.1 <= high - low:
+        for t in (round(base + step * 0.1, 2), round(base - step * 0.1, 2)):
+            if low <= t <= high:
+                temperatures.append(t)
+        step += 1
+    return temperatures[index % len(temperatures)]
+
+
+def _wait_task(name, future, started):
+    """
+    نتیجه یک کار موازی تا پایان مهلت آن (از لحظه شروع کار)
+    خروجی: (نتیجه، None) یا (None، پیام خطا) تا بقیه نتایج از دست نروند
+    """
+    remaining = max(0.0, AI_TIMEOUTS[name] - (time.monotonic() - started))
+    try:
+        return future.result(timeout=remaining), None
+    except FuturesTimeout:
+        future.cancel()
+        app.logger.warning("مهلت %s تمام شد (%s ثانیه)", name, AI_TIMEOUTS[name])
+        return None, "مهلت پاسخ تمام شد"
+    except Exception as e:
+        app.logger.warning("خطا در %s: %s", name, e)
+        return None, str(e)
+
 
 def _to_bool(v, default=False):
     if isinstance(v, bool):
@@ -1196,8 +1103,11 @@ def parse_json_safely(text: str) -> Optional[Dict[str, Any]]:
 
     return None
 def evaluate_text(client, text: str, eval_model: str, prompt: str,
-                  evaluation_criteria: Dict[str, bool] = None) -> Dict[str, Any]:
-
+                  evaluation_criteria: Dict[str, bool] = None, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    ارزیابی با حافظه: همان متن، درخواست، مدل و معیارها دوباره به ارزیاب فرستاده نمی‌شود
+    use_cache=False: ارزیابی تازه (نتیجه جایگزین مقدار حافظه می‌شود)
+    """
     if evaluation_criteria is None:
         evaluation_criteria = {
             "relevance": True,
@@ -1208,20 +1118,20 @@ def evaluate_text(client, text: str, eval_model: str, prompt: str,
             "completeness": True
         }
 
-    active_criteria = {k: v for k, v in evaluation_criteria.items() if v}
+    key = response_cache.make_evaluation_key(text, prompt, eval_model, evaluation_criteria)
+    cached = response_cache.get_evaluation(key) if use_cache else None
+    if cached is not None:
+        app.logger.info("ارزیابی از کش خوانده شد (%s)", eval_model)
+        cached["cached"] = True
+        return cached
+
+    result = _call_evaluator(client, text, eval_model, prompt, evaluation_criteria)
+    response_cache.put_evaluation(key, result)
+    return result
 
-    if not active_criteria:
-        return {
-            "score_overall": 0,
-            "score_details": {},
-            "issues": [],
-            "suggestions": [],
-            "rewrite_hint": "",
-            "analysis_summary": "ارزیابی غیرفعال است",
-            "parse_error": False,
-            "evaluation_disabled": True
-        }
 
+def _evaluation_prompt_parts(active_criteria: Dict[str, bool]):
+    """پیام سیستم، فهرست معیارها و الگوی score_details؛ مشترک بین ارزیابی تکی و گروهی"""
     system_msg = """شما یک ارزیاب متون فارسی هستید. کیفیت متن را با دقت و تنوع ارزیابی کنید.
 لطفاً خروجی را فقط به صورت JSON برگردانید، بدون هیچ متن اضافی.
 
@@ -1254,6 +1164,146 @@ def evaluate_text(client, text: str, eval_model: str, prompt: str,
         if criterion in criteria_labels:
             score_details_schema[criterion] = f"عدد بین 1-10 ({criteria_labels[criterion]})"
 
+    return system_msg, criteria_text, score_details_schema
+
+
+def _evaluation_result(parsed: Dict[str, Any], active_criteria: Dict[str, bool], result_text: str) -> Dict[str, Any]:
+    """تبدیل JSON ارزیاب به خروجی استاندارد evaluate_text (نمره کلی از میانگین نمرات جزئی)"""
+    score_details_raw = parsed.get("score_details") or {}
+    if not isinstance(score_details_raw, dict):
+        score_details_raw = {}
+
+    score = 5.0
+
+    if parsed.get("score_details"):
+        details = score_details_raw
+        if isinstance(details, dict):
+            values = []
+            for criterion in active_criteria.keys():
+                if criterion in details:
+                    value = details[criterion]
+                    num_value = None
+
+                    if isinstance(value, (int, float)):
+                        num_value = float(value)
+                    elif isinstance(value, str):
+                        try:
+                        #    import re
+                            match = re.search(r'(\d+(?:\.\d+)?)', str(value))
+                            if match:
+                                num = float(match.group(1))
+                                if num > 10:
+                                    num = num / 10.0
+                                num_value = num
+                        except:
+                            pass
+
+                    if num_value is not None:
+                        values.append(num_value)
+
+            if values:
+                score = sum(values) / len(values)
+                print(f" نمرات جزئی (فعال): {values}")
+                print(f" میانگین محاسبه شده: {score}")
+
+    score = max(1.0, min(float(score), 10.0))
+    score = round(score, 1)
+    print(f" نمره نهایی: {score}")
+
+    issues = parsed.get("issues", [])
+    if isinstance(issues, str):
+        if "،" in issues:
+            issues = [i.strip() for i in issues.split("،") if i.strip()]
+        elif "," in issues:
+            issues = [i.strip() for i in issues.split(",") if i.strip()]
+        else:
+            issues = [issues]
+    elif not isinstance(issues, list):
+        issues = []
+
+    suggestions = parsed.get("suggestions", [])
+    if isinstance(suggestions, str):
+        if "،" in suggestions:
+            suggestions = [s.strip() for s in suggestions.split("،") if s.strip()]
+        elif "," in suggestions:
+            suggestions = [s.strip() for s in suggestions.split(",") if s.strip()]
+        else:
+            suggestions = [suggestions]
+    elif not isinstance(suggestions, list):
+        suggestions = []
+
+    rewrite_hint = parsed.get("rewrite_hint", "")
+    if not isinstance(rewrite_hint, str):
+        rewrite_hint = str(rewrite_hint)
+
+    analysis_summary = parsed.get("analysis_summary", "")
+    if not isinstance(analysis_summary, str):
+        analysis_summary = str(analysis_summary)
+
+    score_details = {}
+    for criterion in active_criteria.keys():
+        if criterion in score_details_raw:
+            value = score_details_raw[criterion]
+            if isinstance(value, (int, float)):
+                score_details[criterion] = round(float(value), 1)
+            elif isinstance(value, str):
+                try:
+                #    import re
+                    match = re.search(r'(\d+(?:\.\d+)?)', str(value))
+                    if match:
+                        num = float(match.group(1))
+                        if num > 10:
+                            num = num / 10.0
+                        score_details[criterion] = round(num, 1)
+                    else:
+                        score_details[criterion] = value
+                except:
+                    score_details[criterion] = value
+            else:
+                score_details[criterion] = value
+
+    return {
+        "score_overall": score,
+        "score_details": score_details,
+        "issues": issues[:3],
+        "suggestions": suggestions[:3],
+        "rewrite_hint": rewrite_hint[:250],
+        "analysis_summary": analysis_summary[:200],
+        "parse_error": False,
+        "evaluation_criteria": active_criteria,
+        "raw_response": result_text[:500]
+    }
+
+
+def _call_evaluator(client, text: str, eval_model: str, prompt: str,
+                    evaluation_criteria: Dict[str, bool] = None) -> Dict[str, Any]:
+
+    if evaluation_criteria is None:
+        evaluation_criteria = {
+            "relevance": True,
+            "coherence": True,
+            "creativity": True,
+            "grammar": True,
+            "engagement": True,
+            "completeness": True
+        }
+
+    active_criteria = {k: v for k, v in evaluation_criteria.items() if v}
+
+    if not active_criteria:
+        return {
+            "score_overall": 0,
+            "score_details": {},
+            "issues": [],
+            "suggestions": [],
+            "rewrite_hint": "",
+            "analysis_summary": "ارزیابی غیرفعال است",
+            "parse_error": False,
+            "evaluation_disabled": True
+        }
+
+    system_msg, criteria_text, score_details_schema = _evaluation_prompt_parts(active_criteria)
+
     user_msg = f"""## درخواست اصلی کاربر:
 {prompt}
 
@@ -1311,107 +1361,7 @@ def evaluate_text(client, text: str, eval_model: str, prompt: str,
             }
 
         print(f" JSON استخراج شد")
-
-        score = 5.0
-
-        if parsed.get("score_details"):
-            details = parsed.get("score_details", {})
-            if isinstance(details, dict):
-                values = []
-                for criterion in active_criteria.keys():
-                    if criterion in details:
-                        value = details[criterion]
-                        num_value = None
-
-                        if isinstance(value, (int, float)):
-                            num_value = float(value)
-                        elif isinstance(value, str):
-                            try:
-                            #    import re
-                                match = re.search(r'(\d+(?:\.\d+)?)', str(value))
-                                if match:
-                                    num = float(match.group(1))
-                                    if num > 10:
-                                        num = num / 10.0
-                                    num_value = num
-                            except:
-                                pass
-
-                        if num_value is not None:
-                            values.append(num_value)
-
-                if values:
-                    score = sum(values) / len(values)
-                    print(f" نمرات جزئی (فعال): {values}")
-                    print(f" میانگین محاسبه شده: {score}")
-
-        score = max(1.0, min(float(score), 10.0))
-        score = round(score, 1)
-        print(f" نمره نهایی: {score}")
-
-        issues = parsed.get("issues", [])
-        if isinstance(issues, str):
-            if "،" in issues:
-                issues = [i.strip() for i in issues.split("،") if i.strip()]
-            elif "," in issues:
-                issues = [i.strip() for i in issues.split(",") if i.strip()]
-            else:
-                issues = [issues]
-        elif not isinstance(issues, list):
-            issues = []
-
-        suggestions = parsed.get("suggestions", [])
-        if isinstance(suggestions, str):
-            if "،" in suggestions:
-                suggestions = [s.strip() for s in suggestions.split("،") if s.strip()]
-            elif "," in suggestions:
-                suggestions = [s.strip() for s in suggestions.split(",") if s.strip()]
-            else:
-                suggestions = [suggestions]
-        elif not isinstance(suggestions, list):
-            suggestions = []
-
-        rewrite_hint = parsed.get("rewrite_hint", "")
-        if not isinstance(rewrite_hint, str):
-            rewrite_hint = str(rewrite_hint)
-
-        analysis_summary = parsed.get("analysis_summary", "")
-        if not isinstance(analysis_summary, str):
-            analysis_summary = str(analysis_summary)
-
-        score_details = {}
-        for criterion in active_criteria.keys():
-            if criterion in parsed.get("score_details", {}):
-                value = parsed["score_details"][criterion]
-                if isinstance(value, (int, float)):
-                    score_details[criterion] = round(float(value), 1)
-                elif isinstance(value, str):
-                    try:
-                    #    import re
-                        match = re.search(r'(\d+(?:\.\d+)?)', str(value))
-                        if match:
-                            num = float(match.group(1))
-                            if num > 10:
-                                num = num / 10.0
-                            score_details[criterion] = round(num, 1)
-                        else:
-                            score_details[criterion] = value
-                    except:
-                        score_details[criterion] = value
-                else:
-                    score_details[criterion] = value
-
-        return {
-            "score_overall": score,
-            "score_details": score_details,
-            "issues": issues[:3],
-            "suggestions": suggestions[:3],
-            "rewrite_hint": rewrite_hint[:250],
-            "analysis_summary": analysis_summary[:200],
-            "parse_error": False,
-            "evaluation_criteria": active_criteria,
-            "raw_response": result_text[:500]
-        }
+        return _evaluation_result(parsed, active_criteria, result_text)
 
     except Exception as e:
         print(f" خطا در ارزیابی: {str(e)}")
@@ -1430,25 +1380,256 @@ def evaluate_text(client, text: str, eval_model: str, prompt: str,
             "traceback": traceback.format_exc()
         }
 
+def evaluate_texts(client, texts: List[str], eval_model: str, prompt: str,
+                   evaluation_criteria: Dict[str, bool] = None) -> List[Dict[str, Any]]:
+    """
+    ارزیابی چند متن برای یک درخواست و معیارهای یکسان با یک فراخوانی ارزیاب
+    خروجی هر متن همان ساختار evaluate_text است؛ اگر پاسخ گروهی قابل پردازش نباشد
+    متن‌های بی‌نتیجه تک‌تک ارزیابی می‌شوند
+    """
+    if evaluation_criteria is None:
+        evaluation_criteria = {
+            "relevance": True,
+            "coherence": True,
+            "creativity": True,
+            "grammar": True,
+            "engagement": True,
+            "completeness": True
+        }
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+    keys = [response_cache.make_evaluation_key(t, prompt, eval_model, evaluation_criteria) for t in texts]
+    for i, key in enumerate(keys):
+        cached = response_cache.get_evaluation(key)
+        if cached is not None:
+            cached["cached"] = True
+            results[i] = cached
+
+    missing = [i for i, r in enumerate(results) if r is None]
+    if len(missing) > 1:
+        batch = _call_batch_evaluator(client, [texts[i] for i in missing], eval_model, prompt, evaluation_criteria)
+        for i, result in zip(missing, batch):
+            if result is not None:
+                results[i] = result
+                response_cache.put_evaluation(keys[i], result)
+
+    for i, result in enumerate(results):
+        if result is None:
+            results[i] = evaluate_text(client, texts[i], eval_model, prompt, evaluation_criteria)
+    return results
+
+
+def _call_batch_evaluator(client, texts: List[str], eval_model: str, prompt: str,
+                          evaluation_criteria: Dict[str, bool]) -> List[Optional[Dict[str, Any]]]:
+    """یک فراخوانی برای همه متن‌ها؛ برای متنی که نتیجه معتبر ندارد None برمی‌گردد"""
+    active_criteria = {k: v for k, v in evaluation_criteria.items() if v}
+    if not active_criteria:
+        return [None] * len(texts)
+
+    system_msg, criteria_text, score_details_schema = _evaluation_prompt_parts(active_criteria)
+    candidates_text = "\n\n".join(f"### متن {i + 1}:\n{text}" for i, text in enumerate(texts))
+
+    user_msg = f"""## درخواست اصلی کاربر:
+{prompt}
+
+## متن‌های تولید شده ({len(texts)} متن، هر کدام را مستقل ارزیابی کنید):
+{candidates_text}
+
+## معیارهای ارزیابی (فقط برای موارد زیر نمره بدهید):
+{criteria_text}
+
+لطفاً با ساختار دقیق زیر پاسخ دهید (فقط JSON)، یک مورد برای هر متن به همان ترتیب:
+{{
+  "evaluations": [
+    {{
+      "index": 1,
+      "score_details": {{
+        {', '.join([f'"{k}": "{v}"' for k, v in score_details_schema.items()])}
+      }},
+      "issues": ["مشکلات اختصاصی این متن"],
+      "suggestions": ["پیشنهادات عملی برای این متن"],
+      "rewrite_hint": "راهنمایی دقیق برای بهبود این متن خاص",
+      "analysis_summary": "تحلیل مختصر نقاط قوت و ضعف"
+    }}
+  ]
+}}"""
+
+    app.logger.info("ارزیابی گروهی %d متن با مدل: %s", len(texts), eval_model)
+
+    try:
+        response = client.chat.completions.create(
+            model=eval_model,
+            messages=[
+                {"role": "system", "content": system_msg},
+                {"role": "user", "content": user_msg}
+            ],
+            temperature=0.5,
+            max_tokens=min(300 * len(texts), 2000),
+            response_format={"type": "json_object"}
+        )
+        result_text = response.choices[0].message.content or ""
+    except Exception as e:
+        app.logger.warning("خطا در ارزیابی گروهی: %s", e)
+        return [None] * len(texts)
+
+    parsed = parse_json_safely(result_text)
+    items = parsed.get("evaluations") if isinstance(parsed, dict) else parsed
+    if not isinstance(items, list):
+        app.logger.warning("JSON ارزیابی گروهی استخراج نشد؛ ارزیابی تک‌تک")
+        return [None] * len(texts)
+
+    by_index: Dict[int, Dict[str, Any]] = {}
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        index = _to_int(item.get("index"), position + 1) - 1
+        if 0 <= index < len(texts) and index not in by_index and isinstance(item.get("score_details"), dict):
+            by_index[index] = item
+
+    results = []
+    for i in range(len(texts)):
+        item = by_index.get(i)
+        results.append(_evaluation_result(item, active_criteria, json.dumps(item, ensure_ascii=False)) if item else None)
+    app.logger.info("ارزیابی گروهی: %d از %d متن نتیجه معتبر داشت", len(by_index), len(texts))
+    return results
+
+
+@app.errorhandler(llm_gateway.GatewayError)
+def ai_unavailable(e):
+    app.logger.warning("درخواست AI رد شد: %s", e)
+    return jsonify({"ok": False, "error": str(e)}), 503
+
+
+# مسیرهای مدیریتی (ai_status، ارزیابی دسته‌ای) فقط برای این کاربران؛ مثلا ADMIN_USERNAMES=rashid,farhad
+ADMIN_USERNAMES = {u.strip() for u in os.environ.get("ADMIN_USERNAMES", "").split(",") if u.strip()}
+BATCH_EVAL_MAX_RATE = float(os.environ.get("BATCH_EVAL_MAX_RATE", 20))
+_MODEL_NAME = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+
+def _admin_error():
+    """پاسخ خطا اگر کاربر وارد نشده یا مدیر نیست؛ در غیر این صورت None"""
+    if 'username' not in session:
+        return jsonify({"ok": False, "error": "ابتدا وارد شوید"}), 401
+    if session['username'] not in ADMIN_USERNAMES:
+        return jsonify({"ok": False, "error": "دسترسی فقط برای مدیران"}), 403
+    return None
+
+
+@app.route("/ai_status")
+def ai_status():
+    """وضعیت لایه واسط مدل‌ها (صف، خطاها و circuit breaker هر مدل) و کش‌ها در این worker؛ فقط مدیران"""
+    error = _admin_error()
+    if error:
+        return error
+
+    return jsonify({
+        "gateway": client.status(),
+        "response_cache": response_cache.stats(),
+        "evaluation_cache": response_cache.evaluation_stats(),
+        "generations": generation_store.stats()
+    })
+
+
+def _batch_eval_options(data):
+    """بررسی ورودی‌های کار ارزیابی دسته‌ای؛ ورودی نامعتبر ValueError می‌دهد (پاسخ 400)"""
+    model = data.get("model") or batch_eval.MODEL
+    if not isinstance(model, str) or not _MODEL_NAME.match(model.strip()):
+        raise ValueError("نام مدل نامعتبر است")
+    try:
+        rate = float(data.get("rate", batch_eval.RATE))
+    except (TypeError, ValueError):
+        raise ValueError("rate باید عدد باشد")
+    if not 0 < rate <= BATCH_EVAL_MAX_RATE:
+        raise ValueError(f"rate باید بیشتر از 0 و حداکثر {BATCH_EVAL_MAX_RATE:g} باشد")
+    categories = data.get("categories") or list(batch_eval.CATEGORIES)
+    if isinstance(categories, str):
+        categories = categories.split(",")
+    if not isinstance(categories, list) or not all(isinstance(c, str) for c in categories):
+        raise ValueError("categories باید فهرستی از نام دسته‌ها باشد")
+    categories = [c.strip() for c in categories if c.strip() in batch_eval.CATEGORIES]
+    if not categories:
+        raise ValueError("هیچ دسته معتبری انتخاب نشده است")
+    return {
+        "model": model.strip(),
+        "categories": categories,
+        "concurrency": _to_int(data.get("concurrency", batch_eval.CONCURRENCY), batch_eval.CONCURRENCY, 1, 16),
+        "rate": rate,
+        "force": _to_bool(data.get("force", False), False)
+    }
+
+
+@app.route("/admin/batch_evaluate", methods=["GET", "POST"])
+def batch_evaluate():
+    """
+    GET: وضعیت آخرین کار ارزیابی دسته‌ای (یا ?job=شماره)
+    POST: شروع کار جدید در پس‌زمینه، یا ادامه کار متوقف‌شده با resume_job
+    فقط کاربران ADMIN_USERNAMES
+    """
+    error = _admin_error()
+    if error:
+        return error
+
+    if request.method == "GET":
+        job_id = request.args.get("job", type=int)
+        return jsonify({"ok": True, "job": storage.get_eval_job(job_id)})
+
+    data = request.get_json(silent=True) or {}
+
+    eval_client = client.with_options(timeout=AI_TIMEOUTS["evaluation"])
+
+    def evaluate(text, prompt, model, use_cache=True):
+        return evaluate_text(eval_client, text, model, prompt, use_cache=use_cache)
+
+    try:
+        if data.get("resume_job") is not None:
+            evaluator = batch_eval.BatchEvaluator.resume(evaluate, _to_int(data.get("resume_job"), 0, 0, None))
+        else:
+            evaluator = batch_eval.BatchEvaluator(evaluate, **_batch_eval_options(data))
+        job = batch_eval.start_background(evaluator)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"ok": False, "error": str(e)}), 409
+    return jsonify({"ok": True, "job": job})
+
+
+@app.route("/admin/batch_evaluate/<int:job_id>/cancel", methods=["POST"])
+def cancel_batch_evaluate(job_id):
+    error = _admin_error()
+    if error:
+        return error
+    job = batch_eval.cancel(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "کار پیدا نشد"}), 404
+    return jsonify({"ok": True, "job": job})
+
+
 @app.route("/generate_simple", methods=["POST"])
 def generate_simple():
     data = request.get_json() or {}
     prompt = data.get("prompt", "")
+    messages = [{"role": "user", "content": prompt}]
+
+    cache_key = response_cache.make_key("gpt-4o", messages) if _to_bool(data.get("cache", True), True) else None
+    cached_text = response_cache.get(cache_key) if cache_key else None
+    if cached_text is not None:
+        return jsonify({"response": cached_text, "cached": True})
 
     completion = client.chat.completions.create(
         model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
+        messages=messages,
     )
+    response_text = completion.choices[0].message.content
+    if cache_key:
+        response_cache.put(cache_key, response_text)
 
     return jsonify({
-        "response": completion.choices[0].message.content
+        "response": response_text,
+        "cached": False
     })
 
-@app.route("/generate_ai", methods=["POST"])
-def generate_ai():
-    _cleanup_generations()
-    data = request.get_json() or {}
-
+def _generation_settings(data):
+    """خواندن تنظیمات درخواست تولید و ساخت پیام‌های مدل"""
     print(f"دریافت درخواست generate_ai: {json.dumps(data, ensure_ascii=False)[:500]}...")
 
     prompt = (data.get("prompt") or "").strip()
@@ -1469,6 +1650,8 @@ def generate_ai():
     evaluation_model_selected = (data.get("evaluation_model") or "auto").strip()
     quality_threshold = _to_int(data.get("quality_threshold", 7), 7, 1, 10)
     max_retry_attempts = _to_int(data.get("max_retry_attempts", 3), 3, 1, 10)
+    best_of = _to_int(data.get("best_of", 1), 1, 1, AI_MAX_CANDIDATES)
+    use_cache = _to_bool(data.get("cache", True), True)
 
     evaluation_criteria = {
         "relevance": _to_bool(data.get("eval_relevance", True), True),
@@ -1527,108 +1710,388 @@ def generate_ai():
     print(f"تولید با مدل: {generator_model}")
     print(f"messages: {messages}")
 
-    completion = client.chat.completions.create(
-        model=generator_model,
-        messages=messages,
-        temperature=max(0.1, creativity / 100),
-        max_tokens=max_tokens if mode == "write" else 150,
-    )
-    response_text = completion.choices[0].message.content or ""
+    return {
+        "prompt": prompt,
+        "use_bio": use_bio,
+        "bio_text": bio_text,
+        "mode": mode,
+        "creativity": creativity,
+        "max_tokens": max_tokens,
+        "generate_image": generate_image,
+        "size": size,
+        "enable_evaluation": enable_evaluation,
+        "evaluation_model_selected": evaluation_model_selected,
+        "quality_threshold": quality_threshold,
+        "max_retry_attempts": max_retry_attempts,
+        "best_of": best_of,
+        "use_cache": use_cache,
+        "evaluation_criteria": evaluation_criteria,
+        "messages": messages,
+        "generator_model": generator_model,
+    }
+
+
+def _completion_args(settings):
+    return {
+        "model": settings["generator_model"],
+        "messages": settings["messages"],
+        "temperature": max(0.1, settings["creativity"] / 100),
+        "max_tokens": settings["max_tokens"] if settings["mode"] == "write" else 150,
+        "timeout": AI_TIMEOUTS["text"],
+    }
+
+
+def _cache_key(settings):
+    """کلید کش پاسخ برای تولیدهای کم‌دما؛ None یعنی این درخواست کش نمی‌شود"""
+    args = _completion_args(settings)
+    if not settings["use_cache"] or args["temperature"] > response_cache.MAX_TEMPERATURE:
+        return None
+    return response_cache.make_key(args["model"], args["messages"], args["temperature"], args["max_tokens"])
+
+
+def _generate_text(settings, temperature=None):
+    args = _completion_args(settings)
+    if temperature is not None:
+        args["temperature"] = temperature
+    completion = client.chat.completions.create(**args)
+    return _finish_text(completion.choices[0].message.content or "", settings)
+
+
+def _finish_text(response_text, settings):
+    """تکمیل نقطه پایانی و اطمینان از ذکر هویت کاربر در متن"""
     print(f"متن تولید شده ({len(response_text)} کاراکتر): {response_text[:200]}...")
 
     response_text = response_text.strip()
     if response_text and not response_text.endswith(('.', '!', '؟', '?')):
         response_text += '.'
 
-    if use_bio and bio_text:
+    bio_text = settings["bio_text"]
+    if settings["use_bio"] and bio_text:
         if bio_text not in response_text:
             print(f" هویت '{bio_text}' در پاسخ ذکر نشده. اضافه کردن...")
             response_text = f"به عنوان {bio_text}، {response_text}"
         else:
             print(f" هویت '{bio_text}' در پاسخ ذکر شده است.")
+    return response_text
 
-    evaluation = None
-    final_score = None
-    evaluator_model = None
-    parse_error = False
 
-    if enable_evaluation:
-        evaluator_model = resolve_eval_model(generator_model, evaluation_model_selected)
-        print(f"ارزیابی با مدل: {evaluator_model}")
-        evaluation = evaluate_text(client, response_text, evaluator_model, prompt, evaluation_criteria)
+def _evaluate_generation(settings, response_text):
+    """خروجی: (evaluation, final_score, evaluator_model, parse_error)"""
+    evaluator_model = resolve_eval_model(settings["generator_model"], settings["evaluation_model_selected"])
+    print(f"ارزیابی با مدل: {evaluator_model}")
+    eval_client = client.with_options(timeout=AI_TIMEOUTS["evaluation"])
+    evaluation = evaluate_text(eval_client, response_text, evaluator_model, settings["prompt"],
+                               settings["evaluation_criteria"])
 
-        final_score = evaluation.get("score_overall", 1)
-        try:
-            final_score = float(final_score)
-        except:
-            final_score = 1.0
-        parse_error = bool(evaluation.get("parse_error", False))
-        print(f"نمره ارزیابی: {final_score}, parse_error: {parse_error}")
+    final_score = _final_score(evaluation)
+    parse_error = bool(evaluation.get("parse_error", False))
+    print(f"نمره ارزیابی: {final_score}, parse_error: {parse_error}")
+    return evaluation, final_score, evaluator_model, parse_error
+
+
+def _final_score(evaluation):
+    final_score = evaluation.get("score_overall", 1)
+    try:
+        return float(final_score)
+    except:
+        return 1.0
+
+
+def _generate_image(settings):
+    image_resp = client.images.generate(model="dall-e-3", prompt=settings["prompt"], size=settings["size"],
+                                        timeout=AI_TIMEOUTS["image"])
+    if hasattr(image_resp, "data") and len(image_resp.data) > 0:
+        # آدرس سرویس موقتی است؛ یک نسخه محلی در پس‌زمینه دانلود می‌شود تا اثر ذخیره‌شده به آن اشاره کند
+        generated_images.ingest(image_resp.data[0].url)
+        return image_resp.data[0].url
+    return ""
+
+
+def _evaluation_fields(settings, evaluation, final_score, evaluator_model, parse_error):
+    return {
+        "evaluation_model": evaluator_model,
+        "quality_threshold": settings["quality_threshold"],
+        "final_score": final_score,
+        "parse_error": parse_error,
+        "evaluation": evaluation,
+        "evaluation_criteria": settings["evaluation_criteria"]
+    }
 
-    image_url = ""
-    if generate_image:
-        try:
-            image_resp = client.images.generate(model="dall-e-3", prompt=prompt, size=size)
-            if hasattr(image_resp, "data") and len(image_resp.data) > 0:
-                image_url = image_resp.data[0].url
-        except Exception as e:
-            print(f"خطا در تولید تصویر: {e}")
 
+def _remember_generation(settings, response_text, evaluation=None, final_score=None,
+                         evaluator_model=None, parse_error=False):
+    """ذخیره وضعیت تولید برای regenerate_ai و ساخت پاسخ نهایی"""
     generation_id = str(uuid.uuid4())
-    AI_GENERATIONS[generation_id] = {
-        "created_at": time.time(),
-        "prompt": prompt,
-        "messages": messages,
-        "generator_model": generator_model,
-        "temperature": creativity / 100,
-        "max_tokens": max_tokens if mode == "write" else 150,
-        "enable_evaluation": enable_evaluation,
+    generation_store.put(generation_id, {
+        "prompt": settings["prompt"],
+        "messages": settings["messages"],
+        "generator_model": settings["generator_model"],
+        "temperature": settings["creativity"] / 100,
+        "max_tokens": settings["max_tokens"] if settings["mode"] == "write" else 150,
+        "enable_evaluation": settings["enable_evaluation"],
         "evaluator_model": evaluator_model,
-        "evaluation_criteria": evaluation_criteria,
-        "quality_threshold": quality_threshold,
-        "remaining": max_retry_attempts,
+        "evaluation_criteria": settings["evaluation_criteria"],
+        "quality_threshold": settings["quality_threshold"],
+        "remaining": settings["max_retry_attempts"],
         "last_score": final_score,
         "last_evaluation": evaluation,
         "last_parse_error": parse_error,
-        "original_response": response_text,
-    }
+    })
     print(f"generation_id ایجاد شد: {generation_id}")
 
     response_data = {
         "response": response_text,
-        "image_url": image_url,
         "generation_id": generation_id,
-        "evaluation_enabled": enable_evaluation,
-        "remaining": max_retry_attempts,
+        "evaluation_enabled": settings["enable_evaluation"],
+        "remaining": settings["max_retry_attempts"],
     }
+    if settings["enable_evaluation"]:
+        response_data.update(_evaluation_fields(settings, evaluation, final_score, evaluator_model, parse_error))
+    return response_data
 
-    if enable_evaluation:
-        response_data.update({
-            "evaluation_model": evaluator_model,
-            "quality_threshold": quality_threshold,
-            "final_score": final_score,
-            "parse_error": parse_error,
-            "evaluation": evaluation,
-            "evaluation_criteria": evaluation_criteria
-        })
 
-    print(f"ارسال پاسخ به فرانت")
+AI_EVAL_BATCH_SIZE = int(os.environ.get("AI_EVAL_BATCH_SIZE", 3))
+
+
+def _best_of_n(settings):
+    """
+    N نامزد با دماهای مختلف به صورت موازی تولید می‌شوند. هر بار که نامزدهایی آماده شدند، همان‌ها
+    (حداکثر AI_EVAL_BATCH_SIZE تا) با یک فراخوانی ارزیاب (evaluate_texts) سنجیده می‌شوند؛ اولین
+    نامزدی که به quality_threshold برسد برنده است و بقیه لغو می‌شوند، وگرنه بهترین نمره.
+    خروجی: (بهترین نامزد یا None، خلاصه نمره نامزدها، پیام خطا)
+    """
+    n = settings["best_of"]
+    base = max(0.1, settings["creativity"] / 100)
+    futures = {}
+    for i in range(n):
+        temperature = best_of_n_temperature(base, i)
+        futures[ai_executor.submit(_generate_text, settings, temperature)] = (i, temperature)
+
+    evaluator_model = resolve_eval_model(settings["generator_model"], settings["evaluation_model_selected"])
+    eval_client = client.with_options(timeout=AI_TIMEOUTS["evaluation"])
+    deadline = time.monotonic() + AI_TIMEOUTS["text"]
+
+    evaluated = []
+    ready = []
+    summary = []
+    error = None
+    winner = None
+    remaining = set(futures)
+    while (remaining or ready) and winner is None:
+        if remaining and not ready:
+            done, _ = wait(remaining, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                app.logger.warning("مهلت تولید نامزدها تمام شد")
+                error = "مهلت پاسخ تمام شد"
+                break
+        else:
+            done = {f for f in remaining if f.done()}
+        remaining -= done
+        for future in done:
+            index, temperature = futures[future]
+            try:
+                ready.append({"index": index, "text": future.result(), "temperature": temperature})
+            except Exception as e:
+                app.logger.warning("خطا در نامزد %d: %s", index + 1, e)
+                summary.append({"index": index, "error": str(e)})
+        if not ready:
+            continue
+
+        batch, ready = ready[:AI_EVAL_BATCH_SIZE], ready[AI_EVAL_BATCH_SIZE:]
+        evaluations = evaluate_texts(eval_client, [c["text"] for c in batch], evaluator_model,
+                                     settings["prompt"], settings["evaluation_criteria"])
+        for candidate, evaluation in zip(batch, evaluations):
+            candidate.update({
+                "evaluation": evaluation,
+                "final_score": _final_score(evaluation),
+                "evaluator_model": evaluator_model,
+                "parse_error": bool(evaluation.get("parse_error", False)),
+            })
+            summary.append({
+                "index": candidate["index"],
+                "temperature": candidate["temperature"],
+                "score": candidate["final_score"],
+                "parse_error": candidate["parse_error"],
+            })
+            evaluated.append(candidate)
+            if winner is None and not candidate["parse_error"] \
+                    and candidate["final_score"] >= settings["quality_threshold"]:
+                winner = candidate
+
+    for future in remaining:
+        future.cancel()
+
+    if not evaluated:
+        return None, summary, error or "هیچ نامزدی تولید نشد"
+
+    best = winner or max(evaluated, key=lambda c: (not c["parse_error"], c["final_score"]))
+    return best, sorted(summary, key=lambda c: c["index"]), None
+
+
+@app.route("/generate_ai", methods=["POST"])
+def generate_ai():
+    """
+    تصویر فقط به prompt نیاز دارد و همزمان با متن شروع می‌شود؛ ارزیابی به محض آماده شدن متن.
+    زمان کل برابر طولانی‌ترین زنجیره است و خطای یک کار بقیه نتایج را از بین نمی‌برد.
+    """
+    settings = _generation_settings(request.get_json() or {})
+    errors = {}
+
+    started = time.monotonic()
+    image_future = ai_executor.submit(_generate_image, settings) if settings["generate_image"] else None
+
+    evaluation = None
+    final_score = None
+    evaluator_model = None
+    parse_error = False
+    candidates = None
+    cached = False
+
+    if settings["best_of"] > 1 and settings["enable_evaluation"]:
+        best, candidates, errors["text"] = _best_of_n(settings)
+        response_text = best["text"] if best else ""
+        if best:
+            evaluation, final_score = best["evaluation"], best["final_score"]
+            evaluator_model, parse_error = best["evaluator_model"], best["parse_error"]
+    else:
+        cache_key = _cache_key(settings)
+        cached_text = response_cache.get(cache_key) if cache_key else None
+        if cached_text is not None:
+            app.logger.info("متن از کش پاسخ‌ها خوانده شد")
+            response_text = _finish_text(cached_text, settings)
+            cached = True
+        else:
+            text_future = ai_executor.submit(_generate_text, settings)
+            response_text, errors["text"] = _wait_task("text", text_future, started)
+            response_text = response_text or ""
+            if cache_key and response_text:
+                response_cache.put(cache_key, response_text)
+
+    if settings["enable_evaluation"] and response_text and evaluation is None:
+        eval_started = time.monotonic()
+        eval_future = ai_executor.submit(_evaluate_generation, settings, response_text)
+        result, errors["evaluation"] = _wait_task("evaluation", eval_future, eval_started)
+        if result is not None:
+            evaluation, final_score, evaluator_model, parse_error = result
+
+    image_url = ""
+    if image_future is not None:
+        image_url, errors["image"] = _wait_task("image", image_future, started)
+        image_url = image_url or ""
+
+    response_data = _remember_generation(settings, response_text, evaluation, final_score,
+                                         evaluator_model, parse_error)
+    response_data["image_url"] = image_url
+    response_data["cached"] = cached
+    if candidates is not None:
+        response_data["candidates"] = candidates
+    errors = {k: v for k, v in errors.items() if v}
+    if errors:
+        response_data["errors"] = errors
+
+    print(f"ارسال پاسخ به فرانت ({time.monotonic() - started:.1f} ثانیه)")
     return jsonify(response_data)
 
 
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.route("/generate_ai_stream", methods=["POST"])
+def generate_ai_stream():
+    """
+    نسخه جریانی generate_ai با Server-Sent Events
+    رویدادها: token (تکه‌های متن)، text (متن نهایی پس از تکمیل)، evaluation، image، done، error
+    تصویر همزمان با متن شروع می‌شود و هر کدام از ارزیابی و تصویر که زودتر آماده شود اول ارسال می‌شود.
+    """
+    settings = _generation_settings(request.get_json() or {})
+
+    def events():
+        started = time.monotonic()
+        image_future = ai_executor.submit(_generate_image, settings) if settings["generate_image"] else None
+        errors = {}
+        cache_key = _cache_key(settings)
+        cached_text = response_cache.get(cache_key) if cache_key else None
+        try:
+            if cached_text is not None:
+                yield _sse("token", {"delta": cached_text})
+                response_text = _finish_text(cached_text, settings)
+            else:
+                stream = client.chat.completions.create(stream=True, **_completion_args(settings))
+                parts = []
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content or ""
+                    if delta:
+                        parts.append(delta)
+                        yield _sse("token", {"delta": delta})
+                response_text = _finish_text("".join(parts), settings)
+                if cache_key and response_text:
+                    response_cache.put(cache_key, response_text)
+        except Exception as e:
+            app.logger.warning("خطا در تولید جریانی: %s", e)
+            traceback.print_exc()
+            if image_future is not None:
+                image_future.cancel()
+            yield _sse("error", {"error": str(e)})
+            return
+
+        yield _sse("text", {"response": response_text})
+
+        pending = {}
+        if image_future is not None:
+            pending[image_future] = ("image", started)
+        if settings["enable_evaluation"]:
+            pending[ai_executor.submit(_evaluate_generation, settings, response_text)] = ("evaluation", time.monotonic())
+
+        evaluation = None
+        final_score = None
+        evaluator_model = None
+        parse_error = False
+        image_url = ""
+
+        while pending:
+            deadline = min(t + AI_TIMEOUTS[name] for name, t in pending.values())
+            done, _ = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            finished = done or [f for f, (name, t) in pending.items() if t + AI_TIMEOUTS[name] <= time.monotonic()]
+            for future in finished:
+                name, task_started = pending.pop(future)
+                result, errors[name] = _wait_task(name, future, task_started)
+                if name == "evaluation":
+                    if result is not None:
+                        evaluation, final_score, evaluator_model, parse_error = result
+                        yield _sse("evaluation", _evaluation_fields(settings, evaluation, final_score,
+                                                                    evaluator_model, parse_error))
+                else:
+                    image_url = result or ""
+                    yield _sse("image", {"image_url": image_url})
+
+        response_data = _remember_generation(settings, response_text, evaluation, final_score,
+                                             evaluator_model, parse_error)
+        response_data["image_url"] = image_url
+        response_data["cached"] = cached_text is not None
+        errors = {k: v for k, v in errors.items() if v}
+        if errors:
+            response_data["errors"] = errors
+        yield _sse("done", response_data)
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.route("/regenerate_ai", methods=["POST"])
 def regenerate_ai():
-    _cleanup_generations()
     data = request.get_json() or {}
     generation_id = data.get("generation_id")
 
     print(f" درخواست regenerate_ai برای: {generation_id}")
 
-    if not generation_id or generation_id not in AI_GENERATIONS:
+    st = generation_store.get(generation_id) if generation_id else None
+    if st is None:
         print(f" generation_id نامعتبر: {generation_id}")
         return jsonify({"ok": False, "message": "شناسه تولید معتبر نیست."})
 
-    st = AI_GENERATIONS[generation_id]
     print(f" state بازیابی شد: remaining={st.get('remaining')}, last_score={st.get('last_score')}")
 
     if not st.get("enable_evaluation"):
@@ -1659,20 +2122,26 @@ def regenerate_ai():
         print(f" نمره کافی است: {last_score} >= {threshold}")
         return jsonify({"ok": False, "message": "به حد کافی خوب است."})
 
+    def take_attempt(state):
+        # رزرو اتمی یک تلاش تا دو درخواست هم‌زمان هر دو از آخرین تلاش عبور نکنند
+        if int(state.get("remaining", 0)) <= 0:
+            return None
+        state["remaining"] = int(state["remaining"]) - 1
+        state["regeneration_count"] = state.get("regeneration_count", 0) + 1
+        return state
+
+    claimed = generation_store.update(generation_id, take_attempt)
+    if claimed is None:
+        print(" تلاش‌ها تمام شده")
+        return jsonify({"ok": False, "message": "تعداد تلاش برای تولید مجدد تمام شد."})
+    remaining = claimed["remaining"]
+
     print(" شروع تولید مجدد...")
     try:
         original_temperature = st["temperature"]
-        regeneration_count = st.get("regeneration_count", 0)
-
-        if regeneration_count == 0:
-            temperature = original_temperature
-        elif regeneration_count == 1:
-            temperature = min(original_temperature + 0.1, 0.8)
-        elif regeneration_count == 2:
-            temperature = max(original_temperature - 0.1, 0.2)
-        else:
-            import random
-            temperature = random.uniform(0.3, 0.7)
+        regeneration_count = claimed["regeneration_count"] - 1
+
+        temperature = candidate_temperature(original_temperature, regeneration_count)
 
         messages = st["messages"].copy()
         prompt_text = st.get("prompt", "")
@@ -1719,7 +2188,8 @@ def regenerate_ai():
         evaluator_model = st.get("evaluator_model") or st["generator_model"]
         print(f" ارزیابی مجدد با مدل: {evaluator_model}")
 
-        evaluation = evaluate_text(client, new_text, evaluator_model, st.get("prompt", ""), evaluation_criteria)
+        eval_client = client.with_options(timeout=AI_TIMEOUTS["evaluation"])
+        evaluation = evaluate_text(eval_client, new_text, evaluator_model, st.get("prompt", ""), evaluation_criteria)
 
         score = evaluation.get("score_overall", 0)
         if isinstance(score, (int, float)):
@@ -1732,13 +2202,14 @@ def regenerate_ai():
         parse_error = bool(evaluation.get("parse_error", False))
         print(f" نمره جدید: {score}, parse_error: {parse_error}")
 
-        remaining -= 1
-        st["remaining"] = remaining
-        st["last_score"] = score
-        st["last_evaluation"] = evaluation
-        st["last_parse_error"] = parse_error
-        st["regeneration_count"] = regeneration_count + 1
-        st["last_temperature"] = temperature
+        def record_result(state):
+            state["last_score"] = score
+            state["last_evaluation"] = evaluation
+            state["last_parse_error"] = parse_error
+            state["last_temperature"] = temperature
+            return state
+
+        generation_store.update(generation_id, record_result)
 
         response_data = {
             "ok": True,
@@ -1761,6 +2232,12 @@ def regenerate_ai():
     except Exception as e:
         print(f" خطا در تولید مجدد: {e}")
         print(traceback.format_exc())
+
+        def refund_attempt(state):
+            state["remaining"] = int(state.get("remaining", 0)) + 1
+            return state
+
+        generation_store.update(generation_id, refund_attempt)
         return jsonify({
             "ok": False,
             "message": f"خطا در تولید مجدد: {str(e)}"
@@ -1781,11 +2258,11 @@ def save_ai():
 
         if not title or not content or not category:
             flash("عنوان، محتوا و دسته‌بندی الزامی هستند.", "error")
-            return redirect(url_for('ai_panel'))
+            return redirect(url_for('AI_admin'))
 
         if category not in file_map_for_post:
             flash("دسته‌بندی نامعتبر", "error")
-            return redirect(url_for('ai_panel'))
+            return redirect(url_for('AI_admin'))
 
         status = "public"
         if publish_status == 'private':
@@ -1803,32 +2280,12 @@ def save_ai():
                 publish_date = datetime.strptime(publish_date_str, "%Y-%m-%d")
             except ValueError:
                 publish_date = None
-        file_path = os.path.join(SAVE_DIR, file_map_for_post[category])
-        os.makedirs(SAVE_DIR, exist_ok=True)
-
-        if os.path.exists(file_path):
-            df = pd.read_excel(file_path)
-            for col in ["status", "tags", "readability", "publish_date", "created_at", "max_tokens", "image_url"]:
-                if col not in df.columns:
-                    df[col] = ""
-        else:
-            df = pd.DataFrame(columns=[
-                "شماره", "دسته‌بندی", "عنوان", "محتوا", "username",
-                "status", "tags", "readability", "publish_date", "created_at",
-                "max_tokens", "image_url"
-            ])
-
-        new_id = 1
-        if not df.empty and "شماره" in df.columns:
-            max_id = df["شماره"].max()
-            if pd.notna(max_id):
-                new_id = int(max_id) + 1
-        image_url = session.pop('ai_generated_image', None) if session.get('ai_generated_image') else ""
+        image_url = generated_images.resolve(request.form.get("image_url", "").strip()
+                                             or session.pop('ai_generated_image', None))
         new_row = {
-            "شماره": new_id,
-            "دسته‌بندی": category,
-            "عنوان": title,
-            "محتوا": content,
+            "category_label": category,
+            "title": title,
+            "content": content,
             "username": username,
             "status": status,
             "tags": tags_str,
@@ -1839,8 +2296,11 @@ def save_ai():
             "image_url": image_url if image_url else ""
         }
 
-        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-        df.to_excel(file_path, index=False)
+        item_id = storage.insert_artwork(category, new_row)
+        # فید باید قبل از settle از اثر تازه باخبر شود؛ هر نوشتن روی artworks نسخه را یکی بالا می‌برد
+        home_feed.added(category, item_id)
+        if generated_images.settle(image_url):
+            home_feed.edited(category, item_id, was_public=status == "public")
 
         flash(f"محتوای AI با موفقیت ذخیره شد! (وضعیت: {'عمومی' if status == 'public' else 'خصوصی'})", "success")
         return redirect(url_for('index'))
@@ -1849,143 +2309,129 @@ def save_ai():
         flash(f"خطا در ذخیره محتوا: {str(e)}", "error")
         import traceback
         traceback.print_exc()
-        return redirect(url_for('ai_panel'))
+        return redirect(url_for('AI_admin'))
 
 
 @app.route("/authors")
 def Authors():
-    authors = []
+    validators = page_validators("profiles")
+    if request_is_fresh(validators):
+        return with_validators(None, validators)
 
-    if os.path.exists(PROFILE_FILE):
-        df = pd.read_excel(PROFILE_FILE)
+    def render():
+        authors = []
 
-        for _, row in df.iterrows():
-            image_file = row['photo'] if pd.notna(row['photo']) else "default-avatar.png"
+        for row in profile_index.all_profiles():
+            image_file = row.photo if row.photo else "default-avatar.png"
 
             authors.append({
-                "username": row['username'],
-                "first_name": row['first_name'],
-                "last_name": row['last_name'],
-                "phone": row['phone'],
-                "email": row['email'],
-                "bio": row['bio'] if 'bio' in row and pd.notna(row['bio']) else "",
+                "username": row.username,
+                "first_name": row.first_name,
+                "last_name": row.last_name,
+                "phone": row.phone,
+                "email": row.email,
+                "bio": row.bio,
                 "image": image_file
             })
 
-    return render_template("Authors.html", authors=authors)
+        return render_template("Authors.html", authors=authors)
+
+    # صفحه نویسندگان برای همه یکسان است
+    return with_validators(page_cache.get(("Authors.html",), page_cache.versions("profiles"), render), validators)
 
 @app.route("/author/<username>/works")
 def author_works(username):
     """
     نمایش آثار یک نویسنده خاص
     """
+    validators = page_validators(f"profile:{username}", f"author:{username}")
+    if request_is_fresh(validators):
+        return with_validators(None, validators)
+
     print(f"درخواست آثار برای نویسنده: {username}")
 
     author = None
-    if os.path.exists(PROFILE_FILE):
-        try:
-            df_profiles = pd.read_excel(PROFILE_FILE)
-            user_data = df_profiles[df_profiles['username'] == username]
-
-            if not user_data.empty:
-                row = user_data.iloc[0]
-                author = {
-                    "username": username,
-                    "first_name": row['first_name'],
-                    "last_name": row['last_name'],
-                    "phone": row['phone'],
-                    "email": row['email'],
-                    "bio": row['bio'] if 'bio' in row and pd.notna(row['bio']) else "",
-                    "image": row['photo'] if pd.notna(row['photo']) else "default-avatar.png"
-                }
-                print(f"نویسنده پیدا شد: {author['first_name']} {author['last_name']}")
-            else:
-                print(f"نویسنده با username '{username}' یافت نشد")
-                return render_template("error.html",
-                                       message=f"نویسنده با نام کاربری '{username}' یافت نشد"), 404
+    try:
+        row = profile_index.get(username)
 
-        except Exception as e:
-            print(f"خطا در خواندن پروفایل: {e}")
+        if row:
+            author = {
+                "username": username,
+                "first_name": row.first_name,
+                "last_name": row.last_name,
+                "phone": row.phone,
+                "email": row.email,
+                "bio": row.bio,
+                "image": row.photo if row.photo else "default-avatar.png"
+            }
+            print(f"نویسنده پیدا شد: {author['first_name']} {author['last_name']}")
+        else:
+            print(f"نویسنده با username '{username}' یافت نشد")
             return render_template("error.html",
-                                   message="خطا در خواندن اطلاعات نویسنده"), 500
-    else:
-        print(f"فایل پروفایل وجود ندارد: {PROFILE_FILE}")
+                                   message=f"نویسنده با نام کاربری '{username}' یافت نشد"), 404
+
+    except Exception as e:
+        print(f"خطا در خواندن پروفایل: {e}")
         return render_template("error.html",
-                               message="فایل پروفایل‌ها یافت نشد"), 404
+                               message="خطا در خواندن اطلاعات نویسنده"), 500
 
     all_artworks = []
 
     for cat, cat_info in route_map.items():
-        file_name = cat_info['file']
         cat_name = cat_info['name']
-        file_path = os.path.join(SAVE_DIR, file_name)
 
-        print(f"جستجو در دسته‌بندی: {cat_name} -> فایل: {file_name}")
+        print(f"جستجو در دسته‌بندی: {cat_name}")
 
-        if os.path.exists(file_path):
-            try:
-                df = pd.read_excel(file_path)
-
-                required_columns = ['شماره', 'عنوان', 'محتوا', 'username']
-                if all(col in df.columns for col in required_columns):
-                    author_works_df = df[df['username'] == username]
-
-                    if not author_works_df.empty:
-                        print(f"  ✓ {len(author_works_df)} اثر یافت شد")
-
-                        for _, row in author_works_df.iterrows():
-                            status = str(row['status']).lower() if 'status' in df.columns and pd.notna(row.get('status')) else "public"
-
-                            item_link = url_for('view_item', cat=cat, item_id=row['شماره'])
-
-                            date_str = ""
-                            if 'تاریخ' in df.columns and pd.notna(row.get('تاریخ')):
-                                date_str = str(row['تاریخ'])
-                            elif 'created_at' in df.columns and pd.notna(row.get('created_at')):
-                                date_str = str(row['created_at'])
-
-                            if status == "public":
-                                artwork = {
-                                    "id": int(row['شماره']),
-                                    "title": str(row['عنوان']),
-                                    "content": str(row['محتوا']),
-                                    "category": cat_name,
-                                    "category_key": cat,
-                                    "date": date_str,
-                                    "link": item_link,
-                                    "excerpt": str(row['محتوا'])[:150] + "..." if len(str(row['محتوا'])) > 150 else str(row['محتوا']),
-                                    "status": status
-                                }
-                            else:
-                                artwork = {
-                                    "id": int(row['شماره']),
-                                    "title": str(row['عنوان']),
-                                    "content": "",
-                                    "category": cat_name,
-                                    "category_key": cat,
-                                    "date": date_str,
-                                    "link": item_link,
-                                    "excerpt": "",
-                                    "status": status
-                                }
-
-                            all_artworks.append(artwork)
+        try:
+            author_works_rows = storage.list_artworks(cat, username=username)
+
+            if author_works_rows:
+                print(f"  ✓ {len(author_works_rows)} اثر یافت شد")
+
+                for row in author_works_rows:
+                    status = row['status'].lower() if row['status'] else "public"
+
+                    item_link = url_for('view_item', cat=cat, item_id=row['شماره'])
+
+                    date_str = row['created_at']
+
+                    if storage.is_public(row):
+                        artwork = {
+                            "id": int(row['شماره']),
+                            "title": row['عنوان'],
+                            "content": row['محتوا'],
+                            "category": cat_name,
+                            "category_key": cat,
+                            "date": date_str,
+                            "link": item_link,
+                            "excerpt": row['محتوا'][:150] + "..." if len(row['محتوا']) > 150 else row['محتوا'],
+                            "status": status
+                        }
                     else:
-                        print(f"  ✗ اثری یافت نشد")
-                else:
-                    missing_cols = [col for col in required_columns if col not in df.columns]
-                    print(f"  ✗ ستون‌های گمشده: {missing_cols}")
-            except Exception as e:
-                print(f"  ✗ خطا در خواندن فایل: {e}")
-        else:
-            print(f"  ✗ فایل وجود ندارد: {file_path}")
+                        artwork = {
+                            "id": int(row['شماره']),
+                            "title": row['عنوان'],
+                            "content": "",
+                            "category": cat_name,
+                            "category_key": cat,
+                            "date": date_str,
+                            "link": item_link,
+                            "excerpt": "",
+                            "status": status
+                        }
+
+                    all_artworks.append(artwork)
+            else:
+                print(f"  ✗ اثری یافت نشد")
+        except Exception as e:
+            print(f"  ✗ خطا در خواندن داده‌ها: {e}")
 
     print(f"مجموع آثار یافت شده: {len(all_artworks)}")
     all_artworks.sort(key=lambda x: x.get('id', 0), reverse=True)
-    return render_template("author_works.html",
-                           author=author,
-                           artworks=all_artworks,
-                           total_works=len(all_artworks))
+    return with_validators(render_template("author_works.html",
+                                           author=author,
+                                           artworks=all_artworks,
+                                           total_works=len(all_artworks)), validators)
 
 @app.route("/about")
 def about():
@@ -0,0 +1,144 @@
+"""
+فایل‌های static با آدرس اثرانگشتی، کش طولانی و نسخه‌های از پیش فشرده
+
+asset_url آدرس فایل را همراه هش محتوای آن می‌سازد (/static/css/content.css?v=<hash>). با تغییر
+فایل آدرس هم عوض می‌شود، پس پاسخ آدرس‌های اثرانگشتی یک سال و immutable کش می‌شود و مرورگر در
+بازدیدهای بعدی اصلا درخواستی برای آن‌ها نمی‌فرستد. آدرس بدون v (یا با هش قدیمی) مثل قبل رفتار می‌کند.
+
+برای فایل‌های متنی (css، js، svg ...) نسخه‌های .gz و .br کنار فایل اصلی ساخته می‌شوند و serve
+بر اساس Accept-Encoding همان را می‌فرستد تا فشرده‌سازی در هر درخواست تکرار نشود. brotli اختیاری است.
+
+    python static_assets.py build
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import sys
+from typing import Dict, Optional, Tuple
+
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+import storage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = "static"
+TEXT_EXTENSIONS = (".css", ".js", ".svg", ".json", ".txt", ".map", ".html")
+MIN_COMPRESS_BYTES = 512
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+# پوشه‌های آپلود فقط تصویر دارند و پیمایش آن‌ها در build بی‌فایده است
+UPLOAD_DIRS = ("profile_pics", "ai_images")
+
+_fingerprints: Dict[str, Tuple[int, int, str]] = {}
+
+
+def fingerprint(path: str) -> Optional[str]:
+    """هش محتوای فایل؛ تا وقتی اندازه و زمان تغییر فایل ثابت است دوباره خوانده نمی‌شود"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    cached = _fingerprints.get(path)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    value = digest.hexdigest()[:12]
+    _fingerprints[path] = (st.st_mtime_ns, st.st_size, value)
+    return value
+
+
+def asset_url(filename: str) -> str:
+    """آدرس فایل static همراه هش محتوا؛ برای فایلی که وجود ندارد همان آدرس معمولی"""
+    path = safe_join(current_app.static_folder, filename)
+    version = fingerprint(path) if path else None
+    if version is None:
+        return url_for("static", filename=filename)
+    return url_for("static", filename=filename, v=version)
+
+
+def _is_text(filename: str) -> bool:
+    return filename.lower().endswith(TEXT_EXTENSIONS)
+
+
+def serve(filename: str):
+    """جایگزین نمای static در Flask: نسخه فشرده در صورت وجود و کش immutable برای آدرس اثرانگشتی"""
+    static_folder = current_app.static_folder
+    path = safe_join(static_folder, filename)
+    response = None
+    if path and _is_text(filename) and os.path.isfile(path):
+        accepted = request.accept_encodings
+        for encoding, ext in ENCODINGS:
+            compressed = path + ext
+            # نسخه فشرده قدیمی‌تر از فایل اصلی (build دوباره اجرا نشده) استفاده نمی‌شود
+            if accepted[encoding] and os.path.isfile(compressed) \
+                    and os.path.getmtime(compressed) >= os.path.getmtime(path):
+                response = send_from_directory(static_folder, filename + ext,
+                                               mimetype=mimetypes.guess_type(filename)[0])
+                response.headers["Content-Encoding"] = encoding
+                break
+        if response is None:
+            response = current_app.send_static_file(filename)
+        response.vary.add("Accept-Encoding")
+    else:
+        response = current_app.send_static_file(filename)
+
+    version = request.args.get("v")
+    if version and path and version == fingerprint(path):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+# ---------- ساخت نسخه‌های فشرده ----------
+
+def _compress(path: str) -> int:
+    """ساخت .gz و .br برای یک فایل متنی اگر وجود ندارند یا از فایل اصلی قدیمی‌ترند"""
+    written = 0
+    mtime = os.path.getmtime(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    variants = [(".gz", lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((".br", lambda d: brotli.compress(d, quality=11)))
+    for ext, compress in variants:
+        target = path + ext
+        if os.path.exists(target) and os.path.getmtime(target) >= mtime:
+            continue
+        storage.atomic_write(target, compress(data))
+        written += 1
+    return written
+
+
+def build(directory: str = STATIC_DIR) -> Dict[str, int]:
+    """ساخت نسخه‌های فشرده همه فایل‌های متنی زیر directory"""
+    stats = {"files": 0, "written": 0}
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if d not in UPLOAD_DIRS]
+        for name in files:
+            path = os.path.join(root, name)
+            if not _is_text(name) or os.path.getsize(path) < MIN_COMPRESS_BYTES:
+                continue
+            stats["files"] += 1
+            stats["written"] += _compress(path)
+    return stats
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "build":
+        if brotli is None:
+            print("brotli نصب نیست؛ فقط نسخه gzip ساخته می‌شود (pip install brotli)")
+        print(build())
+    else:
+        print("usage: python static_assets.py build")
@@ -0,0 +1,1310 @@
+"""
+لایه ذخیره‌سازی SQLite برای هنرکده فارسی
+
+تمام مسیرهای server.py به جای خواندن و بازنویسی کامل فایل‌های اکسل از این ماژول استفاده می‌کنند.
+اجرای مستقیم: python storage.py migrate
+"""
+import os
+import sys
+import json
+import sqlite3
+import threading
+import time
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+import search_index
+from read_cache import ReadCache, freeze
+
+DB_PATH = os.environ.get("HONARKADEH_DB", os.path.join("excel_files", "honarkadeh.db"))
+
+# new rows are appended to the WAL file; the compactor folds it back into the main file
+COMPACT_INTERVAL = float(os.environ.get("HONARKADEH_COMPACT_INTERVAL", 30))
+WAL_AUTOCHECKPOINT_PAGES = 10000
+
+CATEGORY_FILES = {
+    "poems": "poems.xlsx",
+    "stories": "stories.xlsx",
+    "literature": "literature.xlsx"
+}
+
+# sql column -> key used by routes and templates
+ARTWORK_FIELDS = {
+    "item_id": "شماره",
+    "category_label": "دسته‌بندی",
+    "title": "عنوان",
+    "content": "محتوا",
+    "username": "username",
+    "status": "status",
+    "tags": "tags",
+    "readability": "readability",
+    "publish_date": "publish_date",
+    "created_at": "created_at",
+    "max_tokens": "max_tokens",
+    "image_url": "image_url",
+}
+
+PROFILE_FIELDS = ["username", "first_name", "last_name", "phone", "photo", "email", "bio"]
+
+EVALUATION_SCORES = [
+    "fluency",
+    "creativity",
+    "emotional_impact",
+    "imagery",
+    "coherence",
+    "format_suitability",
+    "clarity",
+    "overall_value"
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS artworks (
+    category TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    category_label TEXT,
+    title TEXT,
+    content TEXT,
+    username TEXT,
+    status TEXT,
+    tags TEXT,
+    readability TEXT,
+    publish_date TEXT,
+    created_at TEXT,
+    max_tokens TEXT,
+    image_url TEXT,
+    PRIMARY KEY (category, item_id)
+);
+CREATE INDEX IF NOT EXISTS idx_artworks_username ON artworks (username, category);
+CREATE INDEX IF NOT EXISTS idx_artworks_status ON artworks (category, status);
+
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    email TEXT,
+    password TEXT
+);
+
+CREATE TABLE IF NOT EXISTS profiles (
+    username TEXT PRIMARY KEY,
+    first_name TEXT,
+    last_name TEXT,
+    phone TEXT,
+    photo TEXT,
+    email TEXT,
+    bio TEXT
+);
+
+CREATE TABLE IF NOT EXISTS interactions (
+    cat TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    likes INTEGER NOT NULL DEFAULT 0,
+    comment_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (cat, item_id)
+);
+
+CREATE TABLE IF NOT EXISTS likes (
+    cat TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    UNIQUE (cat, item_id, username)
+);
+
+CREATE TABLE IF NOT EXISTS comments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cat TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    text TEXT NOT NULL,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_comments_item ON comments (cat, item_id, id);
+
+CREATE TABLE IF NOT EXISTS evaluations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    category TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    fluency INTEGER,
+    creativity INTEGER,
+    emotional_impact INTEGER,
+    imagery INTEGER,
+    coherence INTEGER,
+    format_suitability INTEGER,
+    clarity INTEGER,
+    overall_value INTEGER,
+    additional_comment TEXT,
+    timestamp TEXT,
+    UNIQUE (username, category, item_id)
+);
+CREATE INDEX IF NOT EXISTS idx_evaluations_item ON evaluations (item_id);
+
+CREATE TABLE IF NOT EXISTS id_counters (
+    category TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS data_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS resource_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    modified_at REAL
+);
+
+CREATE TABLE IF NOT EXISTS response_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_response_cache_expiry ON response_cache (expires_at);
+
+CREATE TABLE IF NOT EXISTS evaluation_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_evaluation_cache_expiry ON evaluation_cache (expires_at);
+
+CREATE TABLE IF NOT EXISTS ai_generations (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ai_generations_expiry ON ai_generations (expires_at);
+
+CREATE TABLE IF NOT EXISTS ai_scores (
+    category TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    score_overall REAL,
+    score_details TEXT,
+    issues TEXT,
+    rewrite_hint TEXT,
+    evaluator_model TEXT,
+    content_hash TEXT,
+    job_id INTEGER,
+    evaluated_at REAL,
+    PRIMARY KEY (category, item_id)
+);
+
+CREATE TABLE IF NOT EXISTS eval_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL,
+    options TEXT,
+    total INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    cursor_category TEXT,
+    cursor_id INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL,
+    updated_at REAL
+);
+
+CREATE TABLE IF NOT EXISTS ai_images (
+    url TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    name TEXT,
+    error TEXT,
+    created_at REAL
+);
+"""
+
+VERSIONED_TABLES = ["artworks", "users", "profiles", "interactions", "evaluations"]
+
+
+def _version_triggers() -> str:
+    sql = []
+    for table in VERSIONED_TABLES:
+        sql.append(f"INSERT OR IGNORE INTO data_versions (name, version) VALUES ('{table}', 0);")
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            sql.append(
+                f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()} AFTER {event} ON {table} "
+                f"BEGIN UPDATE data_versions SET version = version + 1 WHERE name = '{table}'; END;"
+            )
+    return "\n".join(sql)
+
+
+# نسخه هر منبع (یک اثر، یک دسته، آثار یک نویسنده، یک پروفایل) با زمان آخرین تغییر؛ برای ETag صفحه‌ها
+RESOURCE_KEYS = {
+    "artworks": ["'artworks'", "'artworks:' || {row}.category",
+                 "'artwork:' || {row}.category || ':' || {row}.item_id", "'author:' || {row}.username"],
+    "profiles": ["'profiles'", "'profile:' || {row}.username"],
+}
+_NOW_SQL = "(julianday('now') - 2440587.5) * 86400.0"
+
+
+def _resource_triggers() -> str:
+    sql = [f"INSERT OR IGNORE INTO resource_versions (name, version, modified_at) VALUES ('*', 0, {_NOW_SQL});"]
+    for table, keys in RESOURCE_KEYS.items():
+        for event, rows in (("INSERT", ["NEW"]), ("UPDATE", ["OLD", "NEW"]), ("DELETE", ["OLD"])):
+            values = ", ".join(f"({key.format(row=row)}, 1, {_NOW_SQL})" for row in rows for key in keys)
+            sql.append(
+                f"CREATE TRIGGER IF NOT EXISTS trg_{table}_resource_{event.lower()} AFTER {event} ON {table} "
+                f"BEGIN INSERT INTO resource_versions (name, version, modified_at) VALUES {values} "
+                "ON CONFLICT (name) DO UPDATE SET version = version + 1, modified_at = excluded.modified_at; END;"
+            )
+    return "\n".join(sql)
+
+
+_local = threading.local()
+_cache = ReadCache()
+_compactor: Optional[threading.Thread] = None
+
+
+def get_connection() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != DB_PATH:
+        db_dir = os.path.dirname(DB_PATH)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA wal_autocheckpoint = {WAL_AUTOCHECKPOINT_PAGES}")
+        _local.conn = conn
+        _local.path = DB_PATH
+    return conn
+
+
+@contextmanager
+def transaction(*tables: str):
+    """
+    تراکنش نوشتن؛ پس از commit کش جدول‌های نام‌برده پاک می‌شود
+
+    BEGIN IMMEDIATE قفل نوشتن را همان ابتدا می‌گیرد، پس خواندن-تغییر-نوشتن‌ها
+    بین همه پروسه‌ها (workerهای gunicorn) به ترتیب اجرا می‌شوند و هیچ به‌روزرسانی گم نمی‌شود.
+    """
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+    finally:
+        for table in tables:
+            _cache.invalidate(table)
+
+
+def atomic_write(path: str, data: bytes):
+    """نوشتن فایل در یک فایل موقت کنار مقصد و جایگزینی اتمی آن با os.replace"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def init_db():
+    conn = get_connection()
+    conn.execute("PRAGMA journal_mode = WAL")
+    legacy_interactions = _rename_legacy_interactions(conn)
+    conn.executescript(SCHEMA)
+    conn.executescript(_version_triggers())
+    conn.executescript(_resource_triggers())
+    if legacy_interactions:
+        _convert_legacy_interactions(conn)
+    _seed_id_counters(conn)
+    _normalize_status(conn)
+    search_index.create(conn)
+    with transaction() as tx:
+        if search_index.is_empty(tx):
+            search_index.rebuild(tx)
+    _cache.clear()
+
+
+def reindex() -> int:
+    with transaction() as conn:
+        return search_index.rebuild(conn)
+
+
+def _normalize_status(conn: sqlite3.Connection):
+    """وضعیت خالی (سلول خالی اکسل در انتقال‌های قبلی) همان عمومی است و صریحا public ذخیره می‌شود"""
+    with transaction("artworks") as tx:
+        tx.execute("UPDATE artworks SET status = 'public' WHERE COALESCE(status, '') = ''")
+
+
+def _rename_legacy_interactions(conn: sqlite3.Connection) -> bool:
+    """جدول interactions قدیمی (لایک‌ها و کامنت‌ها به صورت JSON) کنار گذاشته می‌شود"""
+    with transaction("interactions") as tx:
+        columns = [r[1] for r in tx.execute("PRAGMA table_info(interactions)")]
+        if "user_likes" not in columns:
+            return False
+        for event in ("insert", "update", "delete"):
+            tx.execute(f"DROP TRIGGER IF EXISTS trg_interactions_{event}")
+        tx.execute("ALTER TABLE interactions RENAME TO interactions_legacy")
+    return True
+
+
+def _convert_legacy_interactions(conn: sqlite3.Connection):
+    with transaction("interactions") as tx:
+        rows = tx.execute("SELECT cat, item_id, comments, user_likes FROM interactions_legacy").fetchall()
+        for row in rows:
+            _import_interaction(tx, row["cat"], row["item_id"],
+                                json.loads(row["user_likes"] or "[]"),
+                                json.loads(row["comments"] or "[]"))
+        tx.execute("DROP TABLE interactions_legacy")
+
+
+def _seed_id_counters(conn: sqlite3.Connection):
+    conn.execute(
+        "INSERT INTO id_counters (category, last_id) "
+        "SELECT category, MAX(item_id) FROM artworks WHERE true GROUP BY category "
+        "ON CONFLICT (category) DO UPDATE SET last_id = MAX(last_id, excluded.last_id)"
+    )
+
+
+def compact() -> Tuple[int, int, int]:
+    """ادغام فایل WAL در فایل اصلی پایگاه داده بدون مسدود کردن خواننده‌ها و نویسنده‌ها"""
+    return tuple(get_connection().execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone())
+
+
+def start_compactor(interval: float = COMPACT_INTERVAL):
+    global _compactor
+    if _compactor is not None and _compactor.is_alive():
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                compact()
+            except sqlite3.Error as e:
+                print(f"خطا در فشرده‌سازی WAL: {e}")
+
+    _compactor = threading.Thread(target=run, name="storage-compactor", daemon=True)
+    _compactor.start()
+
+
+def table_version(table: str) -> int:
+    row = get_connection().execute(
+        "SELECT version FROM data_versions WHERE name = ?", (table,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def resource_versions(names: List[str]) -> Tuple[Tuple[int, ...], float]:
+    """
+    نسخه منابع نام‌برده و آخرین زمان تغییر آن‌ها؛ منبعی که از زمان ساخت جدول تغییر نکرده
+    نسخه 0 و زمان '*' (اولین اجرای init_db) را می‌گیرد
+    """
+    rows = get_connection().execute(
+        f"SELECT name, version, modified_at FROM resource_versions WHERE name IN ({', '.join('?' * (len(names) + 1))})",
+        ["*"] + list(names)
+    ).fetchall()
+    found = {r["name"]: (r["version"], r["modified_at"]) for r in rows}
+    since = found.get("*", (0, 0.0))[1]
+    versions = tuple(found.get(name, (0, since))[0] for name in names)
+    modified = max([since] + [found[name][1] for name in names if name in found])
+    return versions, modified
+
+
+def _cached(table: str, key: tuple, loader: Callable[[], Any]) -> Any:
+    return _cache.get((table, DB_PATH) + key, table_version(table), loader)
+
+
+def cache_stats() -> Dict[str, int]:
+    return _cache.stats()
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    return str(value)
+
+
+def _artwork_record(row: sqlite3.Row) -> Dict[str, Any]:
+    rec = {}
+    for column, key in ARTWORK_FIELDS.items():
+        value = row[column]
+        if column == "item_id":
+            rec[key] = int(value)
+        elif column == "max_tokens":
+            rec[key] = value
+        else:
+            rec[key] = _text(value)
+    return rec
+
+
+# قاعده واحد نمایش اثر: هر وضعیتی جز private (از جمله خالی) عمومی است؛ اثر خصوصی فقط برای صاحبش
+PRIVATE_STATUS = "private"
+# ستون‌ها بدون نام جدول می‌آیند تا در جستجو (join با artworks_fts که status و username ندارد) هم کار کند
+VISIBLE_SQL = "(COALESCE(status, '') != 'private' OR username = ?)"
+
+
+def is_public(rec: Dict[str, Any]) -> bool:
+    return (rec.get("status") or "") != PRIVATE_STATUS
+
+
+def can_view(rec: Dict[str, Any], viewer: Optional[str] = None) -> bool:
+    """همان شرط VISIBLE_SQL برای یک رکورد"""
+    return is_public(rec) or (bool(viewer) and rec.get("username") == viewer)
+
+
+def _profile_record(row: sqlite3.Row) -> Dict[str, Any]:
+    return {field: _text(row[field]) for field in PROFILE_FIELDS}
+
+
+# ---------- artworks ----------
+
+def get_artwork(category: str, item_id: int) -> Optional[Dict[str, Any]]:
+    row = get_connection().execute(
+        "SELECT * FROM artworks WHERE category = ? AND item_id = ?",
+        (category, int(item_id))
+    ).fetchone()
+    return _artwork_record(row) if row else None
+
+
+def list_artworks(category: str, newest_first: bool = False,
+                  username: Optional[str] = None) -> Tuple[Any, ...]:
+    """رکوردهای فقط‌خواندنی یک دسته؛ برای تغییر، ابتدا dict(rec) بگیرید"""
+    def load():
+        sql = "SELECT * FROM artworks WHERE category = ?"
+        params: List[Any] = [category]
+        if username is not None:
+            sql += " AND username = ?"
+            params.append(username)
+        sql += " ORDER BY item_id DESC" if newest_first else " ORDER BY item_id"
+        return freeze(_artwork_record(r) for r in get_connection().execute(sql, params))
+    return _cached("artworks", ("list", category, newest_first, username), load)
+
+
+def count_artworks(category: str) -> int:
+    return _cached("artworks", ("count", category), lambda: get_connection().execute(
+        "SELECT COUNT(*) FROM artworks WHERE category = ?", (category,)
+    ).fetchone()[0])
+
+
+def author_artwork_counts() -> Dict[str, int]:
+    """تعداد آثار هر نویسنده در همه دسته‌ها"""
+    rows = get_connection().execute(
+        "SELECT username, COUNT(*) FROM artworks "
+        "WHERE username IS NOT NULL AND username != '' GROUP BY username"
+    )
+    return {r[0]: r[1] for r in rows}
+
+
+def page_artworks(category: str, before: Optional[int] = None, limit: int = 20,
+                  viewer: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    یک صفحه از آثار یک دسته، جدیدترین اول (صفحه‌بندی keyset روی item_id)
+    before: شماره آخرین اثر صفحه قبل؛ خروجی: (رکوردها، شماره آخرین رکورد اگر صفحه بعدی وجود دارد)
+    """
+    sql = f"SELECT * FROM artworks WHERE category = ? AND {VISIBLE_SQL}"
+    params: List[Any] = [category, viewer or ""]
+    if before is not None:
+        sql += " AND item_id < ?"
+        params.append(int(before))
+    sql += " ORDER BY item_id DESC LIMIT ?"
+    params.append(limit + 1)
+    records = [_artwork_record(r) for r in get_connection().execute(sql, params)]
+    if len(records) > limit:
+        records = records[:limit]
+        return records, records[-1]["شماره"]
+    return records, None
+
+
+def count_visible_artworks(category: str, viewer: Optional[str] = None) -> int:
+    return _cached("artworks", ("visible", category, viewer), lambda: get_connection().execute(
+        f"SELECT COUNT(*) FROM artworks WHERE category = ? AND {VISIBLE_SQL}",
+        (category, viewer or "")
+    ).fetchone()[0])
+
+
+def search_artworks(category: str, query: str, username: Optional[str] = None,
+                    viewer: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+    """
+    جستجوی رتبه‌بندی‌شده از طریق ایندکس معکوس
+    username: فقط آثار این کاربر؛ در غیر این صورت آثار عمومی و آثار خصوصی viewer
+    """
+    rows = search_index.search(get_connection(), category, query, owner=username, viewer=viewer,
+                               visible_sql=VISIBLE_SQL, limit=limit)
+    return [_artwork_record(r) for r in rows]
+
+
+def insert_artwork(category: str, fields: Dict[str, Any]) -> int:
+    """ثبت اثر جدید و برگرداندن شماره آن"""
+    columns = [c for c in ARTWORK_FIELDS if c != "item_id" and c in fields]
+    with transaction("artworks") as conn:
+        conn.execute(
+            "INSERT INTO id_counters (category, last_id) VALUES (?, 1) "
+            "ON CONFLICT (category) DO UPDATE SET last_id = last_id + 1",
+            (category,)
+        )
+        new_id = conn.execute(
+            "SELECT last_id FROM id_counters WHERE category = ?", (category,)
+        ).fetchone()[0]
+        conn.execute(
+            f"INSERT INTO artworks (category, item_id, {', '.join(columns)}) "
+            f"VALUES (?, ?, {', '.join('?' for _ in columns)})",
+            [category, new_id] + [fields[c] for c in columns]
+        )
+        if category in search_index.CATEGORY_CODES:
+            search_index.index_artwork(conn, category, new_id, fields.get("title"), fields.get("content"))
+    return new_id
+
+
+def update_artwork(category: str, item_id: int, **fields) -> bool:
+    columns = [c for c in fields if c in ARTWORK_FIELDS and c != "item_id"]
+    if not columns:
+        return False
+    with transaction("artworks") as conn:
+        cur = conn.execute(
+            f"UPDATE artworks SET {', '.join(c + ' = ?' for c in columns)} "
+            "WHERE category = ? AND item_id = ?",
+            [fields[c] for c in columns] + [category, int(item_id)]
+        )
+        updated = cur.rowcount > 0
+        if updated and category in search_index.CATEGORY_CODES and ("title" in fields or "content" in fields):
+            row = conn.execute(
+                "SELECT title, content FROM artworks WHERE category = ? AND item_id = ?",
+                (category, int(item_id))
+            ).fetchone()
+            search_index.index_artwork(conn, category, item_id, row["title"], row["content"])
+    return updated
+
+
+def delete_artwork(category: str, item_id: int, username: str) -> bool:
+    with transaction("artworks") as conn:
+        cur = conn.execute(
+            "DELETE FROM artworks WHERE category = ? AND item_id = ? AND username = ?",
+            (category, int(item_id), username)
+        )
+        deleted = cur.rowcount > 0
+        if deleted and category in search_index.CATEGORY_CODES:
+            search_index.remove_artwork(conn, category, item_id)
+    return deleted
+
+
+# ---------- users & profiles ----------
+
+def check_login(username: str, password: str) -> bool:
+    row = get_connection().execute(
+        "SELECT 1 FROM users WHERE username = ? AND password = ?", (username, password)
+    ).fetchone()
+    return row is not None
+
+
+def create_user(username: str, email: str, password: str) -> bool:
+    with transaction("users") as conn:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO users (username, email, password) VALUES (?, ?, ?)",
+            (username, email, password)
+        )
+    return cur.rowcount > 0
+
+
+def get_profile(username: str) -> Optional[Dict[str, Any]]:
+    def load():
+        row = get_connection().execute(
+            "SELECT * FROM profiles WHERE username = ?", (username,)
+        ).fetchone()
+        return freeze([_profile_record(row)])[0] if row else None
+    return _cached("profiles", ("one", username), load)
+
+
+def list_profiles() -> Tuple[Any, ...]:
+    return _cached("profiles", ("list",), lambda: freeze(
+        _profile_record(r) for r in get_connection().execute("SELECT * FROM profiles ORDER BY rowid")
+    ))
+
+
+def save_profile(profile: Dict[str, Any]):
+    values = [profile.get(f, "") for f in PROFILE_FIELDS]
+    with transaction("profiles") as conn:
+        conn.execute(
+            f"INSERT OR REPLACE INTO profiles ({', '.join(PROFILE_FIELDS)}) "
+            f"VALUES ({', '.join('?' for _ in PROFILE_FIELDS)})",
+            values
+        )
+
+
+def update_bio(username: str, bio: str):
+    with transaction("profiles") as conn:
+        cur = conn.execute("UPDATE profiles SET bio = ? WHERE username = ?", (bio, username))
+        if cur.rowcount == 0:
+            conn.execute(
+                "INSERT INTO profiles (username, first_name, last_name, phone, email, photo, bio) "
+                "VALUES (?, '', '', '', '', '', ?)",
+                (username, bio)
+            )
+
+
+def update_photo(username: str, photo: str) -> bool:
+    with transaction("profiles") as conn:
+        cur = conn.execute("UPDATE profiles SET photo = ? WHERE username = ?", (photo, username))
+    return cur.rowcount > 0
+
+
+# ---------- interactions ----------
+
+def _bump_counts(conn: sqlite3.Connection, cat: str, item_id: int, likes: int = 0, comments: int = 0):
+    conn.execute(
+        "INSERT INTO interactions (cat, item_id, likes, comment_count) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (cat, item_id) DO UPDATE SET likes = likes + excluded.likes, "
+        "comment_count = comment_count + excluded.comment_count",
+        (cat, item_id, likes, comments)
+    )
+
+
+def _comment_record(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "username": _text(row["username"]),
+        "first_name": _text(row["first_name"]),
+        "last_name": _text(row["last_name"]),
+        "text": _text(row["text"])
+    }
+
+
+def get_counts(cat: str, item_id: int) -> Tuple[int, int]:
+    row = get_connection().execute(
+        "SELECT likes, comment_count FROM interactions WHERE cat = ? AND item_id = ?",
+        (cat, int(item_id))
+    ).fetchone()
+    return (int(row["likes"]), int(row["comment_count"])) if row else (0, 0)
+
+
+def has_liked(cat: str, item_id: int, username: Optional[str]) -> bool:
+    if not username:
+        return False
+    row = get_connection().execute(
+        "SELECT 1 FROM likes WHERE cat = ? AND item_id = ? AND username = ?",
+        (cat, int(item_id), username)
+    ).fetchone()
+    return row is not None
+
+
+def list_likers(cat: str, item_id: int) -> List[str]:
+    rows = get_connection().execute(
+        "SELECT username FROM likes WHERE cat = ? AND item_id = ? ORDER BY rowid",
+        (cat, int(item_id))
+    )
+    return [r["username"] for r in rows]
+
+
+def list_comments(cat: str, item_id: int) -> List[Dict[str, Any]]:
+    rows = get_connection().execute(
+        "SELECT * FROM comments WHERE cat = ? AND item_id = ? ORDER BY id",
+        (cat, int(item_id))
+    )
+    return [_comment_record(r) for r in rows]
+
+
+def get_interaction(cat: str, item_id: int) -> Dict[str, Any]:
+    likes, comment_count = get_counts(cat, item_id)
+    return {
+        "likes": likes,
+        "comment_count": comment_count,
+        "comments": list_comments(cat, item_id) if comment_count else []
+    }
+
+
+def batch_interactions(keys: List[Tuple[str, int]], viewer: Optional[str] = None,
+                       with_likers: bool = True,
+                       with_comments: bool = False) -> Dict[Tuple[str, int], Dict[str, Any]]:
+    """
+    شمارنده‌ها، has_liked، لایک‌کننده‌ها و (در صورت نیاز) کامنت‌های چند اثر؛ یک پرس‌وجو برای هر بخش
+    keys: فهرست (cat, item_id)
+    """
+    keys = list(dict.fromkeys((cat, int(item_id)) for cat, item_id in keys))
+    result = {
+        key: {"likes": 0, "comment_count": 0, "has_liked": False, "likers": [], "comments": []}
+        for key in keys
+    }
+    if not keys:
+        return result
+
+    values = ", ".join("(?, ?)" for _ in keys)
+    params = [v for key in keys for v in key]
+    conn = get_connection()
+
+    rows = conn.execute(
+        f"WITH k (cat, item_id) AS (VALUES {values}) "
+        "SELECT i.cat, i.item_id, i.likes, i.comment_count FROM k "
+        "JOIN interactions i ON i.cat = k.cat AND i.item_id = k.item_id",
+        params
+    )
+    for r in rows:
+        entry = result[(r["cat"], r["item_id"])]
+        entry["likes"] = int(r["likes"])
+        entry["comment_count"] = int(r["comment_count"])
+
+    if with_likers or viewer:
+        sql = (
+            f"WITH k (cat, item_id) AS (VALUES {values}) "
+            "SELECT l.cat, l.item_id, l.username FROM k "
+            "JOIN likes l ON l.cat = k.cat AND l.item_id = k.item_id"
+        )
+        like_params = list(params)
+        if not with_likers:
+            sql += " WHERE l.username = ?"
+            like_params.append(viewer)
+        for r in conn.execute(sql + " ORDER BY l.rowid", like_params):
+            entry = result[(r["cat"], r["item_id"])]
+            if with_likers:
+                entry["likers"].append(r["username"])
+            if viewer and r["username"] == viewer:
+                entry["has_liked"] = True
+
+    if with_comments:
+        rows = conn.execute(
+            f"WITH k (cat, item_id) AS (VALUES {values}) "
+            "SELECT c.* FROM k JOIN comments c ON c.cat = k.cat AND c.item_id = k.item_id ORDER BY c.id",
+            params
+        )
+        for r in rows:
+            result[(r["cat"], r["item_id"])]["comments"].append(_comment_record(r))
+    return result
+
+
+def toggle_like(cat: str, item_id: int, username: str) -> Tuple[int, bool]:
+    """لایک/برداشتن لایک؛ فقط ردیف همین کاربر و شمارنده همین اثر تغییر می‌کند"""
+    item_id = int(item_id)
+    with transaction("interactions") as conn:
+        cur = conn.execute(
+            "DELETE FROM likes WHERE cat = ? AND item_id = ? AND username = ?", (cat, item_id, username)
+        )
+        liked = cur.rowcount == 0
+        if liked:
+            conn.execute("INSERT INTO likes (cat, item_id, username) VALUES (?, ?, ?)", (cat, item_id, username))
+        _bump_counts(conn, cat, item_id, likes=1 if liked else -1)
+        likes = conn.execute(
+            "SELECT likes FROM interactions WHERE cat = ? AND item_id = ?", (cat, item_id)
+        ).fetchone()[0]
+    return int(likes), liked
+
+
+def add_comment(cat: str, item_id: int, comment: Dict[str, Any]) -> Dict[str, Any]:
+    item_id = int(item_id)
+    with transaction("interactions") as conn:
+        cur = conn.execute(
+            "INSERT INTO comments (cat, item_id, username, first_name, last_name, text, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (cat, item_id, comment.get("username"), comment.get("first_name"), comment.get("last_name"),
+             comment.get("text"), comment.get("created_at") or time.strftime("%Y-%m-%d %H:%M:%S"))
+        )
+        _bump_counts(conn, cat, item_id, comments=1)
+    return dict(comment, id=cur.lastrowid)
+
+
+def _import_interaction(conn: sqlite3.Connection, cat: str, item_id: int,
+                        user_likes: List[str], comments: List[Dict[str, Any]]):
+    item_id = int(item_id)
+    liked = 0
+    for username in user_likes:
+        cur = conn.execute("INSERT OR IGNORE INTO likes (cat, item_id, username) VALUES (?, ?, ?)",
+                           (cat, item_id, username))
+        liked += cur.rowcount
+    for c in comments:
+        conn.execute(
+            "INSERT INTO comments (cat, item_id, username, first_name, last_name, text) VALUES (?, ?, ?, ?, ?, ?)",
+            (cat, item_id, c.get("username"), c.get("first_name"), c.get("last_name"), c.get("text"))
+        )
+    _bump_counts(conn, cat, item_id, likes=liked, comments=len(comments))
+
+
+# ---------- evaluations ----------
+
+def has_evaluated(username: str, category: str, item_id) -> bool:
+    row = get_connection().execute(
+        "SELECT 1 FROM evaluations WHERE username = ? AND category = ? AND item_id = ?",
+        (username, category, int(item_id))
+    ).fetchone()
+    return row is not None
+
+
+def add_evaluation(row: Dict[str, Any]) -> bool:
+    columns = ["username", "category", "item_id"] + EVALUATION_SCORES + ["additional_comment", "timestamp"]
+    with transaction("evaluations") as conn:
+        cur = conn.execute(
+            f"INSERT OR IGNORE INTO evaluations ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})",
+            [row.get(c) for c in columns]
+        )
+    return cur.rowcount > 0
+
+
+def list_evaluations(item_id: int) -> List[Dict[str, Any]]:
+    rows = get_connection().execute(
+        "SELECT * FROM evaluations WHERE item_id = ? ORDER BY id", (int(item_id),)
+    )
+    result = []
+    for r in rows:
+        rec = dict(r)
+        rec.pop("id", None)
+        rec["additional_comment"] = _text(rec.get("additional_comment"))
+        rec["timestamp"] = _text(rec.get("timestamp"))
+        result.append(rec)
+    return result
+
+
+# ---------- AI response cache (disk tier) ----------
+
+# هر کش جدول و سقف جداگانه دارد تا مدخل‌های یکی دیگری را بیرون نکند
+CACHE_TABLES = ("response_cache", "evaluation_cache")
+
+
+def _cache_table(table: str) -> str:
+    if table not in CACHE_TABLES:
+        raise ValueError(f"جدول کش نامعتبر: {table}")
+    return table
+
+
+def load_cached_response(key: str, table: str = "response_cache") -> Optional[Tuple[str, float]]:
+    row = get_connection().execute(
+        f"SELECT value, expires_at FROM {_cache_table(table)} WHERE key = ? AND expires_at > ?",
+        (key, time.time())
+    ).fetchone()
+    return (row["value"], row["expires_at"]) if row else None
+
+
+def save_cached_response(key: str, value: str, expires_at: float, max_entries: int,
+                         table: str = "response_cache"):
+    """ذخیره یک پاسخ و حذف مدخل‌های منقضی و قدیمی‌ترین‌ها تا سقف max_entries (فقط در همان جدول)"""
+    table = _cache_table(table)
+    with transaction() as conn:
+        conn.execute(
+            f"INSERT OR REPLACE INTO {table} (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, expires_at)
+        )
+        conn.execute(f"DELETE FROM {table} WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            f"DELETE FROM {table} WHERE key IN ("
+            f"SELECT key FROM {table} ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (max_entries,)
+        )
+
+
+# ---------- batch AI evaluation of stored artworks ----------
+
+EVAL_JOB_FIELDS = ["status", "options", "total", "done", "failed", "skipped",
+                   "cursor_category", "cursor_id", "error"]
+
+
+def artworks_after(category: str, after_id: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+    """آثار یک دسته به ترتیب شماره، بعد از after_id (برای پیمایش کامل بدون بارگذاری همه)"""
+    rows = get_connection().execute(
+        "SELECT * FROM artworks WHERE category = ? AND item_id > ? ORDER BY item_id LIMIT ?",
+        (category, int(after_id), limit)
+    )
+    return [_artwork_record(r) for r in rows]
+
+
+def ai_score_states(category: str, item_ids: List[int]) -> Dict[int, Tuple[str, Optional[int]]]:
+    """شماره اثر -> (هش محتوای ارزیابی‌شده، شماره کار)"""
+    if not item_ids:
+        return {}
+    rows = get_connection().execute(
+        f"SELECT item_id, content_hash, job_id FROM ai_scores "
+        f"WHERE category = ? AND item_id IN ({', '.join('?' for _ in item_ids)})",
+        [category] + [int(i) for i in item_ids]
+    )
+    return {r["item_id"]: (r["content_hash"], r["job_id"]) for r in rows}
+
+
+def save_ai_score(category: str, item_id: int, evaluation: Dict[str, Any], model: str,
+                  content_hash: str, job_id: Optional[int] = None):
+    with transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO ai_scores (category, item_id, score_overall, score_details, issues, "
+            "rewrite_hint, evaluator_model, content_hash, job_id, evaluated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (category, int(item_id), evaluation.get("score_overall"),
+             json.dumps(evaluation.get("score_details") or {}, ensure_ascii=False),
+             json.dumps(evaluation.get("issues") or [], ensure_ascii=False),
+             evaluation.get("rewrite_hint") or "", model, content_hash, job_id, time.time())
+        )
+
+
+def get_ai_score(category: str, item_id: int) -> Optional[Dict[str, Any]]:
+    row = get_connection().execute(
+        "SELECT * FROM ai_scores WHERE category = ? AND item_id = ?", (category, int(item_id))
+    ).fetchone()
+    if row is None:
+        return None
+    rec = dict(row)
+    rec["score_details"] = json.loads(rec["score_details"] or "{}")
+    rec["issues"] = json.loads(rec["issues"] or "[]")
+    return rec
+
+
+def create_eval_job(options: Dict[str, Any], total: int) -> int:
+    now = time.time()
+    with transaction() as conn:
+        cur = conn.execute(
+            "INSERT INTO eval_jobs (status, options, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            ("running", json.dumps(options, ensure_ascii=False), total, now, now)
+        )
+    return cur.lastrowid
+
+
+def update_eval_job(job_id: int, **fields) -> Optional[Dict[str, Any]]:
+    """به‌روزرسانی پیشرفت کار (و زمان آخرین فعالیت)؛ خروجی: وضعیت فعلی کار"""
+    columns = [c for c in EVAL_JOB_FIELDS if c in fields]
+    with transaction() as conn:
+        conn.execute(
+            f"UPDATE eval_jobs SET {''.join(f'{c} = ?, ' for c in columns)}updated_at = ? WHERE id = ?",
+            [fields[c] for c in columns] + [time.time(), int(job_id)]
+        )
+        row = conn.execute("SELECT * FROM eval_jobs WHERE id = ?", (int(job_id),)).fetchone()
+    return _eval_job_record(row) if row else None
+
+
+def _eval_job_record(row: sqlite3.Row) -> Dict[str, Any]:
+    rec = dict(row)
+    rec["options"] = json.loads(rec["options"] or "{}")
+    return rec
+
+
+def get_eval_job(job_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """کار با این شماره، یا آخرین کار ثبت‌شده"""
+    conn = get_connection()
+    if job_id is None:
+        row = conn.execute("SELECT * FROM eval_jobs ORDER BY id DESC LIMIT 1").fetchone()
+    else:
+        row = conn.execute("SELECT * FROM eval_jobs WHERE id = ?", (int(job_id),)).fetchone()
+    return _eval_job_record(row) if row else None
+
+
+def active_eval_job(stale_after: float) -> Optional[Dict[str, Any]]:
+    """کار در حال اجرایی که در stale_after ثانیه اخیر پیشرفت ثبت کرده باشد"""
+    row = get_connection().execute(
+        "SELECT * FROM eval_jobs WHERE status IN ('running', 'cancelling') AND updated_at > ? "
+        "ORDER BY id DESC LIMIT 1",
+        (time.time() - stale_after,)
+    ).fetchone()
+    return _eval_job_record(row) if row else None
+
+
+# ---------- AI generation state (shared between workers) ----------
+
+def save_generation(generation_id: str, state: str, expires_at: float, max_entries: int):
+    with transaction() as conn:
+        conn.execute("DELETE FROM ai_generations WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "INSERT OR REPLACE INTO ai_generations (id, state, expires_at) VALUES (?, ?, ?)",
+            (generation_id, state, expires_at)
+        )
+        conn.execute(
+            "DELETE FROM ai_generations WHERE id IN ("
+            "SELECT id FROM ai_generations ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (max_entries,)
+        )
+
+
+def load_generation(generation_id: str) -> Optional[str]:
+    row = get_connection().execute(
+        "SELECT state FROM ai_generations WHERE id = ? AND expires_at > ?",
+        (generation_id, time.time())
+    ).fetchone()
+    return row["state"] if row else None
+
+
+def update_generation(generation_id: str, old_state: str, state: str) -> bool:
+    """جایگزینی وضعیت فقط اگر از زمان خواندن old_state تغییری نکرده باشد (compare-and-swap)"""
+    with transaction() as conn:
+        cur = conn.execute(
+            "UPDATE ai_generations SET state = ? WHERE id = ? AND state = ? AND expires_at > ?",
+            (state, generation_id, old_state, time.time())
+        )
+    return cur.rowcount > 0
+
+
+def count_generations() -> int:
+    return get_connection().execute(
+        "SELECT COUNT(*) FROM ai_generations WHERE expires_at > ?", (time.time(),)
+    ).fetchone()[0]
+
+
+# ---------- generated images (remote URL -> local copy) ----------
+
+def register_ai_image(url: str) -> bool:
+    """ثبت آدرس تصویر تولیدشده؛ اگر قبلا ثبت شده باشد False"""
+    with transaction() as conn:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO ai_images (url, status, created_at) VALUES (?, 'pending', ?)",
+            (url, time.time())
+        )
+    return cur.rowcount > 0
+
+
+def set_ai_image(url: str, status: str, name: Optional[str] = None, error: Optional[str] = None):
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE ai_images SET status = ?, name = ?, error = ? WHERE url = ?",
+            (status, name, error, url)
+        )
+
+
+def get_ai_image(url: str) -> Optional[Dict[str, Any]]:
+    row = get_connection().execute("SELECT * FROM ai_images WHERE url = ?", (url,)).fetchone()
+    return dict(row) if row else None
+
+
+def list_ai_images(status: Optional[str] = None, before: Optional[float] = None) -> List[Dict[str, Any]]:
+    sql, args = "SELECT * FROM ai_images WHERE 1 = 1", []
+    if status:
+        sql += " AND status = ?"
+        args.append(status)
+    if before is not None:
+        sql += " AND created_at < ?"
+        args.append(before)
+    return [dict(r) for r in get_connection().execute(sql, args)]
+
+
+def delete_ai_image(url: str):
+    with transaction() as conn:
+        conn.execute("DELETE FROM ai_images WHERE url = ?", (url,))
+
+
+def remote_image_artworks() -> List[Tuple[str, int, str]]:
+    """آثاری که تصویرشان هنوز آدرس خارجی است: (دسته، شماره، آدرس)"""
+    rows = get_connection().execute(
+        "SELECT category, item_id, image_url FROM artworks "
+        "WHERE image_url LIKE 'http://%' OR image_url LIKE 'https://%'"
+    )
+    return [(r["category"], r["item_id"], r["image_url"]) for r in rows]
+
+
+def image_url_in_use(image_url: str) -> bool:
+    return get_connection().execute(
+        "SELECT 1 FROM artworks WHERE image_url = ? LIMIT 1", (image_url,)
+    ).fetchone() is not None
+
+
+def replace_image_url(old: str, new: str) -> int:
+    """جایگزینی آدرس تصویر در همه آثاری که به old اشاره می‌کنند"""
+    with transaction("artworks") as conn:
+        cur = conn.execute("UPDATE artworks SET image_url = ? WHERE image_url = ?", (new, old))
+    return cur.rowcount
+
+
+# ---------- one-shot migration from excel_files ----------
+
+def _clean(value):
+    import pandas as pd
+    if value is None:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if hasattr(value, "item"):
+        value = value.item()
+    return value
+
+
+def _read_rows(path: str) -> List[Dict[str, Any]]:
+    import pandas as pd
+    if not os.path.exists(path):
+        return []
+    df = pd.read_excel(path)
+    return [{k: _clean(v) for k, v in rec.items()} for rec in df.to_dict("records")]
+
+
+def shared_secret(name: str) -> str:
+    """یک مقدار تصادفی که یک بار ساخته و بین همه workerها مشترک می‌شود (مثل کلید session)"""
+    with transaction() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)",
+            (f"secret:{name}", os.urandom(32).hex())
+        )
+        return conn.execute("SELECT value FROM meta WHERE key = ?", (f"secret:{name}",)).fetchone()[0]
+
+
+def is_migrated() -> bool:
+    row = get_connection().execute("SELECT value FROM meta WHERE key = 'excel_migrated'").fetchone()
+    return row is not None
+
+
+def migrate_from_excel(save_dir: str, force: bool = False) -> Dict[str, int]:
+    """انتقال یک‌باره داده‌های excel_files به پایگاه داده"""
+    init_db()
+    if is_migrated() and not force:
+        return {}
+
+    counts = {}
+    artwork_keys = {key: column for column, key in ARTWORK_FIELDS.items()}
+
+    with transaction(*VERSIONED_TABLES) as conn:
+        # another worker may have finished the import while we waited for the lock
+        if is_migrated() and not force:
+            return {}
+        if force:
+            # re-import replaces the tables, so rows removed from the sheets do not survive;
+            # artworks_fts is rebuilt from artworks at the end of this transaction
+            conn.execute("DELETE FROM artworks")
+            conn.execute("DELETE FROM artworks_fts")
+            conn.execute("DELETE FROM evaluations")
+        for category, file_name in CATEGORY_FILES.items():
+            rows = _read_rows(os.path.join(save_dir, file_name))
+            seen_ids = set()
+            max_id = max([int(r["شماره"]) for r in rows if r.get("شماره") is not None] or [0])
+            for rec in rows:
+                if rec.get("شماره") is None:
+                    continue
+                values = {artwork_keys[k]: v for k, v in rec.items() if k in artwork_keys}
+                values["item_id"] = int(values["item_id"])
+                if values["item_id"] in seen_ids:
+                    # duplicate ids in the sheet: the old code only ever reached the first one
+                    max_id += 1
+                    print(f"شماره تکراری {values['item_id']} در {file_name} -> {max_id}")
+                    values["item_id"] = max_id
+                seen_ids.add(values["item_id"])
+                if values.get("max_tokens") is not None:
+                    values["max_tokens"] = str(values["max_tokens"])
+                if not values.get("status"):
+                    values["status"] = "public"
+                columns = list(values)
+                conn.execute(
+                    f"INSERT OR REPLACE INTO artworks (category, {', '.join(columns)}) "
+                    f"VALUES (?, {', '.join('?' for _ in columns)})",
+                    [category] + [values[c] for c in columns]
+                )
+            counts[category] = len(rows)
+
+        rows = _read_rows(os.path.join(save_dir, "users.xlsx"))
+        for rec in rows:
+            conn.execute(
+                "INSERT OR IGNORE INTO users (username, email, password) VALUES (?, ?, ?)",
+                (_text(rec.get("username")), rec.get("email"), _text(rec.get("password")))
+            )
+        counts["users"] = len(rows)
+
+        rows = _read_rows(os.path.join(save_dir, "profiles.xlsx"))
+        for rec in rows:
+            conn.execute(
+                f"INSERT OR REPLACE INTO profiles ({', '.join(PROFILE_FIELDS)}) "
+                f"VALUES ({', '.join('?' for _ in PROFILE_FIELDS)})",
+                [None if rec.get(f) is None else str(rec.get(f)) for f in PROFILE_FIELDS]
+            )
+        counts["profiles"] = len(rows)
+
+        rows = _read_rows(os.path.join(save_dir, "interactions.xlsx"))
+        if force:
+            conn.execute("DELETE FROM likes")
+            conn.execute("DELETE FROM comments")
+            conn.execute("DELETE FROM interactions")
+        for rec in rows:
+            _import_interaction(conn, rec.get("cat"), rec.get("item_id"),
+                                json.loads(rec.get("user_likes") or "[]"),
+                                json.loads(rec.get("comments") or "[]"))
+        counts["interactions"] = len(rows)
+
+        rows = _read_rows(os.path.join(save_dir, "evaluations.xlsx"))
+        columns = ["username", "category", "item_id"] + EVALUATION_SCORES + ["additional_comment", "timestamp"]
+        for rec in rows:
+            conn.execute(
+                f"INSERT OR IGNORE INTO evaluations ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})",
+                [rec.get(c) for c in columns]
+            )
+        counts["evaluations"] = len(rows)
+
+        _seed_id_counters(conn)
+        search_index.rebuild(conn)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('excel_migrated', ?)",
+                     (json.dumps(counts),))
+
+    print(f"انتقال داده‌ها از اکسل انجام شد: {counts}")
+    return counts
+
+
+# ---------- concurrent write stress check ----------
+
+def _stress_worker(args):
+    global DB_PATH
+    db_path, worker, rounds = args
+    DB_PATH = db_path
+    for i in range(rounds):
+        toggle_like("شعر", 1, f"user-{worker}-{i}")
+        add_comment("شعر", 1, {"username": f"user-{worker}", "first_name": "", "last_name": "", "text": str(i)})
+        update_bio("stress", f"{worker}-{i}")
+    return worker
+
+
+def stress(workers: int = 8, rounds: int = 50) -> bool:
+    """
+    لایک و کامنت هم‌زمان از چند پروسه روی یک اثر و بیو یک پروفایل؛
+    اگر هیچ نوشتنی گم نشده باشد True برمی‌گرداند.
+    """
+    global DB_PATH
+    import multiprocessing
+
+    original_path = DB_PATH
+    tmp_dir = tempfile.mkdtemp(prefix="honarkadeh-stress-")
+    DB_PATH = os.path.join(tmp_dir, "stress.db")
+    try:
+        init_db()
+        started = time.time()
+        with multiprocessing.Pool(workers) as pool:
+            pool.map(_stress_worker, [(DB_PATH, w, rounds) for w in range(workers)])
+        elapsed = time.time() - started
+
+        interaction = get_interaction("شعر", 1)
+        expected = workers * rounds
+        # هر worker بیوها را به ترتیب می‌نویسد، پس آخرین نوشتن باید آخرین مقدار یکی از workerها باشد
+        profile = get_profile("stress")
+        bio = profile["bio"] if profile else None
+        bio_ok = rounds == 0 or bio in {f"{w}-{rounds - 1}" for w in range(workers)}
+        ok = (interaction["likes"] == expected and
+              len(list_likers("شعر", 1)) == expected and
+              interaction["comment_count"] == expected and
+              len(interaction["comments"]) == expected and
+              bio_ok)
+        print(f"workers={workers} rounds={rounds} time={elapsed:.2f}s "
+              f"likes={interaction['likes']}/{expected} comments={len(interaction['comments'])}/{expected} "
+              f"bio={bio} {'OK' if ok else 'LOST UPDATES'}")
+        return ok
+    finally:
+        DB_PATH = original_path
+        import shutil
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _option(name: str, default: int) -> int:
+    for arg in sys.argv[2:]:
+        if arg.startswith(f"--{name}="):
+            return int(arg.split("=", 1)[1])
+    return default
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    args = [a for a in sys.argv[2:] if not a.startswith("--")]
+    if command == "migrate":
+        migrate_from_excel(args[0] if args else "excel_files", force="--force" in sys.argv)
+    elif command == "reindex":
+        init_db()
+        print(f"{reindex()} اثر دوباره ایندکس شد")
+    elif command == "stress":
+        sys.exit(0 if stress(_option("workers", 8), _option("rounds", 50)) else 1)
+    else:
+        print("usage: python storage.py migrate [excel_dir] [--force]")
+        print("       python storage.py reindex")
+        print("       python storage.py stress [--workers=8] [--rounds=50]")